@@ -16,8 +16,21 @@ from google import genai
 from google.genai import types
 
 # Firestore utilities
-from firestore_utils import db, get_all_documents, get_document, update_document, create_new_conversation, save_conversation_turn, delete_document
-from gcs_utils import read_text_from_gcs
+from busqueda_utils import buscar_conversaciones, desindexar_conversacion, indexar_turnos
+from consumo_utils import COLECCION_CONSUMO, UsoLlamada, registrar_consumo
+from fechas_utils import ahora, formatear_fecha
+from firestore_utils import (db, get_document, get_recent_conversations, update_document, create_new_conversation,
+                             save_conversation_turn, delete_document, invalidate_cache, new_document_id, set_document)
+from gcs_utils import read_text_from_gcs, read_texts_from_gcs
+from indice_utils import normalizar
+from memorias_utils import (compactar_memorias, decidir_guardado, get_resumidor, guardar_resumenes, memorias_para_prompt,
+                            nombres_personas, personas_mencionadas)
+from modelos import Memoria, Turno
+from perfilado_utils import perfilar_pagina
+from prompt_utils import (RECURSOS_ESTATICOS, TABLAS_COMPONENTES, construir_prompt, contexto_bajo_demanda, estimar_tokens,
+                          ficha_persona, get_serializador)
+from reglas_utils import TablasComponentes
+from sync_utils import get_user_replica
 
 # ──────────────────────────────────────────────────────────────
 # AJUSTES BÁSICOS Y CONTROL DE ACCESO
@@ -35,6 +48,8 @@ if not current_user_id:
     st.error("No se pudo obtener el ID de usuario. Por favor, reinicia la aplicación y asegúrate de iniciar sesión.")
     st.stop()
 
+perfilar_pagina(current_user_id, "Mi Asistente")
+
 # ──────────────────────────────────────────────────────────────
 # FUNCIONES DE UTILIDAD PARA CARGAR CONOCIMIENTO
 # ──────────────────────────────────────────────────────────────
@@ -50,54 +65,70 @@ def get_file_content(rel_path: str) -> str:
         st.error(f"Error al leer {rel_path} en GCS: {e}")
         return ""
 
-def load_user_profile_from_firestore(user_id: str) -> dict:
-    """Devuelve el perfil del usuario almacenado en Firestore (puede ser {{}})."""
-    doc = db.collection("usuarios").document(user_id).get()
-    return doc.to_dict() if doc.exists else {}
-
-def load_sujetos_from_firestore(user_id: str) -> list[dict]:
-    """Devuelve la lista de sujetos (colección 'sujetos')."""
-    docs = (
-        db.collection("usuarios")
-        .document(user_id)
-        .collection("sujetos")
-        .stream()
-    )
-    return [d.to_dict() for d in docs]
-
-def load_memories_from_firestore(user_id: str) -> list[dict]:
-    """Devuelve las memorias ordenadas por fecha_registro."""
-    docs = (
-        db.collection("usuarios")
-        .document(user_id)
-        .collection("memorias")
-        .order_by("fecha_registro")
-        .stream()
-    )
-    out = []
-    for d in docs:
-        mem = d.to_dict() or {}
-        mem["id"] = d.id
-        out.append(mem)
-    return out
+def get_files_content(rel_paths: list[str]) -> dict[str, str]:
+    """Lee varios objetos de GCS como texto en una sola llamada; los que fallan quedan vacíos."""
+    try:
+        leidos = read_texts_from_gcs(rel_paths)
+    except Exception as e:
+        st.error(f"Error al leer los recursos de GCS: {e}")
+        return dict.fromkeys(rel_paths, "")
+    contenidos = {}
+    for rel_path, contenido in leidos.items():
+        if isinstance(contenido, Exception):
+            st.error(f"Error al leer {rel_path} en GCS: {contenido}")
+            contenido = ""
+        contenidos[rel_path] = contenido
+    return contenidos
+
+@st.cache_resource(show_spinner=False)
+def cargar_tablas_componentes() -> TablasComponentes | None:
+    """Lee e indexa una sola vez por proceso las tablas de Componentes Temperamentales."""
+    contenido = get_file_content(TABLAS_COMPONENTES)
+    try:
+        return TablasComponentes.desde_json(contenido) if contenido else None
+    except json.JSONDecodeError:
+        return None
+
+def load_sujetos_from_replica(user_id: str) -> list[dict]:
+    """Devuelve la lista de sujetos de la réplica del usuario, sin el ID de documento."""
+    personas = get_user_replica(user_id).personas
+    return [{k: v for k, v in p.items() if k != "ID"} for p in personas]
+
+# Se define aquí porque también lo usa el resumen de memorias al construir el prompt inicial
+@st.cache_resource(show_spinner=False)
+def get_gemini_client() -> genai.Client:
+    return genai.Client(vertexai=True, project="tfm-pablodm", location="global")
+
+MODELO_ASISTENTE = "gemini-2.5-flash"   # Antes gemini-2.5-flash-preview-05-20
+
+def registrar_uso(uso: UsoLlamada, en_conversacion: bool = True) -> None:
+    """Suma el consumo de una respuesta a los contadores del usuario (y de la conversación, si está guardada)."""
+    try:
+        conversacion_id = st.session_state.get("current_conversation_id") if en_conversacion else None
+        registrar_consumo(db, current_user_id, uso, conversacion_id)
+        invalidate_cache(current_user_id, COLECCION_CONSUMO)
+    except Exception as e:
+        st.warning(f"No se pudo registrar el consumo de la respuesta: {e}")
 
 # ──────────────────────────────────────────────────────────────
 # GESTIÓN DE MEMORIAS
 # ──────────────────────────────────────────────────────────────
 def guardar_memoria(memoria: str) -> str:
-    """Inserta una nueva memoria en Firestore."""
+    """Inserta una nueva memoria en Firestore, salvo que ya haya una casi igual guardada."""
     try:
-        memory_data = {
-            "memoria": memoria,
-            "fecha_registro": datetime.now().strftime("%Y/%m/%d %H:%M"),
-        }
-        (
-            db.collection("usuarios")
-            .document(current_user_id)
-            .collection("memorias")
-            .document()
-            .set(memory_data)
-        )
+        replica = get_user_replica(current_user_id)
+        accion, existente_id = decidir_guardado(replica.indice_memorias, memoria)
+        if accion == "omitir":
+            existente = replica.memorias.get(existente_id, {}).get("memoria", "")
+            return f"No se ha guardado porque ya existe una memoria equivalente: '{existente}'"
+
+        memory_data = Memoria(memoria, ahora()).a_firestore()
+        # Si amplía una memoria casi igual, la sustituye en lugar de añadir otra
+        memoria_id = existente_id if accion == "sustituir" else new_document_id(db, current_user_id, "memorias")
+        set_document(db, current_user_id, "memorias", memoria_id, memory_data)
+        replica.aplicar_memoria(memoria_id, memory_data)
+        if accion == "sustituir":
+            return f"Memoria actualizada exitosamente (sustituye a una casi igual): '{memoria}'"
         return f"Memoria guardada exitosamente: '{memoria}'"
     except Exception as e:
         st.error(f"Error al guardar memoria en Firestore: {e}")
@@ -123,58 +154,160 @@ guardar_memoria_function_declaration = types.FunctionDeclaration(
     ),
 )
 
-available_tools = [types.Tool(function_declarations=[guardar_memoria_function_declaration])]
-function_map = {"guardar_memoria": guardar_memoria}
+# ──────────────────────────────────────────────────────────────
+# CONSULTAS DEL MODELO SOBRE LOS DATOS DEL USUARIO
+# ──────────────────────────────────────────────────────────────
+# Con muchas personas el prompt inicial solo lleva sus nombres (contexto_bajo_demanda) y el modelo
+# pide el resto con estas funciones, que leen de los índices en memoria de la réplica
+MAX_COINCIDENCIAS = 10
+
+def personas_por_nombre(replica, nombre: str) -> set[str]:
+    """IDs de las personas cuyo nombre empieza por cada palabra de `nombre`; si una se llama
+    exactamente así, solo esa."""
+    ids = replica.indice.buscar(nombre=nombre) or set()
+    exactas = {pid for pid in ids if normalizar(replica.personas.nombre(pid)) == normalizar(nombre)}
+    return exactas if len(exactas) == 1 else ids
+
+def consultar_persona(nombre: str) -> str:
+    """Ficha completa de una persona del usuario, con el resumen de las memorias sobre ella."""
+    try:
+        replica = get_user_replica(current_user_id)
+        ids = personas_por_nombre(replica, nombre)
+        if not ids:
+            return f"No hay ninguna persona llamada '{nombre}'."
+        if len(ids) > 1:
+            nombres = sorted(replica.personas.nombre(pid) for pid in ids)
+            return (f"Hay {len(ids)} personas que coinciden con '{nombre}': {', '.join(nombres[:MAX_COINCIDENCIAS])}"
+                    f"{'...' if len(ids) > MAX_COINCIDENCIAS else ''}. Pide la ficha con el nombre completo.")
+        persona_id = ids.pop()
+        return ficha_persona(replica.personas.get(persona_id), replica.resumenes.get(persona_id),
+                             tablas=cargar_tablas_componentes())
+    except Exception as e:
+        st.error(f"Error al consultar la persona: {e}")
+        return f"Error interno al consultar la persona: {e}"
+
+def buscar_memorias(consulta: str = "", persona: str = "") -> str:
+    """Memorias guardadas más relevantes para una consulta, opcionalmente solo las que mencionan a una persona."""
+    try:
+        replica = get_user_replica(current_user_id)
+        filtro = None
+        if persona:
+            ids = personas_por_nombre(replica, persona)
+            if not ids:
+                return f"No hay ninguna persona llamada '{persona}'."
+            nombres = nombres_personas(replica.personas)
+            filtro = lambda m: bool(personas_mencionadas(replica.memorias.get(m, {}).get("memoria", ""), nombres) & ids)
+        if consulta.strip():
+            encontradas = replica.indice_memorias.buscar(consulta, MAX_COINCIDENCIAS, filtro)
+        else:
+            # Sin consulta, las más recientes (de la persona, si se indica)
+            encontradas = [m["id"] for m in replica.memorias_ordenadas(descendente=True)
+                           if filtro is None or filtro(m["id"])][:MAX_COINCIDENCIAS]
+        memorias = [replica.memorias[m] for m in encontradas if m in replica.memorias]
+        if not memorias:
+            return "No se ha encontrado ninguna memoria que coincida."
+        return get_serializador().memorias(memorias)
+    except Exception as e:
+        st.error(f"Error al buscar en las memorias: {e}")
+        return f"Error interno al buscar en las memorias: {e}"
+
+consultar_persona_function_declaration = types.FunctionDeclaration(
+    name="consultar_persona",
+    description=(
+        "Devuelve la ficha completa de una persona con la que se relaciona el usuario: datos personales, puntuaciones "
+        "y componentes temperamentales dominantes con sus pautas de trato, capacidades, relación con el usuario y resumen "
+        "de las memorias sobre ella. Úsala antes de dar pautas sobre una persona."
+    ),
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "nombre": types.Schema(
+                type=types.Type.STRING,
+                description="Nombre de la persona, tal como aparece en la lista de personas.",
+            )
+        },
+        required=["nombre"],
+    ),
+)
+
+buscar_memorias_function_declaration = types.FunctionDeclaration(
+    name="buscar_memorias",
+    description=(
+        "Busca entre las memorias que has guardado en conversaciones anteriores y devuelve las más relevantes con su fecha. "
+        "Úsala cuando el usuario se refiera a algo que te contó antes o cuando una memoria antigua pueda cambiar tu respuesta."
+    ),
+    parameters=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "consulta": types.Schema(
+                type=types.Type.STRING,
+                description="Palabras clave de lo que se busca (p. ej. 'reuniones por la mañana'). Vacía para las más recientes.",
+            ),
+            "persona": types.Schema(
+                type=types.Type.STRING,
+                description="Nombre de una persona para buscar solo entre las memorias que la mencionan (opcional).",
+            ),
+        },
+    ),
+)
+
+available_tools = [types.Tool(function_declarations=[guardar_memoria_function_declaration,
+                                                     consultar_persona_function_declaration,
+                                                     buscar_memorias_function_declaration])]
+function_map = {"guardar_memoria": guardar_memoria, "consultar_persona": consultar_persona,
+                "buscar_memorias": buscar_memorias}
 
 # ──────────────────────────────────────────────────────────────
 # CONOCIMIENTO INICIAL
 # ──────────────────────────────────────────────────────────────
+def compactar_memorias_pendientes(replica) -> None:
+    """Regenera los resúmenes de las personas que han acumulado suficientes memorias nuevas."""
+    try:
+        resumidor = get_resumidor(cliente=get_gemini_client())
+        uso = UsoLlamada(getattr(resumidor, "modelo", resumidor.nombre))
+        nuevos, obsoletos = compactar_memorias(dict(replica.memorias), list(replica.personas), dict(replica.resumenes),
+                                               resumidor)
+        # Las llamadas del resumidor de Gemini cuentan en el consumo del usuario, no en el de la conversación
+        for metadatos in getattr(resumidor, "metadatos", []):
+            uso.anadir_metadatos(metadatos)
+        if uso.llamadas:
+            uso.terminar()
+            registrar_uso(uso, en_conversacion=False)
+        if not nuevos and not obsoletos:
+            return
+        guardar_resumenes(db, current_user_id, nuevos, obsoletos)
+        invalidate_cache(current_user_id, "resumenes")
+        for resumen in nuevos:
+            replica.aplicar_resumen(resumen.persona_id, resumen.a_firestore())
+        for persona_id in obsoletos:
+            replica.aplicar_resumen(persona_id, None)
+    except Exception as e:
+        # Si falla, el prompt lleva las memorias sin resumir
+        st.warning(f"No se pudieron actualizar los resúmenes de memorias: {e}")
+
 def get_initial_knowledge_prompt() -> str:
     """Genera el prompt inicial combinando los recursos estáticos en GCS + Firestore."""
-    fp = []
-
-    # Recursos estáticos en GCS
-    gcs_files = [
-        ("conocimiento/instrucciones_LLM.txt", "n instrucciones de comportamiento para el LLM"),
-        ("conocimiento/info_factorCT.txt", " información sobre el trato de personas según el modelo comportamental (Factor CT)"),
-        ("conocimiento/tablas_componentes.json", "n las tablas de Componentes Temperamentales que indican cómo tratar a las personas para diferentes objetivos según sus componentes"),
-        ("conocimiento/definicion_info_sujetos.txt", " el esquema de los datos de personas. Cada persona que ha caracterizado este usuario tiene los siguientes campos"),
-    ]
-    for rel_path, desc in gcs_files:
-        content = get_file_content(rel_path)
-        if content:
-            fp.append(f"\nA continuación se presenta{desc}:\n{content}")
-        else:
+    # Recursos estáticos en GCS, descargados en paralelo
+    estaticos = get_files_content([rel_path for rel_path, _ in RECURSOS_ESTATICOS])
+    for rel_path, contenido in estaticos.items():
+        if not contenido:
             st.warning(f"No se pudo leer {rel_path} en GCS")
 
     # Secciones de Firestore
-    #  Perfil del usuario
-    profile = load_user_profile_from_firestore(current_user_id)
-    if profile:
-        fp.append("\nA continuación se presenta información sobre el usuario que te escribe e interactúa contigo:\n" + json.dumps(profile, ensure_ascii=False, indent=2))
-    else:
+    replica = get_user_replica(current_user_id)
+    profile = replica.perfil
+    if not profile:
         st.info("No se encontró perfil del usuario en Firestore; se omite sección de usuario.")
-
-    #  Personas caracterizadas del usuario
-    sujetos = load_sujetos_from_firestore(current_user_id)
-    if sujetos:
-        fp.append(
-            "\nA continuación se presenta información sobre las personas con las que se relaciona el usuario, rellenada por el propio usuario:\n"
-            + json.dumps(sujetos, ensure_ascii=False, indent=2)
-        )
-    else:
+    sujetos = load_sujetos_from_replica(current_user_id)
+    if not sujetos:
         st.info("No se encontraron sujetos en Firestore; se omite sección de sujetos.")
+    compactar_memorias_pendientes(replica)
+    resumenes, memories = memorias_para_prompt(replica.memorias_ordenadas(), replica.resumenes)
 
-    #  Memorias almacenadas previamente
-    memories = load_memories_from_firestore(current_user_id)
-    if memories:
-        fp.append(
-            "\nPor último, estas son las memorias que has guardado como LLM en interacciones anteriores con el usuario. Debes tenerlas en cuenta a la hora de responder:\n"
-            + json.dumps(memories, ensure_ascii=False, indent=2)
-        )
-
-    print("\n\n".join(fp))
-    return "\n\n".join(fp)
+    prompt = construir_prompt(estaticos, profile, sujetos, memories, tablas=cargar_tablas_componentes(),
+                              resumenes=resumenes, bajo_demanda=contexto_bajo_demanda(len(sujetos)))
+    print(prompt)
+    return prompt
 
 
 # ──────────────────────────────────────────────────────────────
@@ -189,7 +322,7 @@ def initialize_conversation_state():
         init_txt = get_initial_knowledge_prompt()
         if init_txt:
             st.session_state.messages.append(
-                {"role": "user", "content": init_txt, "is_knowledge_prompt": True}
+                Turno("user", init_txt, is_knowledge_prompt=True)
             )
 
     if "save_conversation_enabled" not in st.session_state:
@@ -216,11 +349,12 @@ def enable_saving():
         if st.session_state.current_conversation_id is None:
             initial_data = {
                 "title": st.session_state.current_conversation_title,
-                "start_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "turns": [msg for msg in st.session_state.messages if not msg.get("is_knowledge_prompt", False)]
+                "start_time": ahora(),
+                "turns": [msg.a_firestore() for msg in st.session_state.messages if not msg.is_knowledge_prompt]
             }
             
             st.session_state.current_conversation_id = create_new_conversation(db, current_user_id, initial_data)
+            indexar_en_busqueda(list(enumerate(t["content"] for t in initial_data["turns"])))
             #st.success(f"Conversación marcada para guardar.")
             st.toast("✅ Conversación guardada. Los mensajes futuros se guardarán automáticamente.")
     else:
@@ -231,6 +365,7 @@ def delete_conversation():
     if st.session_state.current_conversation_id:
         try:
             delete_document(db, current_user_id, "conversaciones", st.session_state.current_conversation_id)
+            desindexar_conversacion(db, current_user_id, st.session_state.current_conversation_id)
             
             #st.success(f"Conversación eliminada de Firestore.")
             st.toast("🗑️ Conversación eliminada.")
@@ -240,17 +375,21 @@ def delete_conversation():
     reset_conversation_state()
     st.rerun()
 
-def load_conversation(conversation_id):
-    """Carga una conversación específica de Firestore en el st.session_state.messages."""
+def load_conversation(conversation_id, turno: int | None = None):
+    """Carga una conversación específica de Firestore en el st.session_state.messages.
+
+    Si se indica `turno` (el encontrado por la búsqueda), la conversación se muestra a partir de él.
+    """
     doc = get_document(db, current_user_id, "conversaciones", conversation_id)
     if doc.exists:
         data = doc.to_dict()
         
         reset_conversation_state() 
         
-        st.session_state.messages.extend(data.get("turns", []))
+        st.session_state.messages.extend(Turno.desde_firestore(t) for t in data.get("turns", []))
         
         st.session_state.current_conversation_id = conversation_id
+        st.session_state.turno_destacado = turno
         st.session_state.save_conversation_enabled = True # Ya se guardan futuras interacciones
         st.session_state.current_conversation_title = data.get("title", f"Conversación {conversation_id[:6]}")
         st.info(f"Conversación '{st.session_state.current_conversation_title}' cargada desde Firestore.")
@@ -263,18 +402,33 @@ def reset_conversation_state():
     init_txt = get_initial_knowledge_prompt()
     if init_txt:
         st.session_state.messages.append(
-            {"role": "user", "content": init_txt, "is_knowledge_prompt": True}
+            Turno("user", init_txt, is_knowledge_prompt=True)
         )
 
     st.session_state.save_conversation_enabled = False
     st.session_state.current_conversation_id = None
+    st.session_state.turno_destacado = None
     st.session_state.current_conversation_title = f"Conversación {datetime.now().strftime('%Y-%m-%d %H:%M')}"
 
+def indexar_en_busqueda(turnos: list[tuple[int, str]]) -> None:
+    """Añade turnos (índice, texto) de la conversación actual al índice de búsqueda."""
+    try:
+        indexar_turnos(db, current_user_id, st.session_state.current_conversation_id, turnos)
+    except Exception as e:
+        # La conversación ya está guardada; el índice se completa al reconstruirlo
+        st.warning(f"No se pudo actualizar el índice de búsqueda: {e}")
+
+def guardar_turno(turno: Turno) -> None:
+    """Guarda en Firestore un turno recién añadido a la conversación actual y lo indexa para la búsqueda."""
+    save_conversation_turn(db, current_user_id, st.session_state.current_conversation_id, turno.a_firestore())
+    indice = sum(1 for msg in st.session_state.messages if not msg.is_knowledge_prompt) - 1
+    indexar_en_busqueda([(indice, turno.content)])
+
 def handle_new_conversation():
     """Gestiona el inicio de una nueva conversación, preguntando si guardar la actual si no está guardada."""
     
     # Comprobamos si hay mensajes en el chat actual (ignorando el prompt inicial si existe)
-    chat_messages = [msg for msg in st.session_state.messages if not msg.get("is_knowledge_prompt", False)]
+    chat_messages = [msg for msg in st.session_state.messages if not msg.is_knowledge_prompt]
     
     # Solo mostramos el diálogo de guardar si hay mensajes Y la conversación actual no está ya guardándose
     if chat_messages and not st.session_state.save_conversation_enabled:
@@ -285,6 +439,8 @@ def handle_new_conversation():
         reset_conversation_state()
         st.rerun()
 
+CONVERSACIONES_POR_PAGINA = 20
+
 def load_conversation_history_sidebar():
     """Carga y muestra el historial de conversaciones en la sidebar, incluyendo el control de guardado."""
     
@@ -323,34 +479,25 @@ def load_conversation_history_sidebar():
     
     # Sección del historial de conversaciones
     st.sidebar.subheader("Historial de Conversaciones")
+
+    consulta = st.sidebar.text_input("🔎 Buscar en conversaciones", key="busqueda_conversaciones",
+                                     placeholder="p. ej. la reunión con mi jefe")
+    if consulta.strip():
+        show_search_results(consulta)
+        return
     
-    # Obtener todas las conversaciones del usuario desde Firestore
-    conversations_docs = get_all_documents(db, current_user_id, "conversaciones")
-    docs_list = list(conversations_docs)
+    # Conversaciones más recientes primero, ordenadas y limitadas en Firestore (sin descargar los turnos)
+    limite = CONVERSACIONES_POR_PAGINA * st.session_state.get("paginas_conversaciones", 1)
+    docs_list = get_recent_conversations(db, current_user_id, limit=limite + 1)
+    hay_mas = len(docs_list) > limite
+    docs_list = docs_list[:limite]
     
     if not docs_list:
         st.sidebar.info("Aún no tienes conversaciones guardadas.")
         return
 
-    sorted_docs = []
-    for doc in docs_list:
-        data = doc.to_dict()
-        start_time_str = data.get("start_time")
-        if start_time_str:
-            try:
-                start_time_dt = datetime.strptime(start_time_str, "%Y-%m-%d %H:%M:%S")
-            except ValueError:
-                start_time_dt = datetime.min
-        else:
-            start_time_dt = datetime.min
-        
-        sorted_docs.append((start_time_dt, doc))
-
-    # Ordenar por fecha de inicio descendente
-    sorted_docs.sort(key=lambda x: x[0], reverse=True)
-
     # Mostrar las conversaciones en la sidebar
-    for _, doc in sorted_docs:
+    for doc in docs_list:
         doc_id = doc.id
         data = doc.to_dict()
         title = data.get("title", f"Conversación {doc_id[:6]}")
@@ -360,23 +507,46 @@ def load_conversation_history_sidebar():
             load_conversation(doc_id)
             st.rerun()
 
+    if hay_mas and st.sidebar.button("Ver más conversaciones", use_container_width=True):
+        st.session_state.paginas_conversaciones = st.session_state.get("paginas_conversaciones", 1) + 1
+        st.rerun()
+
+def show_search_results(consulta: str):
+    """Muestra en la sidebar las conversaciones que coinciden con la búsqueda; cada una se abre en el turno encontrado."""
+    try:
+        resultados = buscar_conversaciones(db, current_user_id, consulta)
+    except Exception as e:
+        st.sidebar.error(f"Error al buscar en las conversaciones: {e}")
+        return
+    if not resultados:
+        st.sidebar.info("Ninguna conversación coincide con la búsqueda.")
+        return
+
+    for resultado in resultados:
+        etiqueta = resultado.titulo
+        if resultado.fecha:
+            etiqueta += f" · {formatear_fecha(resultado.fecha, '%d/%m/%Y')}"
+        if st.sidebar.button(etiqueta, key=f"search_conv_{resultado.conversacion_id}", use_container_width=True):
+            load_conversation(resultado.conversacion_id, turno=resultado.turno)
+            st.rerun()
+        if resultado.fragmento:
+            st.sidebar.caption(resultado.fragmento)
+
 # ──────────────────────────────────────────────────────────────
 # FUNCIÓN DE LLAMADA A GEMINI
 # ──────────────────────────────────────────────────────────────
-@st.cache_resource(show_spinner=False)
-def get_gemini_client() -> genai.Client:
-    return genai.Client(vertexai=True, project="tfm-pablodm", location="global")
-
-def stream_gemini_response(chat_history: list[dict]):
+def stream_gemini_response(chat_history: list[Turno]):
     client = get_gemini_client()
+    uso = UsoLlamada(MODELO_ASISTENTE)
+    tokens_conocimiento = sum(estimar_tokens(msg.content) for msg in chat_history if msg.is_knowledge_prompt)
 
     # Construir historial
     contents: list[types.Content] = []
     for msg in chat_history:
-        if msg.get("is_knowledge_prompt", False) and not msg["content"]:
+        if msg.is_knowledge_prompt and not msg.content:
             continue
-        role_for_api = "user" if msg["role"] == "user" else "model"
-        contents.append(types.Content(role=role_for_api, parts=[types.Part.from_text(text=msg["content"]) ]))
+        role_for_api = "user" if msg.role == "user" else "model"
+        contents.append(types.Content(role=role_for_api, parts=[types.Part.from_text(text=msg.content) ]))
 
     cfg = types.GenerateContentConfig(
         temperature=0.1,
@@ -396,15 +566,18 @@ def stream_gemini_response(chat_history: list[dict]):
         with st.spinner("Pensando..."):
             while True:
                 response_iter = client.models.generate_content_stream(
-                    model="gemini-2.5-flash",   # Antes gemini-2.5-flash-preview-05-20
+                    model=MODELO_ASISTENTE,
                     contents=contents,
                     config=cfg,
                 )
 
                 current_turn = ""
                 function_call_detected = False
+                metadatos = None
 
                 for chunk in response_iter:
+                    # Los tokens de la llamada llegan completos en el último fragmento
+                    metadatos = chunk.usage_metadata or metadatos
                     if chunk.candidates and chunk.candidates[0].content:
                         for part in chunk.candidates[0].content.parts:
                             if part.function_call:
@@ -414,10 +587,11 @@ def stream_gemini_response(chat_history: list[dict]):
 
                                 if fname in function_map:
                                     result = function_map[fname](**fargs)
-                                    st.toast(
-                                        f"✅ Memoria: '{fargs.get('memoria', '')[:40].strip()}...'.",
-                                        icon="✅",
-                                    )
+                                    if fname == "guardar_memoria":
+                                        st.toast(
+                                            f"✅ Memoria: '{fargs.get('memoria', '')[:40].strip()}...'.",
+                                            icon="✅",
+                                        )
                                     contents.append(
                                         types.Content(role="model", parts=[part])
                                     )
@@ -440,8 +614,12 @@ def stream_gemini_response(chat_history: list[dict]):
                             else:
                                 current_turn += part.text
                                 full_response_text += part.text
+                                uso.marcar_primer_token()
                                 yield full_response_text
 
+                uso.anadir_metadatos(metadatos)
+                if function_call_detected:
+                    uso.rondas_herramientas += 1
                 if not function_call_detected:
                     # Hemos terminado este turno
                     break
@@ -449,6 +627,10 @@ def stream_gemini_response(chat_history: list[dict]):
         st.error(f"Error al generar respuesta del modelo: {e}")
         yield "Lo siento, hubo un error al procesar tu solicitud."
 
+    uso.tokens_conocimiento = tokens_conocimiento * uso.llamadas
+    uso.terminar()
+    registrar_uso(uso)
+
 # ──────────────────────────────────────────────────────────────
 # RENDER DEL HISTORIAL Y ENTRADA DE USUARIO
 # ──────────────────────────────────────────────────────────────
@@ -486,11 +668,23 @@ with st.sidebar:
 # ──────────────────────────────────────────────────────────────
 # HISTORIAL DE CHAT
 # ──────────────────────────────────────────────────────────────
+def show_turn(msg: Turno):
+    with st.chat_message(msg.role):
+        st.markdown(msg.content, unsafe_allow_html=True)
+
 if not st.session_state.get("show_save_dialog", False):
-    for msg in st.session_state.messages:
-        if not msg.get("is_knowledge_prompt", False):
-            with st.chat_message(msg["role"]):
-                st.markdown(msg["content"], unsafe_allow_html=True)
+    chat_messages = [msg for msg in st.session_state.messages if not msg.is_knowledge_prompt]
+    destacado = st.session_state.get("turno_destacado")
+    if destacado is not None and 0 <= destacado < len(chat_messages):
+        # Conversación abierta desde la búsqueda: los turnos anteriores al encontrado quedan plegados
+        if destacado:
+            with st.expander(f"{destacado} mensajes anteriores"):
+                for msg in chat_messages[:destacado]:
+                    show_turn(msg)
+        st.caption("🔎 Turno encontrado en la búsqueda")
+        chat_messages = chat_messages[destacado:]
+    for msg in chat_messages:
+        show_turn(msg)
 
 # ──────────────────────────────────────────────────────────────
 # ENTRADA DEL USUARIO
@@ -500,18 +694,14 @@ if prompt := st.chat_input("Escribe tu mensaje", disabled=st.session_state.get("
         st.markdown(prompt, unsafe_allow_html=True)
 
     # Guardar en historial (local)
-    user_message_data = {"role": "user", "content": prompt}
+    user_message_data = Turno("user", prompt, ahora())
     st.session_state.messages.append(user_message_data)
+    st.session_state.turno_destacado = None
 
     # Guardar el turno del usuario en Firestore si el guardado está habilitado
     if st.session_state.save_conversation_enabled and st.session_state.current_conversation_id:
-        user_turn_data = {
-            "role": "user",
-            "content": prompt,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
         # Llama a la función de guardado de turno que usa ArrayUnion
-        save_conversation_turn(db, current_user_id, st.session_state.current_conversation_id, user_turn_data)
+        guardar_turno(user_message_data)
 
     # Llamar al modelo y mostrar la respuesta en streaming
     with st.chat_message("assistant"):
@@ -522,17 +712,12 @@ if prompt := st.chat_input("Escribe tu mensaje", disabled=st.session_state.get("
             placeholder.markdown(assistant_reply, unsafe_allow_html=True)
 
     # Añadir respuesta final al historial (local)
-    assistant_message_data = {"role": "assistant", "content": assistant_reply}
+    assistant_message_data = Turno("assistant", assistant_reply, ahora())
     st.session_state.messages.append(assistant_message_data)
     
     # Guardar el turno del asistente en Firestore si el guardado está habilitado
     if st.session_state.save_conversation_enabled and st.session_state.current_conversation_id:
-        assistant_turn_data = {
-            "role": "assistant",
-            "content": assistant_reply,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
         # Llama a la función de guardado de turno que usa ArrayUnion
-        save_conversation_turn(db, current_user_id, st.session_state.current_conversation_id, assistant_turn_data)
+        guardar_turno(assistant_message_data)
 
     st.rerun()
\ No newline at end of file
@@ -2,15 +2,23 @@
 # Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
 
 import streamlit as st
+import io
 import json
 import os
-from copy import deepcopy
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from firestore_utils import get_firestore_client, add_document, get_all_documents, update_document, delete_document
+from firestore_utils import get_firestore_client, invalidate_cache, new_document_id, set_document, stream_documents, update_document_diff, delete_document
 from gcs_utils import read_csv_from_gcs
+from analitica_utils import (CARACTERISTICAS, conteo_esferas, conteo_por_nivel, distribucion_componente,
+                             media_componentes, perfil_grupos, personas_a_dataframes, resumen_red, tabla_idiomas)
+from importacion_utils import COLUMNAS_CSV, exportar_personas, importar_personas, leer_personas
+from modelos import Idioma, Persona, validar
+from perfilado_utils import perfilar_pagina
+from personas_utils import (COMPONENTES_TEMPERAMENTALES, EDAD_MAXIMA, ESFERAS_BASE, IDIOMAS_BASE, NIVELES_IDIOMA,
+                            NIVELES_RELACION, SEXOS, SOFT_SKILLS_BASE)
+from sync_utils import get_user_replica
 
 current_user_id = st.session_state.get("user_id")
 
@@ -28,71 +36,59 @@ def load_tech_skills() -> list[str]:
 
 TECH_SKILLS_BASE = load_tech_skills()
 
-SOFT_SKILLS_BASE = [
-    "Trabajo en equipo", "Comunicación", "Liderazgo",
-    "Gestión del tiempo", "Resolución de conflictos",
-    "Pensamiento crítico", "Adaptabilidad", "Creatividad",
-    "Organización", "Negociación", "Inteligencia Emocional",
-    "Proactividad", "Orientación al cliente"
-]
-IDIOMAS_BASE     = [
-    "Español", "Inglés", "Francés", "Alemán", "Italiano",
-    "Portugués", "Chino", "Japonés", "Árabe", "Ruso",
-    "Catalán", "Gallego", "Euskera", "Polaco"
-]
-NIVELES_IDIOMA   = [
-    "Conocimiento bajo", "Básico", "Intermedio",
-    "Avanzado", "Hablante nativo"
-]
-
-ESFERAS_BASE = {
-    "laboral":     ["Jefe", "Subordinado", "Colega", "Mentor", "Cliente", "Proveedor", "Socio"],
-    "familiar":    ["Padre", "Madre", "Hijo", "Hija", "Hermano", "Hermana",
-                     "Sobrino", "Sobrina", "Abuelo", "Abuela", "Nieto", "Nieta", "Tío", "Tía", "Primo", "Prima"],
-    "sentimental": ["Pareja", "Novio", "Novia", "Esposo", "Esposa", "Ex-pareja"],
-    "académica":   ["Profesor", "Alumno", "Tutor", "Compañero", "Mentor", "Mentee"],
-    "asistencial": ["Cuidador", "Paciente", "Médico", "Terapeuta", "Enfermero", "Asistente social"],
-    "contractual": ["Cliente", "Proveedor", "Socio", "Consultor", "Prestamista",
-                     "Inspector", "Becario", "Empleado", "Contratista", "Arrendador", "Arrendatario"],
-}
-
-NIVELES_RELACION = ["Muy bajo", "Bajo", "Medio", "Alto", "Muy alto"]
-
-# UTILIDADES FIRESTORE
-def load_data_from_firestore() -> list[dict]:
+# PAGINACIÓN
+PERSONAS_POR_PAGINA = 20
+
+def ids_pagina_actual(filtrados: set[str] | None = None) -> list[str]:
     """
-    Carga la lista de sujetos desde Firestore.
-    Devuelve una lista vacía si la colección no tiene documentos.
+    Devuelve los IDs de la página actual de personas, ordenadas por nombre.
+    Las personas se leen de la réplica local que mantienen los listeners de Firestore;
+    si se indica `filtrados`, solo se paginan esas.
     """
-    try:
-        db = get_firestore_client()
-        docs = get_all_documents(db, current_user_id, FIRESTORE_COLLECTION)
-        personas = []
-        for doc in docs:
-            persona_data = doc.to_dict()
-            persona_data["ID"] = doc.id
-            personas.append(persona_data)
-        return personas
-    except Exception as err:
-        st.error(f"Error al cargar datos desde Firestore: {err}. Se cargará una lista vacía.")
-        return []
-
-# FUNCIÓN DE VALIDACIÓN
-def validar_persona(persona: dict) -> tuple[bool, str]:
+    store = st.session_state.personas
+    ids = store.ids_ordenados() if filtrados is None else sorted(filtrados, key=store.nombre)
+    ultima_pagina = max(0, (len(ids) - 1) // PERSONAS_POR_PAGINA)
+    st.session_state.pagina_personas = min(st.session_state.pagina_personas, ultima_pagina)
+    inicio = st.session_state.pagina_personas * PERSONAS_POR_PAGINA
+    st.session_state.hay_pagina_siguiente = inicio + PERSONAS_POR_PAGINA < len(ids)
+    return ids[inicio:inicio + PERSONAS_POR_PAGINA]
+
+def reiniciar_pagina():
+    """Vuelve a la primera página (al cambiar los filtros)."""
+    st.session_state.pagina_personas = 0
+
+# BÚSQUEDA POR FACETAS
+def filtros_busqueda() -> set[str] | None:
     """
-    Comprueba campos obligatorios y el rango de los componentes temperamentales.
+    Muestra los filtros de búsqueda y devuelve los IDs de las personas que los cumplen,
+    o None si no hay ningún filtro activo. Las consultas se resuelven en el índice invertido de la réplica.
     """
-    nombre = persona.get("datos_personales", {}).get("nombre", "").strip()
-    if not nombre:
-        return False, "El nombre es obligatorio."
-    
-    temps = persona.get("componentes_temperamentales", {})
-    if len(temps) != 7:
-        return False, "Faltan puntajes temperamentales. Deben ser 7."
-    for k, v in temps.items():
-        if not isinstance(v, (int, float)) or not (0 <= v <= 17):
-            return False, f"El valor de '{k}' debe ser un número entre 0 y 17."
-    return True, ""
+    indice = get_user_replica(current_user_id).indice
+
+    def opciones(faceta: str) -> list[str]:
+        return [valor for valor, _ in indice.valores(faceta)]
+
+    with st.expander("🔎 Buscar y filtrar", expanded=False):
+        nombre = st.text_input("Nombre", key="filtro_nombre", on_change=reiniciar_pagina)
+        col_f1, col_f2 = st.columns(2)
+        with col_f1:
+            esferas = st.multiselect("Esferas", opciones("esfera"), key="filtro_esfera", on_change=reiniciar_pagina)
+            roles = st.multiselect("Roles", opciones("rol"), key="filtro_rol", on_change=reiniciar_pagina)
+            soft = st.multiselect("Soft skills", opciones("soft"), key="filtro_soft", on_change=reiniciar_pagina)
+            tecnicas = st.multiselect("Habilidades técnicas", opciones("tecnica"), key="filtro_tecnica",
+                                      on_change=reiniciar_pagina)
+        with col_f2:
+            idioma = st.selectbox("Idioma", [""] + opciones("idioma"), key="filtro_idioma", on_change=reiniciar_pagina)
+            nivel = st.selectbox("Nivel mínimo", [""] + NIVELES_IDIOMA, key="filtro_nivel",
+                                 disabled=not idioma, on_change=reiniciar_pagina)
+            niveles = {
+                campo: st.multiselect(f"Nivel de {campo}", NIVELES_RELACION, key=f"filtro_{campo}",
+                                      on_change=reiniciar_pagina)
+                for campo in ["formalidad", "amistad", "conflicto"]
+            }
+
+    facetas = {"esfera": esferas, "rol": roles, "soft": soft, "tecnica": tecnicas, **niveles}
+    return indice.buscar(nombre, facetas, idioma or None, (nivel or None) if idioma else None)
 
 # INICIALIZACIÓN DE SESIÓN
 if "password_entered" not in st.session_state:
@@ -102,9 +98,13 @@ if not st.session_state.get("password_entered", False):
     st.warning("Por favor, inicia sesión en la página principal para acceder.")
     st.stop()
 
+perfilar_pagina(current_user_id, "Mi Gente")
+
 # Inicialización de variables de estado si no existen
-if "personas" not in st.session_state:
-    st.session_state.personas = load_data_from_firestore()
+# Las personas se comparten con las demás páginas y sesiones a través de la réplica del usuario
+st.session_state.personas = get_user_replica(current_user_id).personas
+if "pagina_personas" not in st.session_state:
+    st.session_state.pagina_personas = 0
 if "modo" not in st.session_state:
     st.session_state.modo = "listar"
 if "persona_id_editar" not in st.session_state:
@@ -115,20 +115,146 @@ st.title("👥 Mi Gente ")
 #st.caption("Gestiona fichas detalladas de tus personas de referencia.")
 
 # NUEVA PERSONA
-col_head1, col_head2 = st.columns([3, 1])
+col_head1, col_head2, col_head3, col_head4 = st.columns([1, 1, 1, 1])
+with col_head1:
+    if st.button("📊 Análisis"):
+        st.session_state.modo = "analitica"
+        st.rerun()
 with col_head2:
+    if st.button("📥 Importar / exportar"):
+        st.session_state.modo = "importar"
+        st.rerun()
+with col_head4:
     if st.button("➕ Nueva persona"):
         st.session_state.modo = "nuevo"
         st.session_state.persona_id_editar = None
         st.rerun()
 
+# ANÁLISIS DE LA RED
+def tablas_analitica() -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Devuelve las tablas de análisis de las personas, reconstruidas solo cuando cambia
+    la versión del almacén de personas.
+    """
+    store = st.session_state.personas
+    version = store.version
+    cache = st.session_state.get("_analitica")
+    if cache is None or cache[0] != version:
+        st.session_state._analitica = (version, personas_a_dataframes(store))
+    return st.session_state._analitica[1]
+
+def grupos_temperamentales(k: int) -> dict[str, int]:
+    """Grupos k-means de la matriz de temperamentos, cacheados por versión y número de grupos."""
+    clave = (st.session_state.personas.version, k)
+    cache = st.session_state.get("_grupos")
+    if cache is None or cache[0] != clave:
+        st.session_state._grupos = (clave, get_user_replica(current_user_id).temperamentos.agrupar(k))
+    return st.session_state._grupos[1]
+
+def seccion_analitica():
+    """Panel con cifras y gráficas agregadas de toda la red de personas."""
+    df, df_idiomas = tablas_analitica()
+    if df.empty:
+        st.info("Aún no tienes registros. Crea una nueva persona para empezar.")
+    else:
+        resumen = resumen_red(df)
+        col_m1, col_m2, col_m3 = st.columns(3)
+        col_m1.metric("Personas", resumen["personas"])
+        col_m2.metric("Edad media", f"{resumen['edad_media']:.0f}" if resumen["edad_media"] is not None else "N/A")
+        col_m3.metric("Conflicto alto o muy alto", f"{resumen['conflicto_alto']} ({resumen['conflicto_alto_pct']:.0%})")
+
+        st.markdown("##### Características de la relación")
+        caracteristica = st.selectbox("Característica", CARACTERISTICAS, format_func=str.capitalize)
+        st.bar_chart(conteo_por_nivel(df, caracteristica))
+
+        st.markdown("##### Componentes temperamentales")
+        st.bar_chart(media_componentes(df))
+        componente = st.selectbox("Distribución de puntuaciones", COMPONENTES_TEMPERAMENTALES)
+        st.bar_chart(distribucion_componente(df, componente))
+
+        st.markdown("##### Grupos temperamentales")
+        k = st.slider("Número de grupos", min_value=2, max_value=6, value=3)
+        st.dataframe(perfil_grupos(df, grupos_temperamentales(k)), use_container_width=True)
+        sin_datos = len(get_user_replica(current_user_id).temperamentos.sin_datos)
+        if sin_datos:
+            st.caption(f"{sin_datos} personas sin componentes temperamentales no entran en los grupos.")
+
+        st.markdown("##### Esferas de relación")
+        st.bar_chart(conteo_esferas(df))
+
+        st.markdown("##### Idiomas")
+        idiomas = tabla_idiomas(df_idiomas)
+        if idiomas.empty:
+            st.write("No especificados")
+        else:
+            st.dataframe(idiomas, use_container_width=True)
+
+    if st.button("Volver", type="secondary", use_container_width=True):
+        st.session_state.modo = "listar"
+        st.rerun()
+
+# IMPORTACIÓN Y EXPORTACIÓN MASIVA
+def seccion_importar_exportar():
+    """
+    Importa personas desde un fichero CSV o JSONL (leído línea a línea y escrito por lotes)
+    y exporta la colección completa en los mismos formatos.
+    """
+    db = get_firestore_client()
+
+    st.subheader("Importar personas")
+    st.info(
+        "Sube un CSV con las columnas " + ", ".join(f"`{c}`" for c in COLUMNAS_CSV)
+        + " (listas separadas por `;`, idiomas como `Idioma:Nivel`) o un JSONL con una persona por línea."
+    )
+    fichero = st.file_uploader("Fichero de personas", type=["csv", "jsonl"])
+    if fichero is not None and st.button("📥 Importar", use_container_width=True):
+        formato = "csv" if fichero.name.lower().endswith(".csv") else "jsonl"
+        texto = io.TextIOWrapper(fichero, encoding="utf-8-sig", newline="")
+        barra = st.progress(0.0, text="Importando...")
+
+        def progreso(resultado):
+            avance = min(1.0, fichero.tell() / fichero.size) if fichero.size else 1.0
+            barra.progress(avance, text=f"{resultado.importadas} personas importadas...")
+
+        try:
+            resultado = importar_personas(db, current_user_id, leer_personas(texto, formato), progreso=progreso)
+            invalidate_cache(current_user_id, FIRESTORE_COLLECTION)
+        except Exception as e:
+            st.error(f"Error al importar las personas: {e}")
+        else:
+            barra.progress(1.0, text="Importación finalizada.")
+            st.success(
+                f"{resultado.importadas} personas importadas en {resultado.lotes} lotes "
+                f"({resultado.personas_por_segundo:.0f} personas/s)."
+            )
+            if resultado.errores:
+                st.warning(f"Se omitieron {len(resultado.errores)} filas no válidas:")
+                st.dataframe(pd.DataFrame(resultado.errores, columns=["Línea", "Error"]), hide_index=True)
+
+    st.subheader("Exportar personas")
+    formato_exportacion = st.radio("Formato", ["jsonl", "csv"], horizontal=True)
+    if st.button("📤 Preparar exportación", use_container_width=True):
+        salida = io.StringIO()
+        personas = (doc.to_dict() for doc in stream_documents(db, current_user_id, FIRESTORE_COLLECTION))
+        total = exportar_personas(personas, salida, formato_exportacion)
+        st.download_button(
+            f"⬇️ Descargar {total} personas",
+            salida.getvalue(),
+            file_name=f"personas.{formato_exportacion}",
+            use_container_width=True,
+        )
+
+    if st.button("Volver", type="secondary", use_container_width=True):
+        st.session_state.modo = "listar"
+        st.rerun()
+
 # FORMULARIO
 def formulario_persona(persona: dict, es_nueva: bool):
     """
     Genera la interfaz de usuario para crear o modificar una persona.
-    Devuelve el diccionario de la persona con los datos ingresados.
+    Los datos introducidos se recogen en un registro Persona, que se valida y se guarda.
     """
-    persona_temp = deepcopy(persona)
+    persona_temp = Persona.desde_firestore(persona)
 
     st.subheader("Datos del Sujeto")
 
@@ -138,60 +264,59 @@ def formulario_persona(persona: dict, es_nueva: bool):
         st.info("Completa los campos")
     else:
         st.info("Edita los campos pertinentes")
-        st.session_state.persona_id_editar = persona_temp.get("ID")
+        st.session_state.persona_id_editar = persona_temp.id
 
 
     # --- Datos Personales ---
     with st.expander("📄 Datos personales", expanded=False):
-        dp = persona_temp.setdefault("datos_personales", {})
-        dp["nombre"] = st.text_input(
+        dp = persona_temp.datos_personales
+        dp.nombre = st.text_input(
             "Nombre o apodo *",
-            dp.get("nombre", ""),
+            dp.nombre,
             help="Cómo te refieres a esta persona. No se necesitan apellidos a menos que sean distintivos"
         )
-        dp["sexo"]   = st.selectbox(
+        dp.sexo   = st.selectbox(
             "Sexo",
-            ["", "Varón", "Mujer"],
-            index=["", "Varón", "Mujer"].index(dp.get("sexo", ""))
+            SEXOS,
+            index=SEXOS.index(dp.sexo)
         )
-        dp["edad"]   = st.number_input(
+        dp.edad   = st.number_input(
             "Edad (años)",
-            min_value=0, max_value=120, value=dp.get("edad", 0), step=1
+            min_value=0, max_value=EDAD_MAXIMA, value=dp.edad, step=1
         )
-        dp["estado_civil"] = st.text_input(
+        dp.estado_civil = st.text_input(
             "Estado civil",
-            dp.get("estado_civil", "")
+            dp.estado_civil
         )
-        dp["puesto_trabajo"] = st.text_input(
+        dp.puesto_trabajo = st.text_input(
             "Puesto / profesión",
-            dp.get("puesto_trabajo", "")
+            dp.puesto_trabajo
         )
-        dp["otros_datos"] = st.text_area(
+        dp.otros_datos = st.text_area(
             "Otros datos",
-            dp.get("otros_datos", ""),
+            dp.otros_datos,
             help="Cualquier otro dato relevante (ej: discapacidad, nacionalidad, cómo se comporta, etc.)"
         )
 
     # --- Componentes Temperamentales ---
     with st.expander("🧬 Componentes temperamentales*", expanded=False):
         st.markdown("Asigna una puntuación (entre 0 y 17) para cada componente temperamental. Estos campos son obligatorios.")
-        ct = persona_temp.setdefault("componentes_temperamentales", {})
-        for comp in ["Normaloide", "Histeroide", "Mánico", "Depresivo",
-                     "Autístico", "Paranoide", "Epileptoide"]:
-            ct[comp] = st.number_input(
+        ct = persona_temp.componentes
+        for i, comp in enumerate(COMPONENTES_TEMPERAMENTALES):
+            ct[i] = st.number_input(
                 comp,
                 min_value=0.0, max_value=17.0,
-                value=float(ct.get(comp, 0.0)),
+                value=float(ct[i] or 0.0),
                 step=0.5, format="%.1f",
                 help=f"Puntuación para el componente '{comp}' (0-17)."
             )
 
     # ---------- Capacidades ----------
     with st.expander("💡 Capacidades", expanded=False):
-        caps = persona_temp.setdefault("capacidades", {})
+        caps = persona_temp.capacidades
 
         st.markdown("##### Habilidades técnicas")
-        current_tech_skills = caps.get("Habilidades técnicas", [])
+        current_tech_skills = caps.tecnicas
         all_tech_skills_options = sorted(list(set(TECH_SKILLS_BASE + current_tech_skills)))
         
         selected_tech_skills = st.multiselect(
@@ -204,10 +329,10 @@ def formulario_persona(persona: dict, es_nueva: bool):
         if new_tech_skills_input:
             new_skills = [s.strip() for s in new_tech_skills_input.split(',') if s.strip()]
             selected_tech_skills = sorted(list(set(selected_tech_skills + new_skills)))
-        caps["Habilidades técnicas"] = selected_tech_skills
+        caps.tecnicas = selected_tech_skills
 
         st.markdown("##### Soft skills")
-        current_soft_skills = caps.get("Soft skills", [])
+        current_soft_skills = caps.soft
         all_soft_skills_options = sorted(list(set(SOFT_SKILLS_BASE + current_soft_skills)))
 
         selected_soft_skills = st.multiselect(
@@ -220,14 +345,14 @@ def formulario_persona(persona: dict, es_nueva: bool):
         if new_soft_skills_input:
             new_skills = [s.strip() for s in new_soft_skills_input.split(',') if s.strip()]
             selected_soft_skills = sorted(list(set(selected_soft_skills + new_skills)))
-        caps["Soft skills"] = selected_soft_skills
+        caps.soft = selected_soft_skills
 
         st.markdown("##### Idiomas")
         st.info("Añade cada idioma y su nivel")
-        idiomas_actual = caps.get("Idiomas", [])
+        idiomas_actual = [i.a_firestore() for i in caps.idiomas]
         df_idiomas = pd.DataFrame(idiomas_actual or [{"Idioma": "", "Nivel": ""}])
         
-        all_idiomas_options = sorted(list(set(IDIOMAS_BASE + [i["Idioma"] for i in idiomas_actual if i["Idioma"]])))
+        all_idiomas_options = sorted(list(set(IDIOMAS_BASE + [i.idioma for i in caps.idiomas if i.idioma])))
 
         df_editado = st.data_editor(
             df_idiomas,
@@ -245,16 +370,16 @@ def formulario_persona(persona: dict, es_nueva: bool):
             hide_index=True,
             use_container_width=True,
         )
-        caps["Idiomas"] = [
-            {"Idioma": row["Idioma"], "Nivel": row["Nivel"]}
+        caps.idiomas = [
+            Idioma(row["Idioma"], row["Nivel"])
             for _, row in df_editado.iterrows()
             if row["Idioma"] and row["Nivel"]
         ]
 
     # Relaciones
     with st.expander("🔗 Relaciones", expanded=False):
-        rel = persona_temp.setdefault("relaciones", {})
-        esf = rel.setdefault("esferas", {})
+        rel = persona_temp.relaciones
+        esf = rel.esferas
         
         st.markdown("##### Esferas de relación")
         st.info("Selecciona la relación de la persona contigo en las diferentes esferas")
@@ -279,27 +404,26 @@ def formulario_persona(persona: dict, es_nueva: bool):
         )
         esf["otras"] = [line.strip() for line in otras_esferas_input.splitlines() if line.strip()]
 
-        carac = rel.setdefault("características", {})
         st.markdown("##### Características de la relación")
 
-        carac["formalidad"] = st.selectbox(
+        rel.formalidad = st.selectbox(
             "Nivel de formalidad", NIVELES_RELACION,
-            index=NIVELES_RELACION.index(carac.get("formalidad", "Medio"))
-            if carac.get("formalidad") in NIVELES_RELACION else NIVELES_RELACION.index("Medio")
+            index=NIVELES_RELACION.index(rel.formalidad)
+            if rel.formalidad in NIVELES_RELACION else NIVELES_RELACION.index("Medio")
         )
-        carac["amistad"] = st.selectbox(
+        rel.amistad = st.selectbox(
             "Nivel de amistad", NIVELES_RELACION,
-            index=NIVELES_RELACION.index(carac.get("amistad", "Medio"))
-            if carac.get("amistad") in NIVELES_RELACION else NIVELES_RELACION.index("Medio")
+            index=NIVELES_RELACION.index(rel.amistad)
+            if rel.amistad in NIVELES_RELACION else NIVELES_RELACION.index("Medio")
         )
-        carac["conflicto"] = st.selectbox(
+        rel.conflicto = st.selectbox(
             "Nivel de conflicto", NIVELES_RELACION,
-            index=NIVELES_RELACION.index(carac.get("conflicto", "Medio"))
-            if carac.get("conflicto") in NIVELES_RELACION else NIVELES_RELACION.index("Medio")
+            index=NIVELES_RELACION.index(rel.conflicto)
+            if rel.conflicto in NIVELES_RELACION else NIVELES_RELACION.index("Medio")
         )
-        carac["otras"] = st.text_area(
+        rel.otras = st.text_area(
             "Añade otras características",
-            carac.get("otras", ""),
+            rel.otras,
             help="Cualquier otra característica relevante del vínculo (respuesta abierta)"
         )
     
@@ -307,41 +431,187 @@ def formulario_persona(persona: dict, es_nueva: bool):
     col_save, col_cancel = st.columns(2)
     with col_save:
         if st.button("💾 Guardar", use_container_width=True):
-            ok, msg = validar_persona(persona_temp)
+            ok, msg = validar(persona_temp)
             if not ok:
                 st.error(msg)
             else:
                 db = get_firestore_client()
-                persona_to_save = {k: v for k, v in persona_temp.items() if k != "ID"}
+                persona_to_save = persona_temp.a_firestore()
+                store = st.session_state.personas
 
+                # Se aplica el cambio en local y se deshace si la escritura en Firestore falla
                 if es_nueva:
                     try:
-                        doc_ref = add_document(db, current_user_id, FIRESTORE_COLLECTION, persona_to_save)
-                        st.success(f"Persona '{persona_temp['datos_personales']['nombre']}' creada correctamente.")
+                        nuevo_id = new_document_id(db, current_user_id, FIRESTORE_COLLECTION)
+                        store.crear(nuevo_id, persona_to_save,
+                                    lambda: set_document(db, current_user_id, FIRESTORE_COLLECTION, nuevo_id, persona_to_save))
+                        st.success(f"Persona '{persona_temp.nombre}' creada correctamente.")
                     except Exception as e:
                         st.error(f"Error al crear la persona: {e}")
                 else:
+                    persona_id = st.session_state.persona_id_editar
+                    # Solo se envían los campos que difieren de la versión cargada
+                    persona_anterior = {k: v for k, v in (store.get(persona_id) or {}).items() if k != "ID"}
                     try:
-                        update_document(db, current_user_id, FIRESTORE_COLLECTION, st.session_state.persona_id_editar, persona_to_save)
-                        st.success(f"Persona '{persona_temp['datos_personales']['nombre']}' actualizada correctamente.")
+                        store.actualizar(persona_id, persona_to_save,
+                                         lambda: update_document_diff(db, current_user_id, FIRESTORE_COLLECTION, persona_id,
+                                                                      persona_anterior, persona_to_save))
+                        st.success(f"Persona '{persona_temp.nombre}' actualizada correctamente.")
                     except Exception as e:
                         st.error(f"Error al actualizar la persona: {e}")
 
                 st.session_state.modo = "listar"
-                st.session_state.personas = load_data_from_firestore()
                 st.rerun()
     with col_cancel:
         if st.button("Cancelar", type="secondary", use_container_width=True):
             st.session_state.modo = "listar"
             st.rerun()
 
+# FICHA DE PERSONA (solo se renderiza cuando el usuario la despliega)
+def mostrar_ficha_persona(p: dict):
+    """Muestra el detalle completo de una persona junto con los botones de edición y borrado."""
+    nombre = p.get("datos_personales", {}).get("nombre", "Sin nombre")
+    persona_firestore_id = p.get("ID", "N/A")
+
+    st.markdown("##### Datos personales")
+    #st.json(p.get("datos_personales", {}))
+    dp = p.get("datos_personales", {})
+    if dp:
+        st.write(f"**Nombre:** {dp.get('nombre', 'N/A')}")
+        st.write(f"**Sexo:** {dp.get('sexo', 'N/A')}")
+        st.write(f"**Edad:** {dp.get('edad', 'N/A')}")
+        st.write(f"**Estado civil:** {dp.get('estado_civil', 'N/A')}")
+        st.write(f"**Puesto / profesión:** {dp.get('puesto_trabajo', 'N/A')}")
+        st.write(f"**Otros datos:** {dp.get('otros_datos', 'N/A')}")
+    else:
+        st.info("No hay datos personales registrados.")
+
+    st.markdown("##### Componentes temperamentales")
+    # Aquí va el bloque de la gráfica de componentes temperamentales
+    ct_data = p.get("componentes_temperamentales", {})
+    if ct_data and all(comp in ct_data for comp in ["Normaloide", "Histeroide", "Mánico", "Depresivo", "Autístico", "Paranoide", "Epileptoide"]):
+        # Mostrar valores como texto antes de la gráfica
+        for comp in ["Normaloide", "Histeroide", "Mánico", "Depresivo", "Autístico", "Paranoide", "Epileptoide"]:
+            st.write(f"- **{comp}:** {ct_data.get(comp, 'N/A')}")
+        df_temperamentos = pd.DataFrame(ct_data.items(), columns=['Componente', 'Puntuación'])
+        df_temperamentos['Puntuación'] = df_temperamentos['Puntuación'].astype(float)
+
+        orden_componentes = ["Normaloide", "Histeroide", "Mánico", "Depresivo", "Autístico", "Paranoide", "Epileptoide"]
+        df_temperamentos['Componente'] = pd.Categorical(df_temperamentos['Componente'], categories=orden_componentes, ordered=True)
+        df_temperamentos = df_temperamentos.sort_values('Componente')
+
+        fig, ax = plt.subplots(figsize=(8, 2))
+
+        sns.barplot(x='Puntuación', y='Componente', data=df_temperamentos, ax=ax, color='#808080', height=0.7)
+
+        ax.set_xlim(0, 17)
+
+        ax.set_facecolor('none')
+        fig.patch.set_alpha(0)
+
+        ax.set_xlabel("")
+        ax.set_ylabel("")
+
+        ax.set_xticks([])
+        ax.set_xticklabels([])
+
+        ax.tick_params(axis='y', labelsize=10, length=0, colors='#808080')
+
+        for spine in ax.spines.values():
+            spine.set_visible(False)
+
+        ax.grid(False)
+
+        plt.tight_layout()
+
+        st.pyplot(fig)
+        plt.close(fig)
+    elif ct_data:
+        st.info("Ingresa los 7 valores de los componentes temperamentales para ver la gráfica en modo edición.")
+    else:
+        st.info("No hay componentes temperamentales registrados.")
+
+    st.markdown("##### Capacidades")
+    caps = p.get("capacidades", {})
+    if caps:
+        st.markdown("**Habilidades técnicas:**")
+        st.write(", ".join(caps.get("Habilidades técnicas", [])) or "No especificadas")
+
+        st.markdown("**Soft skills:**")
+        st.write(", ".join(caps.get("Soft skills", [])) or "No especificadas")
+
+        st.markdown("**Idiomas:**")
+        idiomas = caps.get("Idiomas", [])
+        if idiomas:
+            for lang in idiomas:
+                st.write(f"- {lang.get('Idioma', 'N/A')}: {lang.get('Nivel', 'N/A')}")
+        else:
+            st.write("No especificados")
+    else:
+        st.write("No hay capacidades registradas.")
+
+    st.markdown("##### Relaciones")
+    rel = p.get("relaciones", {})
+    if rel:
+        st.markdown("**Esferas:**")
+        esferas = rel.get("esferas", {})
+        if esferas:
+            for esfera_key, roles in esferas.items():
+                if roles:
+                    st.write(f"- **{esfera_key.capitalize()}:** {', '.join(roles)}")
+        else:
+            st.write("No hay esferas de relación especificadas.")
+
+        st.markdown("**Características del vínculo:**")
+        carac = rel.get("características", {})
+        if carac:
+            st.write(f"Formalidad: {carac.get('formalidad', 'N/A')}")
+            st.write(f"Amistad: {carac.get('amistad', 'N/A')}")
+            st.write(f"Conflicto: {carac.get('conflicto', 'N/A')}")
+            st.write(f"Otras: {carac.get('otras', 'N/A')}")
+        else:
+            st.write("No hay características del vínculo especificadas.")
+    else:
+        st.write("No hay relaciones registradas.")
+
+    st.markdown("##### Afinidad temperamental")
+    temperamentos = get_user_replica(current_user_id).temperamentos
+    compatibilidad = temperamentos.compatibilidad_usuario().get(persona_firestore_id)
+    if compatibilidad is not None:
+        st.write(f"**Similitud contigo:** {compatibilidad:.0%}")
+    similares = temperamentos.mas_similares(persona_firestore_id, k=3)
+    if similares:
+        st.write("**Personas con temperamento más parecido:** " + ", ".join(
+            f"{st.session_state.personas.nombre(pid)} ({sim:.0%})" for pid, sim in similares))
+    elif compatibilidad is None:
+        st.write("No hay suficientes datos para comparar.")
+
+    # Botones de acción para editar o borrar la persona
+    col_e, col_b = st.columns(2)
+    with col_e:
+        if st.button("✏️ Editar", key=f"edit_{persona_firestore_id}", use_container_width=True):
+            st.session_state.modo = "editar"
+            st.session_state.persona_id_editar = persona_firestore_id
+            st.rerun()
+    with col_b:
+        if st.button("🗑️ Borrar", key=f"del_{persona_firestore_id}", use_container_width=True):
+            st.session_state.confirm_delete_id = persona_firestore_id
+            st.session_state.confirm_delete_name = nombre
+            st.rerun()
+
 # FLUJO PRINCIPAL DE LA APLICACIÓN
 if st.session_state.modo == "nuevo":
     formulario_persona({}, es_nueva=True)
 
+elif st.session_state.modo == "importar":
+    seccion_importar_exportar()
+
+elif st.session_state.modo == "analitica":
+    seccion_analitica()
+
 elif st.session_state.modo == "editar":
     persona_sel_id = st.session_state.persona_id_editar
-    persona_sel = next((p for p in st.session_state.personas if p.get("ID") == persona_sel_id), None)
+    persona_sel = st.session_state.personas.get(persona_sel_id)
     
     if persona_sel:
         st.write(f"### Editar persona **{persona_sel.get('datos_personales', {}).get('nombre', 'Sin nombre')}**")
@@ -353,7 +623,12 @@ elif st.session_state.modo == "editar":
 
 else:
     #st.subheader("Personas caracterizadas")
-    if not st.session_state.personas:
+    filtrados = filtros_busqueda()
+    personas_pagina = [p for p in map(st.session_state.personas.get, ids_pagina_actual(filtrados)) if p]
+
+    if filtrados is not None:
+        st.caption(f"{len(filtrados)} personas cumplen los filtros.")
+    elif not personas_pagina and st.session_state.pagina_personas == 0:
         st.info("Aún no tienes registros. Crea una nueva persona para empezar.")
 
     if "confirm_delete_id" not in st.session_state:
@@ -361,140 +636,48 @@ else:
     if "confirm_delete_name" not in st.session_state:
         st.session_state.confirm_delete_name = None
 
-    for p in st.session_state.personas:
+    for p in personas_pagina:
         nombre = p.get("datos_personales", {}).get("nombre", "Sin nombre")
         persona_firestore_id = p.get("ID", "N/A")
 
-        with st.expander(f"**{nombre}**"):
-            st.markdown("##### Datos personales")
-            #st.json(p.get("datos_personales", {}))
-            dp = p.get("datos_personales", {})
-            if dp:
-                st.write(f"**Nombre:** {dp.get('nombre', 'N/A')}")
-                st.write(f"**Sexo:** {dp.get('sexo', 'N/A')}")
-                st.write(f"**Edad:** {dp.get('edad', 'N/A')}")
-                st.write(f"**Estado civil:** {dp.get('estado_civil', 'N/A')}")
-                st.write(f"**Puesto / profesión:** {dp.get('puesto_trabajo', 'N/A')}")
-                st.write(f"**Otros datos:** {dp.get('otros_datos', 'N/A')}")
-            else:
-                st.info("No hay datos personales registrados.")
-
-            st.markdown("##### Componentes temperamentales")
-            # Aquí va el bloque de la gráfica de componentes temperamentales
-            ct_data = p.get("componentes_temperamentales", {})
-            if ct_data and all(comp in ct_data for comp in ["Normaloide", "Histeroide", "Mánico", "Depresivo", "Autístico", "Paranoide", "Epileptoide"]):
-                # Mostrar valores como texto antes de la gráfica
-                for comp in ["Normaloide", "Histeroide", "Mánico", "Depresivo", "Autístico", "Paranoide", "Epileptoide"]:
-                    st.write(f"- **{comp}:** {ct_data.get(comp, 'N/A')}")
-                df_temperamentos = pd.DataFrame(ct_data.items(), columns=['Componente', 'Puntuación'])
-                df_temperamentos['Puntuación'] = df_temperamentos['Puntuación'].astype(float)
-
-                orden_componentes = ["Normaloide", "Histeroide", "Mánico", "Depresivo", "Autístico", "Paranoide", "Epileptoide"]
-                df_temperamentos['Componente'] = pd.Categorical(df_temperamentos['Componente'], categories=orden_componentes, ordered=True)
-                df_temperamentos = df_temperamentos.sort_values('Componente')
-
-                fig, ax = plt.subplots(figsize=(8, 2))
-
-                sns.barplot(x='Puntuación', y='Componente', data=df_temperamentos, ax=ax, color='#808080', height=0.7)
-
-                ax.set_xlim(0, 17)
-
-                ax.set_facecolor('none')
-                fig.patch.set_alpha(0)
-
-                ax.set_xlabel("")
-                ax.set_ylabel("")
-
-                ax.set_xticks([])
-                ax.set_xticklabels([])
-
-                ax.tick_params(axis='y', labelsize=10, length=0, colors='#808080')
-
-                for spine in ax.spines.values():
-                    spine.set_visible(False)
-
-                ax.grid(False)
-
-                plt.tight_layout()
-
-                st.pyplot(fig)
-                plt.close(fig)
-            elif ct_data:
-                st.info("Ingresa los 7 valores de los componentes temperamentales para ver la gráfica en modo edición.")
-            else:
-                st.info("No hay componentes temperamentales registrados.")
-
-            st.markdown("##### Capacidades")
-            caps = p.get("capacidades", {})
-            if caps:
-                st.markdown("**Habilidades técnicas:**")
-                st.write(", ".join(caps.get("Habilidades técnicas", [])) or "No especificadas")
-
-                st.markdown("**Soft skills:**")
-                st.write(", ".join(caps.get("Soft skills", [])) or "No especificadas")
-
-                st.markdown("**Idiomas:**")
-                idiomas = caps.get("Idiomas", [])
-                if idiomas:
-                    for lang in idiomas:
-                        st.write(f"- {lang.get('Idioma', 'N/A')}: {lang.get('Nivel', 'N/A')}")
-                else:
-                    st.write("No especificados")
-            else:
-                st.write("No hay capacidades registradas.")
-
-            st.markdown("##### Relaciones")
-            rel = p.get("relaciones", {})
-            if rel:
-                st.markdown("**Esferas:**")
-                esferas = rel.get("esferas", {})
-                if esferas:
-                    for esfera_key, roles in esferas.items():
-                        if roles:
-                            st.write(f"- **{esfera_key.capitalize()}:** {', '.join(roles)}")
-                else:
-                    st.write("No hay esferas de relación especificadas.")
-
-                st.markdown("**Características del vínculo:**")
-                carac = rel.get("características", {})
-                if carac:
-                    st.write(f"Formalidad: {carac.get('formalidad', 'N/A')}")
-                    st.write(f"Amistad: {carac.get('amistad', 'N/A')}")
-                    st.write(f"Conflicto: {carac.get('conflicto', 'N/A')}")
-                    st.write(f"Otras: {carac.get('otras', 'N/A')}")
-                else:
-                    st.write("No hay características del vínculo especificadas.")
-            else:
-                st.write("No hay relaciones registradas.")
-
-            # Botones de acción para editar o borrar la persona
-            col_e, col_b = st.columns(2)
-            with col_e:
-                if st.button("✏️ Editar", key=f"edit_{persona_firestore_id}", use_container_width=True):
-                    st.session_state.modo = "editar"
-                    st.session_state.persona_id_editar = persona_firestore_id
-                    st.rerun()
-            with col_b:
-                if st.button("🗑️ Borrar", key=f"del_{persona_firestore_id}", use_container_width=True):
-                    st.session_state.confirm_delete_id = persona_firestore_id
-                    st.session_state.confirm_delete_name = nombre
-                    st.rerun()
+        # El detalle no se construye hasta que se despliega la ficha
+        if st.toggle(f"**{nombre}**", key=f"ver_{persona_firestore_id}"):
+            with st.container(border=True):
+                mostrar_ficha_persona(p)
+
+    # Paginación
+    pagina = st.session_state.pagina_personas
+    hay_siguiente = st.session_state.hay_pagina_siguiente
+    if pagina > 0 or hay_siguiente:
+        col_ant, col_pag, col_sig = st.columns([1, 2, 1])
+        with col_ant:
+            if st.button("⬅️ Anterior", disabled=pagina == 0, use_container_width=True):
+                st.session_state.pagina_personas -= 1
+                st.rerun()
+        with col_pag:
+            st.caption(f"Página {pagina + 1}")
+        with col_sig:
+            if st.button("Siguiente ➡️", disabled=not hay_siguiente, use_container_width=True):
+                st.session_state.pagina_personas += 1
+                st.rerun()
 
     if st.session_state.confirm_delete_id is not None:
         st.warning(f"¿Estás seguro de eliminar definitivamente a '{st.session_state.confirm_delete_name}'?")
         col_confirm_yes, col_confirm_no = st.columns(2)
         with col_confirm_yes:
             if st.button("✅ Sí, borrar", key="confirm_yes", use_container_width=True):
+                persona_id = st.session_state.confirm_delete_id
                 try:
                     db = get_firestore_client()
-                    delete_document(db, current_user_id, FIRESTORE_COLLECTION, st.session_state.confirm_delete_id)
+                    st.session_state.personas.eliminar(
+                        persona_id,
+                        lambda: delete_document(db, current_user_id, FIRESTORE_COLLECTION, persona_id))
                     st.success(f"Persona '{st.session_state.confirm_delete_name}' eliminada correctamente.")
                 except Exception as e:
                     st.error(f"Error al eliminar la persona: {e}")
                 
                 st.session_state.confirm_delete_id = None
                 st.session_state.confirm_delete_name = None
-                st.session_state.personas = load_data_from_firestore()
                 st.rerun()
         with col_confirm_no:
             if st.button("❌ No, cancelar", key="confirm_no", use_container_width=True):
@@ -4,15 +4,25 @@
 import streamlit as st
 import json
 import os
-from copy import deepcopy
 import pandas as pd
-from datetime import datetime
-from google.cloud.firestore import Query
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from firestore_utils import db
+from datetime import timedelta
+
+from borrado_utils import borrar_usuario_recursivo
+from consumo_utils import COLECCION_CONSUMO, DIAS_CONSUMO, agregar, medias
+from fechas_utils import a_fecha, ahora, formatear_fecha
+from firestore_utils import (db, delete_document, get_documents, get_documents_by_date, invalidate_cache,
+                             new_document_id, set_document, update_user_document_diff)
 from gcs_utils import read_csv_from_gcs
+from memorias_utils import (aplicar_consolidacion, compactar_memorias, get_resumidor, guardar_resumenes,
+                            planificar_consolidacion)
+from modelos import Idioma, Memoria, Perfil, validar
+from perfilado_utils import perfilar_pagina
+from personas_utils import (COMPONENTES_TEMPERAMENTALES, EDAD_MAXIMA, IDIOMAS_BASE, NIVELES_IDIOMA, SEXOS,
+                            SOFT_SKILLS_BASE)
+from sync_utils import get_user_replica
 # ---------------------------------------------------------------
 
 current_user_id = st.session_state.get("user_id")
@@ -27,61 +37,29 @@ def load_tech_skills() -> list[str]:
     return df["preferredLabel"].str.capitalize().tolist()
 
 TECH_SKILLS_BASE = load_tech_skills()
-SOFT_SKILLS_BASE = [
-    "Trabajo en equipo", "Comunicación", "Liderazgo",
-    "Gestión del tiempo", "Resolución de conflictos",
-    "Pensamiento crítico", "Adaptabilidad", "Creatividad",
-    "Organización", "Negociación", "Inteligencia Emocional",
-    "Proactividad", "Orientación al cliente"
-]
-IDIOMAS_BASE     = [
-    "Español", "Inglés", "Francés", "Alemán", "Italiano",
-    "Portugués", "Chino", "Japonés", "Árabe", "Ruso",
-    "Catalán", "Gallego", "Euskera", "Polaco"
-]
-NIVELES_IDIOMA   = [
-    "Conocimiento bajo", "Básico", "Intermedio",
-    "Avanzado", "Hablante nativo"
-]
 
 # ─────────────────── FUNCIONES PARA INTERACTUAR CON FIRESTORE ───────────────────────────
 
-def load_user_profile_from_firestore(user_id: str) -> dict:
-    """Carga el perfil del usuario desde Firestore."""
-    doc_ref = db.collection('usuarios').document(user_id)
-    doc = doc_ref.get()
-    if doc.exists:
-        return doc.to_dict()
-    return {}
-
-def save_user_profile_to_firestore(user_id: str, profile_data: dict) -> None:
-    """Guarda el perfil del usuario en Firestore."""
-    doc_ref = db.collection('usuarios').document(user_id)
-    doc_ref.set(profile_data, merge=True) # merge=True para actualizar o crear
-    st.success("Perfil guardado correctamente en Firestore.")
+def save_user_profile_to_firestore(user_id: str, profile_data: dict, previous_profile: dict) -> None:
+    """Guarda en Firestore solo los campos del perfil que han cambiado respecto a `previous_profile`."""
+    if update_user_document_diff(db, user_id, previous_profile, profile_data):
+        st.success("Perfil guardado correctamente en Firestore.")
+    else:
+        st.info("No hay cambios en el perfil.")
 
 def delete_user_profile_from_firestore(user_id: str) -> None:
-    """Elimina el perfil completo del usuario y sus subcolecciones (como memorias) de Firestore."""
-
-    # Eliminar las memorias asociadas
-    memories_ref = db.collection('usuarios').document(user_id).collection('memorias')
-    for doc in memories_ref.stream():
-        doc.reference.delete()
-    
-    # Eliminar el documento del perfil
-    db.collection('usuarios').document(user_id).delete()
-    st.success("Tu perfil y sus memorias han sido eliminados de Firestore.")
-
+    """Elimina el perfil completo del usuario y todas sus subcolecciones (personas, memorias,
+    conversaciones...) de Firestore, mostrando el progreso."""
+    with st.status("Eliminando tu perfil y todos tus datos...", expanded=True) as estado:
+        contador = st.empty()
+        resultado = borrar_usuario_recursivo(
+            db, user_id, progreso=lambda borrados: contador.write(f"{borrados:,} documentos eliminados")
+        )
+        invalidate_cache(user_id)
+        estado.update(label=f"Perfil eliminado ({resultado.borrados:,} documentos en {resultado.segundos:.1f} s)",
+                      state="complete", expanded=False)
+    st.success("Tu perfil y todos sus datos han sido eliminados de Firestore.")
 
-def load_memories_from_firestore(user_id: str) -> list:
-    """Carga las memorias para un usuario específico desde Firestore."""
-    memories = []
-    docs = db.collection('usuarios').document(user_id).collection('memorias').order_by('fecha_registro', direction=Query.DESCENDING).stream()
-    for doc in docs:
-        memory = doc.to_dict()
-        memory['id'] = doc.id
-        memories.append(memory)
-    return memories
 
 def save_memory_to_firestore(user_id: str, memory_data: dict) -> str:
     """Guarda una nueva memoria o actualiza una existente en Firestore."""
@@ -90,47 +68,32 @@ def save_memory_to_firestore(user_id: str, memory_data: dict) -> str:
         doc_ref = db.collection('usuarios').document(user_id).collection('memorias').document(memory_id)
         data_to_save = {k: v for k, v in memory_data.items() if k != 'id'}
         doc_ref.set(data_to_save, merge=True)
+        invalidate_cache(user_id, "memorias")
         return memory_id
     else:
-        doc_ref = db.collection('usuarios').document(user_id).collection('memorias').document()
-        doc_ref.set(memory_data)
-        return doc_ref.id
+        memory_id = new_document_id(db, user_id, "memorias")
+        set_document(db, user_id, "memorias", memory_id, memory_data)
+        return memory_id
 
 def delete_memory_from_firestore(user_id: str, memory_id: str) -> None:
     """Elimina una memoria específica de Firestore."""
-    db.collection('usuarios').document(user_id).collection('memorias').document(memory_id).delete()
+    delete_document(db, user_id, "memorias", memory_id)
 
 
-# ─────────────────── FUNCIÓN DE VALIDACIÓN ────────────────────
-def validar_perfil_usuario(profile: dict) -> tuple[bool, str]:
-    """
-    Comprueba campos obligatorios y el rango de los componentes temperamentales para el perfil del usuario.
-    """
-    nombre = profile.get("datos_personales", {}).get("nombre", "").strip()
-    if not nombre:
-        return False, "El nombre es obligatorio."
-    
-    temps = profile.get("componentes_temperamentales", {})
-    if len(temps) != 7:
-        return False, "Faltan puntajes temperamentales. Deben ser 7."
-    for k, v in temps.items():
-        if not isinstance(v, (int, float)) or not (0 <= v <= 17):
-            return False, f"El valor de '{k}' debe ser un número entre 0 y 17."
-    return True, ""
-
 # ─────────────────── INICIALIZACIÓN DE SESIÓN ─────────────────
 if not st.session_state.get('password_entered', False):
     st.warning("Por favor, inicia sesión en la página principal para acceder.")
     st.stop()
 
-if "user_profile" not in st.session_state:
-    st.session_state.user_profile = load_user_profile_from_firestore(current_user_id)
+perfilar_pagina(current_user_id, "Mi Perfil")
+
+# Perfil y memorias se leen de la réplica del usuario, que mantienen al día los listeners de Firestore
+replica = get_user_replica(current_user_id)
+st.session_state.user_profile = replica.perfil
 
 if "modo_perfil" not in st.session_state:
     st.session_state.modo_perfil = "mostrar" if st.session_state.user_profile else "editar"
 
-if "memories" not in st.session_state:
-    st.session_state.memories = load_memories_from_firestore(current_user_id)
 
 # ─────────────────── ENCABEZADO ───────────────────────────────
 st.title("👤 Mi Perfil")
@@ -140,63 +103,62 @@ st.title("👤 Mi Perfil")
 def formulario_perfil_usuario(profile: dict):
     """
     Genera la interfaz de usuario para crear o modificar el perfil del usuario.
-    Devuelve el diccionario del perfil con los datos ingresados.
+    Los datos introducidos se recogen en un registro Perfil, que se valida y se guarda.
     """
-    profile_temp = deepcopy(profile)
+    profile_temp = Perfil.desde_firestore(profile)
 
     st.subheader("Datos de tu Perfil")
 
     # --- Datos Personales ---
     with st.expander("📄 Datos personales", expanded=True):
-        dp = profile_temp.setdefault("datos_personales", {})
-        dp["nombre"] = st.text_input(
+        dp = profile_temp.datos_personales
+        dp.nombre = st.text_input(
             "Tu nombre o apodo *",
-            dp.get("nombre", ""),
+            dp.nombre,
             help="Cómo quieres que el sistema  te conozca"
         )
-        dp["sexo"]   = st.selectbox(
+        dp.sexo   = st.selectbox(
             "Sexo",
-            ["", "Varón", "Mujer"],
-            index=["", "Varón", "Mujer"].index(dp.get("sexo", ""))
+            SEXOS,
+            index=SEXOS.index(dp.sexo)
         )
-        dp["edad"]   = st.number_input(
+        dp.edad   = st.number_input(
             "Tu edad (años)",
-            min_value=0, max_value=120, value=dp.get("edad", 0), step=1
+            min_value=0, max_value=EDAD_MAXIMA, value=dp.edad, step=1
         )
-        dp["estado_civil"] = st.text_input(
+        dp.estado_civil = st.text_input(
             "Tu estado civil",
-            dp.get("estado_civil", "")
+            dp.estado_civil
         )
-        dp["puesto_trabajo"] = st.text_input(
+        dp.puesto_trabajo = st.text_input(
             "Tu puesto / profesión",
-            dp.get("puesto_trabajo", "")
+            dp.puesto_trabajo
         )
-        dp["otros_datos"] = st.text_area(
+        dp.otros_datos = st.text_area(
             "Otros datos sobre ti",
-            dp.get("otros_datos", ""),
+            dp.otros_datos,
             help="Cualquier otro dato pertinente (ej: discapacidad, nacionalidad, cómo te comportas, etc.)."
         )
 
     # --- Componentes Temperamentales ---
     with st.expander("🧬 Componentes temperamentales*", expanded=False):
         st.markdown("Asigna una puntuación (entre 0 y 17) para cada componente temperamental. Estos campos son obligatorios.")
-        ct = profile_temp.setdefault("componentes_temperamentales", {})
-        for comp in ["Normaloide", "Histeroide", "Mánico", "Depresivo",
-                     "Autístico", "Paranoide", "Epileptoide"]:
-            ct[comp] = st.number_input(
+        ct = profile_temp.componentes
+        for i, comp in enumerate(COMPONENTES_TEMPERAMENTALES):
+            ct[i] = st.number_input(
                 comp,
                 min_value=0.0, max_value=17.0,
-                value=float(ct.get(comp, 0.0)),
+                value=float(ct[i] or 0.0),
                 step=0.5, format="%.1f",
                 help=f"Puntuación para el componente '{comp}' (0-17)."
             )
 
     # ---------- Capacidades ----------
     with st.expander("💡 Capacidades", expanded=False):
-        caps = profile_temp.setdefault("capacidades", {})
+        caps = profile_temp.capacidades
 
         st.markdown("##### Habilidades técnicas")
-        current_tech_skills = caps.get("Habilidades técnicas", [])
+        current_tech_skills = caps.tecnicas
         all_tech_skills_options = sorted(list(set(TECH_SKILLS_BASE + current_tech_skills)))
         
         selected_tech_skills = st.multiselect(
@@ -209,10 +171,10 @@ def formulario_perfil_usuario(profile: dict):
         if new_tech_skills_input:
             new_skills = [s.strip() for s in new_tech_skills_input.split(',') if s.strip()]
             selected_tech_skills = sorted(list(set(selected_tech_skills + new_skills)))
-        caps["Habilidades técnicas"] = selected_tech_skills
+        caps.tecnicas = selected_tech_skills
 
         st.markdown("##### Soft skills")
-        current_soft_skills = caps.get("Soft skills", [])
+        current_soft_skills = caps.soft
         all_soft_skills_options = sorted(list(set(SOFT_SKILLS_BASE + current_soft_skills)))
 
         selected_soft_skills = st.multiselect(
@@ -225,14 +187,14 @@ def formulario_perfil_usuario(profile: dict):
         if new_soft_skills_input:
             new_skills = [s.strip() for s in new_soft_skills_input.split(',') if s.strip()]
             selected_soft_skills = sorted(list(set(selected_soft_skills + new_skills)))
-        caps["Soft skills"] = selected_soft_skills
+        caps.soft = selected_soft_skills
 
         st.markdown("##### Idiomas")
         st.info("Añade cada idioma y su nivel")
-        idiomas_actual = caps.get("Idiomas", [])
+        idiomas_actual = [i.a_firestore() for i in caps.idiomas]
         df_idiomas = pd.DataFrame(idiomas_actual or [{"Idioma": "", "Nivel": ""}])
         
-        all_idiomas_options = sorted(list(set(IDIOMAS_BASE + [i["Idioma"] for i in idiomas_actual if i["Idioma"]])))
+        all_idiomas_options = sorted(list(set(IDIOMAS_BASE + [i.idioma for i in caps.idiomas if i.idioma])))
 
         df_editado = st.data_editor(
             df_idiomas,
@@ -250,8 +212,8 @@ def formulario_perfil_usuario(profile: dict):
             hide_index=True,
             use_container_width=True,
         )
-        caps["Idiomas"] = [
-            {"Idioma": row["Idioma"], "Nivel": row["Nivel"]}
+        caps.idiomas = [
+            Idioma(row["Idioma"], row["Nivel"])
             for _, row in df_editado.iterrows()
             if row["Idioma"] and row["Nivel"]
         ]
@@ -260,12 +222,14 @@ def formulario_perfil_usuario(profile: dict):
     col_save, col_cancel = st.columns(2)
     with col_save:
         if st.button("💾 Guardar Perfil", use_container_width=True):
-            ok, msg = validar_perfil_usuario(profile_temp)
+            ok, msg = validar(profile_temp)
             if not ok:
                 st.error(msg)
             else:
-                st.session_state.user_profile = profile_temp
-                save_user_profile_to_firestore(current_user_id, st.session_state.user_profile)
+                profile_data = profile_temp.a_firestore()
+                save_user_profile_to_firestore(current_user_id, profile_data, st.session_state.user_profile)
+                st.session_state.user_profile = profile_data
+                replica.aplicar_perfil(profile_data)
                 st.session_state.modo_perfil = "mostrar"
                 st.rerun()
     with col_cancel:
@@ -274,6 +238,82 @@ def formulario_perfil_usuario(profile: dict):
             st.rerun()
 
 # ─────────────────── SECCIÓN DE MEMORIAS ───────────────────────────
+MEMORIAS_POR_PAGINA = 20
+
+def memorias_cargadas() -> list[Memoria]:
+    """Memorias de las páginas cargadas hasta ahora, de la más reciente a la más antigua.
+
+    Se leen de una vez desde las claves ordenadas de la réplica, así que una memoria nueva aparece
+    arriba y una borrada desaparece sin desplazar el resto de páginas.
+    """
+    paginas = st.session_state.get("paginas_memorias", 1)
+    return [Memoria.desde_firestore(m) for m in replica.memorias_pagina(MEMORIAS_POR_PAGINA * paginas)]
+
+def seccion_consolidar_memorias():
+    """Busca memorias casi duplicadas en toda la colección y, si el usuario lo confirma, las fusiona."""
+    with st.expander("🧹 Consolidar memorias duplicadas", expanded="plan_consolidacion" in st.session_state):
+        st.caption("Agrupa las memorias que dicen casi lo mismo y conserva solo la más completa de cada grupo.")
+        if st.button("Buscar duplicados", use_container_width=True):
+            st.session_state.plan_consolidacion = planificar_consolidacion(dict(replica.memorias))
+
+        plan = st.session_state.get("plan_consolidacion")
+        if plan is None:
+            return
+        if not plan.grupos:
+            st.info("No se han encontrado memorias duplicadas.")
+            return
+
+        st.write(f"**{len(plan.grupos)}** grupos de memorias casi iguales; se eliminarían **{len(plan.borrar)}** "
+                 f"memorias y el prompt del asistente tendría unos **{plan.tokens_ahorrados:,}** tokens menos "
+                 f"({plan.tokens_antes:,} → {plan.tokens_despues:,}).")
+        for ids in plan.grupos:
+            with st.container(border=True):
+                for i, memoria_id in enumerate(ids):
+                    texto = replica.memorias.get(memoria_id, {}).get("memoria", "")
+                    st.write(f"✅ {texto}" if i == 0 else f"~~{texto}~~")
+
+        col_aplicar, col_descartar = st.columns(2)
+        with col_aplicar:
+            if st.button("Aplicar consolidación", type="primary", use_container_width=True):
+                aplicar_consolidacion(db, current_user_id, plan)
+                invalidate_cache(current_user_id, "memorias")
+                for memoria_id in plan.borrar:
+                    replica.aplicar_memoria(memoria_id, None)
+                for memoria_id, cambios in plan.actualizar.items():
+                    if memoria_id in replica.memorias:
+                        replica.aplicar_memoria(memoria_id, {**replica.memorias[memoria_id], **cambios})
+                del st.session_state.plan_consolidacion
+                st.toast(f"Memorias consolidadas: {plan.tokens_ahorrados:,} tokens menos en el prompt.", icon="✅")
+                st.rerun()
+        with col_descartar:
+            if st.button("Descartar", use_container_width=True):
+                del st.session_state.plan_consolidacion
+                st.rerun()
+
+def seccion_resumenes_memorias():
+    """Resúmenes por persona que el asistente recibe en lugar de las memorias sueltas, con su procedencia."""
+    with st.expander(f"🗂️ Resúmenes por persona ({len(replica.resumenes)})", expanded=False):
+        st.caption("El asistente recibe estos resúmenes en lugar de las memorias que cubren. Se regeneran solos "
+                   "al iniciar una conversación cuando una persona acumula varias memorias nuevas.")
+        for resumen in sorted(replica.resumenes.values(), key=lambda r: r.get("nombre", "")):
+            with st.container(border=True):
+                st.markdown(f"**{resumen.get('nombre', '')}**")
+                st.write(resumen.get("resumen", ""))
+                st.caption(f"{len(resumen.get('memorias', []))} memorias del {formatear_fecha(resumen.get('desde'))} al "
+                           f"{formatear_fecha(resumen.get('hasta'))} · resumidor: {resumen.get('resumidor', '')} · "
+                           f"generado el {formatear_fecha(resumen.get('fecha_generacion'))}")
+        if st.button("Regenerar resúmenes", use_container_width=True):
+            nuevos, obsoletos = compactar_memorias(dict(replica.memorias), list(replica.personas),
+                                                   dict(replica.resumenes), get_resumidor(), minimo=1)
+            guardar_resumenes(db, current_user_id, nuevos, obsoletos)
+            invalidate_cache(current_user_id, "resumenes")
+            for resumen in nuevos:
+                replica.aplicar_resumen(resumen.persona_id, resumen.a_firestore())
+            for persona_id in obsoletos:
+                replica.aplicar_resumen(persona_id, None)
+            st.toast(f"{len(nuevos)} resúmenes regenerados.", icon="✅")
+            st.rerun()
+
 def show_memories_section():
     st.subheader("Memorias guardadas")
     
@@ -282,12 +322,9 @@ def show_memories_section():
         new_memory_text = st.text_area("Escribe la nueva memoria:")
         if st.button("Guardar memoria"):
             if new_memory_text:
-                memory_data = {
-                    "memoria": new_memory_text,
-                    "fecha_registro": datetime.now().strftime("%Y/%m/%d %H:%M")
-                }
+                memory_data = Memoria(new_memory_text, ahora()).a_firestore()
                 new_memory_id = save_memory_to_firestore(current_user_id, memory_data)
-                st.session_state.memories = load_memories_from_firestore(current_user_id)
+                replica.aplicar_memoria(new_memory_id, memory_data)
                 st.toast(
                     "Memoria guardada correctamente.",
                     icon="✅")
@@ -295,6 +332,10 @@ def show_memories_section():
             else:
                 st.warning("Por favor, escribe algo para añadir una memoria.")
 
+    seccion_consolidar_memorias()
+    seccion_resumenes_memorias()
+
+    st.session_state.memories = memorias_cargadas()
     if not st.session_state.memories:
         st.info("Aún no tienes memorias guardadas.")
     else:
@@ -303,18 +344,81 @@ def show_memories_section():
                 col_text, col_button = st.columns([0.9, 0.1]) # 90% para el texto, 10% para el botón
 
                 with col_text:
-                    st.write(f"{memory.get('memoria', 'N/A')}")
-                    st.caption(f"{memory.get('fecha_registro', 'N/A')}")
+                    st.write(memory.memoria or "N/A")
+                    st.caption(formatear_fecha(memory.fecha_registro) or "N/A")
                 
                 with col_button:
-                    if st.button(f'🗑️', key=f"delete_memory_{memory.get('id', i)}", use_container_width=True):
-                        delete_memory_from_firestore(current_user_id, memory['id'])
-                        st.session_state.memories = load_memories_from_firestore(current_user_id)
+                    if st.button(f'🗑️', key=f"delete_memory_{memory.id or i}", use_container_width=True):
+                        delete_memory_from_firestore(current_user_id, memory.id)
+                        replica.aplicar_memoria(memory.id, None)
                         st.toast(
                             "Memoria eliminada correctamente.",
                             icon="✅")
                         st.rerun()
 
+        total = len(replica.memorias)
+        if len(st.session_state.memories) < total:
+            st.caption(f"Mostrando {len(st.session_state.memories)} de {total} memorias")
+            if st.button("Cargar más memorias", use_container_width=True):
+                st.session_state.paginas_memorias = st.session_state.get("paginas_memorias", 1) + 1
+                st.rerun()
+
+CONVERSACIONES_CONSUMO = 10
+
+def seccion_consumo():
+    """Tokens y tiempos de respuesta del asistente en los últimos DIAS_CONSUMO días, por día, modelo y conversación."""
+    with st.expander("📊 Consumo del asistente", expanded=False):
+        try:
+            # Una sola consulta trae los contadores por día y por conversación del periodo
+            contadores = [d.to_dict() for d in get_documents_by_date(db, current_user_id, COLECCION_CONSUMO, "dia",
+                                                                     since=ahora() - timedelta(days=DIAS_CONSUMO))]
+        except Exception as e:
+            st.error(f"Error al cargar el consumo: {e}")
+            return
+        dias = [d for d in contadores if d.get("tipo") == "dia"]
+        if not dias:
+            st.info(f"No hay consumo registrado en los últimos {DIAS_CONSUMO} días.")
+            return
+
+        total = agregar(dias, lambda d: "total")["total"]
+        media = medias(total)
+        col_resp, col_entrada, col_salida, col_ttft = st.columns(4)
+        col_resp.metric("Respuestas", f"{total['respuestas']:,}")
+        col_entrada.metric("Tokens de entrada", f"{total['tokens_prompt']:,}",
+                           help=f"{media['fraccion_cache']:.0%} servidos desde la caché del modelo")
+        col_salida.metric("Tokens de salida", f"{total['tokens_salida']:,}")
+        col_ttft.metric("Primer token (media)", f"{media['ms_primer_token'] / 1000:.1f} s",
+                        help=f"Respuesta completa: {media['ms_total'] / 1000:.1f} s de media")
+        st.caption(f"El conocimiento inicial supone aproximadamente el {media['fraccion_conocimiento']:.0%} de los "
+                   f"tokens de entrada. Rondas de herramientas: {total['rondas_herramientas']:,}.")
+
+        # Los días son días UTC, como se guardan los contadores
+        por_dia = agregar(dias, lambda d: a_fecha(d.get("dia")).strftime("%Y-%m-%d"))
+        st.bar_chart(pd.DataFrame([{"Día": dia, "Entrada": t["tokens_prompt"], "Salida": t["tokens_salida"]}
+                                   for dia, t in sorted(por_dia.items())]).set_index("Día"))
+
+        filas = []
+        for modelo, t in sorted(agregar(dias, lambda d: d.get("modelo", "")).items()):
+            filas.append({"Modelo": modelo, "Respuestas": t["respuestas"], "Tokens de entrada": t["tokens_prompt"],
+                          "Tokens de salida": t["tokens_salida"], "Primer token (ms)": round(medias(t)["ms_primer_token"]),
+                          "Respuesta completa (ms)": round(medias(t)["ms_total"])})
+        st.dataframe(pd.DataFrame(filas), hide_index=True, use_container_width=True)
+
+        conversaciones = agregar((d for d in contadores if d.get("tipo") == "conversacion"),
+                                 lambda d: d.get("conversacion_id"))
+        mas_costosas = sorted(conversaciones.items(),
+                              key=lambda c: -(c[1]["tokens_prompt"] + c[1]["tokens_salida"]))[:CONVERSACIONES_CONSUMO]
+        if mas_costosas:
+            st.markdown(f"**Conversaciones con más consumo en los últimos {DIAS_CONSUMO} días**")
+            titulos = get_documents(db, current_user_id, "conversaciones", [c for c, _ in mas_costosas], fields=["title"])
+            filas = []
+            for conversacion_id, t in mas_costosas:
+                doc = titulos.get(conversacion_id)
+                titulo = (doc.to_dict() or {}).get("title", conversacion_id) if doc and doc.exists else "(eliminada)"
+                filas.append({"Conversación": titulo, "Respuestas": t["respuestas"],
+                              "Tokens de entrada": t["tokens_prompt"], "Tokens de salida": t["tokens_salida"]})
+            st.dataframe(pd.DataFrame(filas), hide_index=True, use_container_width=True)
+
 # ─────────────────── FLUJO PRINCIPAL DE LA APLICACIÓN ──────────────────────────
 if st.session_state.modo_perfil == "editar":
     formulario_perfil_usuario(st.session_state.user_profile)
@@ -418,6 +522,7 @@ else:
                 st.rerun()
 
         show_memories_section()
+        seccion_consumo()
         
 
     if st.session_state.get("confirm_delete_profile", False):
@@ -429,6 +534,11 @@ else:
                 delete_user_profile_from_firestore(current_user_id)
                 
                 # Resetear el estado local
+                replica.aplicar_perfil({})
+                for memory_id in list(replica.memorias):
+                    replica.aplicar_memoria(memory_id, None)
+                for persona_id in list(replica.resumenes):
+                    replica.aplicar_resumen(persona_id, None)
                 st.session_state.user_profile = {}
                 st.session_state.memories = []
                 st.session_state.modo_perfil = "editar"
@@ -3,6 +3,8 @@
 
 import streamlit as st
 
+from perfilado_utils import perfilar_pagina
+
 st.set_page_config(
     page_title="Aplicación - TFM",
     page_icon="🤝",
@@ -33,6 +35,8 @@ if not st.session_state.get('password_entered', False):
         
         st.stop()
 
+perfilar_pagina(st.session_state.get("user_id"), "Inicio")
+
 st.title("¡Bienvenido!")
 
 st.markdown("""
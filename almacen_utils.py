@@ -0,0 +1,577 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# almacen_utils.py
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from copy import deepcopy
+from datetime import datetime, timezone
+from enum import Enum
+
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore_v1 import DELETE_FIELD
+from google.cloud.firestore_v1.transforms import ArrayUnion, Increment
+
+# Almacenamiento de la aplicación: "firestore" (por defecto) o "sqlite" (un fichero local, sin red)
+ALMACEN = os.environ.get("ALMACEN", "firestore")
+SQLITE_RUTA = os.environ.get("SQLITE_RUTA", "mi_asistente.sqlite3")
+
+# Campo de fecha principal de cada colección; se guarda en columnas indexadas para ordenar y filtrar por rangos
+CAMPOS_FECHA = {
+    "memorias": "fecha_registro",
+    "conversaciones": "start_time",
+    "resumenes": "fecha_generacion",
+}
+MAX_OPERACIONES_LOTE = 500
+NOMBRE_DOCUMENTO = "__name__"
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS documentos (
+    ruta TEXT PRIMARY KEY,          -- usuarios/{uid}/memorias/{id}
+    padre TEXT NOT NULL,            -- ruta de la colección: usuarios/{uid}/memorias
+    coleccion TEXT NOT NULL,        -- nombre de la colección (consultas de grupo): memorias
+    user_id TEXT,                   -- {uid} si el documento cuelga de usuarios/{uid}
+    datos TEXT NOT NULL,            -- documento en JSON
+    fecha_tipo INTEGER,             -- tipo y valor del campo de fecha principal (ver CAMPOS_FECHA)
+    fecha_valor,
+    actualizado INTEGER NOT NULL    -- microsegundos; es el update_time del documento
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_padre_fecha ON documentos(padre, fecha_tipo, fecha_valor);
+CREATE INDEX IF NOT EXISTS idx_coleccion_fecha ON documentos(coleccion, fecha_tipo, fecha_valor);
+CREATE INDEX IF NOT EXISTS idx_usuario_coleccion ON documentos(user_id, coleccion);
+"""
+
+# ─────────────────── CODIFICACIÓN Y ORDEN DE VALORES ────────────────────
+# Las fechas se guardan como {"__fecha__": "AAAA-MM-DDTHH:MM:SS.ffffffZ"} (UTC y ancho fijo, así que el orden
+# del texto es el cronológico). Al ordenar se compara primero el tipo, como en Firestore:
+# booleanos < números < fechas < texto < arrays < mapas; los documentos sin el campo no aparecen.
+
+_CLAVE_FECHA = "__fecha__"
+_FORMATO_FECHA = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+def _codificar(valor):
+    if isinstance(valor, datetime):
+        fecha = valor if valor.tzinfo else valor.astimezone()
+        return {_CLAVE_FECHA: fecha.astimezone(timezone.utc).strftime(_FORMATO_FECHA)}
+    raise TypeError(f"Tipo no admitido en el almacén SQLite: {type(valor).__name__}")
+
+def _decodificar(objeto: dict):
+    if len(objeto) == 1 and _CLAVE_FECHA in objeto:
+        return datetime.strptime(objeto[_CLAVE_FECHA], _FORMATO_FECHA).replace(tzinfo=timezone.utc)
+    return objeto
+
+def _a_json(datos: dict) -> str:
+    return json.dumps(datos, ensure_ascii=False, default=_codificar)
+
+def _desde_json(texto: str) -> dict:
+    return json.loads(texto, object_hook=_decodificar)
+
+def _clave(valor) -> tuple[int, object] | None:
+    """(tipo, valor comparable) de un valor, igual que las expresiones SQL de _expr_clave."""
+    if valor is None:
+        return None
+    if isinstance(valor, bool):
+        return 1, int(valor)
+    if isinstance(valor, (int, float)):
+        return 2, valor
+    if isinstance(valor, datetime):
+        return 3, _codificar(valor)[_CLAVE_FECHA]
+    if isinstance(valor, str):
+        return 4, valor
+    if isinstance(valor, (list, tuple)):
+        return 5, json.dumps(list(valor), ensure_ascii=False, separators=(",", ":"), default=_codificar)
+    return 6, json.dumps(valor, ensure_ascii=False, separators=(",", ":"), default=_codificar)
+
+def _partes(campo: str) -> list[str]:
+    return [p.strip("`") for p in campo.split(".")]
+
+def _ruta_json(campo: str) -> str:
+    return "$" + "".join('."' + p.replace('"', '\\"') + '"' for p in _partes(campo))
+
+def _expr_clave(campo: str) -> tuple[str, str]:
+    """Expresiones SQL (tipo, valor) de un campo del documento, para filtrar y ordenar."""
+    ruta = _ruta_json(campo)
+    fecha = ruta + f'."{_CLAVE_FECHA}"'
+    tipo = (f"(CASE json_type(datos, '{ruta}') WHEN 'true' THEN 1 WHEN 'false' THEN 1 WHEN 'integer' THEN 2 "
+            f"WHEN 'real' THEN 2 WHEN 'text' THEN 4 WHEN 'array' THEN 5 WHEN 'object' THEN "
+            f"(CASE WHEN json_type(datos, '{fecha}') = 'text' THEN 3 ELSE 6 END) END)")
+    valor = f"(CASE {tipo} WHEN 3 THEN json_extract(datos, '{fecha}') ELSE json_extract(datos, '{ruta}') END)"
+    return tipo, valor
+
+def _leer_campo(datos: dict | None, campo: str):
+    valor = datos
+    for parte in _partes(campo):
+        if not isinstance(valor, dict):
+            return None
+        valor = valor.get(parte)
+    return valor
+
+def _fusionar(destino: dict, origen: dict) -> dict:
+    """Mezcla anidada de `set(..., merge=True)`: los mapas se combinan campo a campo."""
+    for clave, valor in origen.items():
+        if isinstance(valor, dict) and isinstance(destino.get(clave), dict):
+            _fusionar(destino[clave], valor)
+        elif valor is DELETE_FIELD:
+            destino.pop(clave, None)
+        elif isinstance(valor, Increment):
+            destino[clave] = _incrementar(destino.get(clave), valor)
+        else:
+            destino[clave] = deepcopy(valor)
+    return destino
+
+def _incrementar(actual, incremento: Increment):
+    """Como en Firestore, un campo que no es numérico se trata como 0."""
+    base = actual if isinstance(actual, (int, float)) and not isinstance(actual, bool) else 0
+    return base + incremento.value
+
+def _aplicar_update(doc: dict, cambios: dict) -> dict:
+    """Aplica un `update` con rutas de campo ("a.b"), DELETE_FIELD, ArrayUnion e Increment."""
+    for ruta, valor in cambios.items():
+        partes = _partes(ruta)
+        destino = doc
+        for parte in partes[:-1]:
+            destino = destino.setdefault(parte, {})
+        if valor is DELETE_FIELD:
+            destino.pop(partes[-1], None)
+        elif isinstance(valor, Increment):
+            destino[partes[-1]] = _incrementar(destino.get(partes[-1]), valor)
+        elif isinstance(valor, ArrayUnion):
+            actual = list(destino.get(partes[-1]) or [])
+            actual += [v for v in valor.values if v not in actual]
+            destino[partes[-1]] = actual
+        else:
+            destino[partes[-1]] = deepcopy(valor)
+    return doc
+
+# ─────────────────── REFERENCIAS, INSTANTÁNEAS Y CONSULTAS ────────────────────
+
+class ChangeType(Enum):
+    ADDED = 1
+    MODIFIED = 2
+    REMOVED = 3
+
+class DocumentChange:
+    def __init__(self, tipo: ChangeType, document: "DocumentSnapshot"):
+        self.type = tipo
+        self.document = document
+
+class DocumentSnapshot:
+    def __init__(self, reference: "DocumentReference", datos: dict | None, actualizado: int | None):
+        self.reference = reference
+        self.id = reference.id
+        self._datos = datos
+        self._actualizado = actualizado
+
+    @property
+    def exists(self) -> bool:
+        return self._datos is not None
+
+    @property
+    def update_time(self) -> datetime | None:
+        if self._actualizado is None:
+            return None
+        return datetime.fromtimestamp(self._actualizado / 1e6, timezone.utc)
+
+    def to_dict(self) -> dict | None:
+        return deepcopy(self._datos)
+
+    def get(self, campo: str):
+        if campo == NOMBRE_DOCUMENTO:
+            return self.reference.path
+        return deepcopy(_leer_campo(self._datos, campo))
+
+class DocumentReference:
+    def __init__(self, cliente: "ClienteSQLite", path: str):
+        self._cliente = cliente
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def collection(self, nombre: str) -> "CollectionReference":
+        return CollectionReference(self._cliente, f"{self.path}/{nombre}")
+
+    def collections(self) -> list["CollectionReference"]:
+        """Subcolecciones con al menos un documento (a cualquier profundidad)."""
+        prefijo = self.path + "/"
+        filas = self._cliente._consultar("SELECT DISTINCT padre FROM documentos WHERE ruta >= ? AND ruta < ?",
+                                         (prefijo, self.path + "0"))
+        nombres = {padre[len(prefijo):].split("/", 1)[0] for (padre,) in filas}
+        return [self.collection(n) for n in sorted(nombres)]
+
+    def get(self) -> DocumentSnapshot:
+        filas = self._cliente._consultar("SELECT datos, actualizado FROM documentos WHERE ruta = ?", (self.path,))
+        if not filas:
+            return DocumentSnapshot(self, None, None)
+        return DocumentSnapshot(self, _desde_json(filas[0][0]), filas[0][1])
+
+    def set(self, datos: dict, merge: bool = False):
+        lote = self._cliente.batch()
+        lote.set(self, datos, merge=merge)
+        lote.commit()
+
+    def update(self, datos: dict, option=None):
+        lote = self._cliente.batch()
+        lote.update(self, datos, option=option)
+        lote.commit()
+
+    def delete(self, option=None):
+        lote = self._cliente.batch()
+        lote.delete(self, option=option)
+        lote.commit()
+
+    def on_snapshot(self, callback) -> "Watch":
+        return self._cliente._escuchar(self.path, callback, documento=True)
+
+class Query:
+    ASCENDING = "ASCENDING"
+    DESCENDING = "DESCENDING"
+
+    def __init__(self, cliente: "ClienteSQLite", padre: str | None = None, grupo: str | None = None,
+                 recursiva: bool = False, filtros=(), orden=(), limite=None, despues=None):
+        self._cliente = cliente
+        self._padre = padre
+        self._grupo = grupo
+        self._recursiva = recursiva
+        self._filtros = filtros
+        self._orden = orden
+        self._limite = limite
+        self._despues = despues
+
+    def _copia(self, **cambios) -> "Query":
+        args = dict(padre=self._padre, grupo=self._grupo, recursiva=self._recursiva, filtros=self._filtros,
+                    orden=self._orden, limite=self._limite, despues=self._despues)
+        args.update(cambios)
+        return Query(self._cliente, **args)
+
+    def where(self, campo=None, op=None, valor=None, filter=None) -> "Query":
+        if filter is not None:
+            campo, op, valor = filter.field_path, filter.op_string, filter.value
+        return self._copia(filtros=self._filtros + ((campo, op, valor),))
+
+    def order_by(self, campo: str, direction: str = ASCENDING) -> "Query":
+        return self._copia(orden=self._orden + ((campo, str(direction).upper().endswith("DESCENDING")),))
+
+    def limit(self, n: int) -> "Query":
+        return self._copia(limite=n)
+
+    def start_after(self, snapshot: DocumentSnapshot) -> "Query":
+        return self._copia(despues=snapshot)
+
+    def select(self, campos) -> "Query":
+        # Los documentos son locales: no hay nada que ahorrar descargando solo algunos campos
+        return self
+
+    def recursive(self) -> "Query":
+        """Incluye también los documentos de las subcolecciones, a cualquier profundidad."""
+        return self._copia(recursiva=True)
+
+    def _coleccion(self) -> str:
+        return self._grupo or self._padre.rsplit("/", 1)[-1]
+
+    def _expr(self, campo: str) -> tuple[str | None, str]:
+        if campo == NOMBRE_DOCUMENTO:
+            return None, "ruta"
+        if not self._recursiva and CAMPOS_FECHA.get(self._coleccion()) == campo:
+            return "fecha_tipo", "fecha_valor"
+        return _expr_clave(campo)
+
+    def _sql(self) -> tuple[str, list]:
+        condiciones, parametros = [], []
+        if self._grupo is not None:
+            condiciones.append("coleccion = ?")
+            parametros.append(self._grupo)
+        elif self._recursiva:
+            condiciones.append("ruta >= ? AND ruta < ?")
+            parametros += [self._padre + "/", self._padre + "0"]
+        else:
+            condiciones.append("padre = ?")
+            parametros.append(self._padre)
+
+        for campo, op, valor in self._filtros:
+            if campo == NOMBRE_DOCUMENTO:
+                raise ValueError("El almacén SQLite no admite filtros por nombre de documento")
+            tipo, expr = self._expr(campo)
+            if op == "array_contains":
+                condiciones.append(f"EXISTS (SELECT 1 FROM json_each(datos, '{_ruta_json(campo)}') WHERE value = ?)")
+                parametros.append(_clave(valor)[1])
+                continue
+            if op == "in":
+                valores = [c for c in map(_clave, valor) if c is not None]
+                condiciones.append("(" + " OR ".join([f"({tipo} = ? AND {expr} = ?)"] * len(valores)) + ")"
+                                   if valores else "0")
+                parametros += [p for c in valores for p in c]
+                continue
+            if op not in ("==", "<", "<=", ">", ">="):
+                raise ValueError(f"Operador no admitido en el almacén SQLite: {op}")
+            clave = _clave(valor)
+            if clave is None:
+                condiciones.append(f"{tipo} IS NULL" if op == "==" else "0")
+                continue
+            # Como en Firestore, solo se comparan valores del mismo tipo
+            condiciones.append(f"{tipo} = ? AND {expr} {'=' if op == '==' else op} ?")
+            parametros += list(clave)
+
+        # Orden: los campos pedidos y, al final, el nombre del documento
+        orden = list(self._orden)
+        if not any(campo == NOMBRE_DOCUMENTO for campo, _ in orden):
+            orden.append((NOMBRE_DOCUMENTO, orden[-1][1] if orden else False))
+        claves, cursor = [], []
+        for campo, descendente in orden:
+            tipo, expr = self._expr(campo)
+            if tipo is None:
+                claves.append((expr, descendente))
+                cursor.append(self._despues.reference.path if self._despues is not None else None)
+                continue
+            condiciones.append(f"{tipo} IS NOT NULL")
+            claves += [(tipo, descendente), (expr, descendente)]
+            if self._despues is not None:
+                cursor += list(_clave(self._despues.get(campo)) or (None, None))
+
+        if self._despues is not None:
+            # Posición estrictamente posterior al cursor en el orden lexicográfico de las claves
+            alternativas = []
+            for i, (expr, descendente) in enumerate(claves):
+                iguales = [f"{e} = ?" for e, _ in claves[:i]]
+                alternativas.append("(" + " AND ".join(iguales + [f"{expr} {'<' if descendente else '>'} ?"]) + ")")
+                parametros += cursor[:i] + [cursor[i]]
+            condiciones.append("(" + " OR ".join(alternativas) + ")")
+
+        sql = ("SELECT ruta, datos, actualizado FROM documentos WHERE " + " AND ".join(condiciones)
+               + " ORDER BY " + ", ".join(f"{e} {'DESC' if d else 'ASC'}" for e, d in claves))
+        if self._limite is not None:
+            sql += " LIMIT ?"
+            parametros.append(self._limite)
+        return sql, parametros
+
+    def stream(self):
+        sql, parametros = self._sql()
+        for ruta, datos, actualizado in self._cliente._consultar(sql, parametros):
+            yield DocumentSnapshot(DocumentReference(self._cliente, ruta), _desde_json(datos), actualizado)
+
+    def get(self) -> list[DocumentSnapshot]:
+        return list(self.stream())
+
+class CollectionReference(Query):
+    def __init__(self, cliente: "ClienteSQLite", path: str):
+        super().__init__(cliente, padre=path)
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, doc_id: str | None = None) -> DocumentReference:
+        return DocumentReference(self._cliente, f"{self.path}/{doc_id or uuid.uuid4().hex[:20]}")
+
+    def add(self, datos: dict):
+        ref = self.document()
+        ref.set(datos)
+        return ref.get().update_time, ref
+
+    def on_snapshot(self, callback) -> "Watch":
+        return self._cliente._escuchar(self.path, callback, documento=False)
+
+# ─────────────────── ESCRITURAS POR LOTES ────────────────────
+
+class _Precondicion:
+    def __init__(self, last_update_time: datetime | None = None, exists: bool | None = None):
+        self.last_update_time = last_update_time
+        self.exists = exists
+
+class WriteBatch:
+    """Lote de escrituras que se aplica en una sola transacción de SQLite."""
+
+    def __init__(self, cliente: "ClienteSQLite"):
+        self._cliente = cliente
+        self._ops: list[tuple] = []
+
+    def set(self, ref: DocumentReference, datos: dict, merge: bool = False):
+        self._ops.append(("set", ref.path, datos, merge, None))
+
+    def update(self, ref: DocumentReference, datos: dict, option=None):
+        self._ops.append(("update", ref.path, datos, False, option))
+
+    def delete(self, ref: DocumentReference, option=None):
+        self._ops.append(("delete", ref.path, None, False, option))
+
+    def commit(self):
+        if len(self._ops) > MAX_OPERACIONES_LOTE:
+            raise ValueError(f"Un lote admite como máximo {MAX_OPERACIONES_LOTE} operaciones")
+        ops, self._ops = self._ops, []
+        return self._cliente._confirmar(ops)
+
+# ─────────────────── LISTENERS ────────────────────
+
+class Watch:
+    def __init__(self, cliente: "ClienteSQLite", clave: tuple):
+        self._cliente = cliente
+        self._clave = clave
+
+    def unsubscribe(self):
+        with self._cliente._lock:
+            self._cliente._listeners.pop(self._clave, None)
+
+# ─────────────────── CLIENTE ────────────────────
+
+class ClienteSQLite:
+    """Almacén local en un fichero SQLite con el subconjunto de la API del cliente de Firestore que usa la aplicación.
+
+    Documentos en JSON con las rutas de Firestore, escrituras por lotes en transacciones, consultas con
+    filtros, orden, límite y cursores (también recursivas y de grupo de colecciones) y listeners
+    `on_snapshot`. Los listeners solo ven las escrituras de este proceso, así que el fichero no debe
+    compartirse entre varias instancias de la aplicación.
+    """
+
+    def __init__(self, ruta: str = SQLITE_RUTA):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._ultimo_instante = 0
+        self._listeners: dict[tuple, tuple[str, bool, object]] = {}
+        self._eventos: queue.Queue = queue.Queue()
+        conexion = self._conexion()
+        conexion.execute("PRAGMA journal_mode=WAL")
+        conexion.executescript(ESQUEMA)
+        threading.Thread(target=self._despachar, name="sqlite-listeners", daemon=True).start()
+
+    def _conexion(self) -> sqlite3.Connection:
+        conexion = getattr(self._local, "conexion", None)
+        if conexion is None:
+            conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None, check_same_thread=False)
+            conexion.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexion = conexion
+        return conexion
+
+    def _consultar(self, sql: str, parametros=()) -> list[tuple]:
+        return self._conexion().execute(sql, parametros).fetchall()
+
+    # --- API de Firestore ---
+    def collection(self, nombre: str) -> CollectionReference:
+        return CollectionReference(self, nombre)
+
+    def document(self, ruta: str) -> DocumentReference:
+        return DocumentReference(self, ruta)
+
+    def collection_group(self, nombre: str) -> Query:
+        return Query(self, grupo=nombre)
+
+    def batch(self) -> WriteBatch:
+        return WriteBatch(self)
+
+    def get_all(self, referencias, field_paths=None):
+        """Varios documentos en una sola consulta; los que no existen se devuelven sin datos."""
+        referencias = list(referencias)
+        filas = self._consultar(f"SELECT ruta, datos, actualizado FROM documentos WHERE ruta IN "
+                                f"({', '.join('?' * len(referencias))})", [r.path for r in referencias])
+        encontrados = {ruta: (datos, actualizado) for ruta, datos, actualizado in filas}
+        for ref in referencias:
+            datos, actualizado = encontrados.get(ref.path, (None, None))
+            yield DocumentSnapshot(ref, _desde_json(datos) if datos is not None else None, actualizado)
+
+    def write_option(self, **kwargs) -> _Precondicion:
+        return _Precondicion(**kwargs)
+
+    # --- Escrituras ---
+    def _instante(self) -> int:
+        self._ultimo_instante = max(self._ultimo_instante + 1, time.time_ns() // 1000)
+        return self._ultimo_instante
+
+    def _confirmar(self, ops: list[tuple]) -> list:
+        cambios = []
+        with self._lock:
+            conexion = self._conexion()
+            instante = self._instante()
+            conexion.execute("BEGIN IMMEDIATE")
+            try:
+                for tipo, ruta, datos, merge, opcion in ops:
+                    fila = conexion.execute("SELECT datos, actualizado FROM documentos WHERE ruta = ?", (ruta,)).fetchone()
+                    anterior = _desde_json(fila[0]) if fila else None
+                    if opcion is not None and opcion.last_update_time is not None:
+                        esperado = int(round(opcion.last_update_time.timestamp() * 1e6))
+                        if fila is None or fila[1] != esperado:
+                            raise FailedPrecondition(f"El documento {ruta} ha cambiado")
+                    if tipo == "delete":
+                        nuevo = None
+                        conexion.execute("DELETE FROM documentos WHERE ruta = ?", (ruta,))
+                    else:
+                        if tipo == "update":
+                            if anterior is None:
+                                raise NotFound(f"No existe el documento {ruta}")
+                            nuevo = _aplicar_update(deepcopy(anterior), datos)
+                        elif merge:
+                            nuevo = _fusionar(deepcopy(anterior or {}), datos)
+                        else:
+                            nuevo = _fusionar({}, datos)
+                        self._guardar(conexion, ruta, nuevo, instante)
+                    cambios.append((ruta, anterior, nuevo))
+                conexion.execute("COMMIT")
+            except BaseException:
+                conexion.execute("ROLLBACK")
+                raise
+            self._notificar(cambios, instante)
+        return [datetime.fromtimestamp(instante / 1e6, timezone.utc)] * len(ops)
+
+    @staticmethod
+    def _guardar(conexion: sqlite3.Connection, ruta: str, datos: dict, instante: int) -> None:
+        partes = ruta.split("/")
+        padre, coleccion = "/".join(partes[:-1]), partes[-2]
+        user_id = partes[1] if partes[0] == "usuarios" and len(partes) > 2 else None
+        campo_fecha = CAMPOS_FECHA.get(coleccion)
+        clave = _clave(_leer_campo(datos, campo_fecha)) if campo_fecha else None
+        conexion.execute(
+            "INSERT OR REPLACE INTO documentos (ruta, padre, coleccion, user_id, datos, fecha_tipo, fecha_valor, actualizado) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (ruta, padre, coleccion, user_id, _a_json(datos), *(clave or (None, None)), instante),
+        )
+
+    # --- Listeners ---
+    def _escuchar(self, ruta: str, callback, documento: bool) -> Watch:
+        clave = (ruta, uuid.uuid4().hex)
+        with self._lock:
+            self._listeners[clave] = (ruta, documento, callback)
+            # Instantánea inicial, en el mismo orden que el resto de eventos
+            if documento:
+                self._eventos.put((callback, [DocumentReference(self, ruta).get()], [], None))
+            else:
+                snaps = list(CollectionReference(self, ruta).stream())
+                self._eventos.put((callback, snaps, [DocumentChange(ChangeType.ADDED, s) for s in snaps], None))
+        return Watch(self, clave)
+
+    def _notificar(self, cambios: list[tuple], instante: int) -> None:
+        momento = datetime.fromtimestamp(instante / 1e6, timezone.utc)
+        for ruta_listener, documento, callback in list(self._listeners.values()):
+            eventos = []
+            for ruta, anterior, nuevo in cambios:
+                if (ruta if documento else ruta.rsplit("/", 1)[0]) != ruta_listener:
+                    continue
+                ref = DocumentReference(self, ruta)
+                if nuevo is None:
+                    if anterior is not None:
+                        eventos.append(DocumentChange(ChangeType.REMOVED, DocumentSnapshot(ref, anterior, None)))
+                else:
+                    tipo = ChangeType.ADDED if anterior is None else ChangeType.MODIFIED
+                    eventos.append(DocumentChange(tipo, DocumentSnapshot(ref, deepcopy(nuevo), instante)))
+            if not eventos:
+                continue
+            if documento:
+                ultimo = eventos[-1].document
+                snap = DocumentSnapshot(ultimo.reference, None, None) if eventos[-1].type is ChangeType.REMOVED else ultimo
+                self._eventos.put((callback, [snap], eventos, momento))
+            else:
+                self._eventos.put((callback, [], eventos, momento))
+
+    def _despachar(self) -> None:
+        """Hilo que ejecuta los callbacks de los listeners, como hace el cliente de Firestore."""
+        while True:
+            callback, snaps, cambios, momento = self._eventos.get()
+            try:
+                callback(snaps, cambios, momento)
+            except Exception as e:
+                print(f"Error en un listener del almacén SQLite: {e}")
+
+def crear_cliente_sqlite(ruta: str = SQLITE_RUTA) -> ClienteSQLite:
+    directorio = os.path.dirname(ruta)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+    return ClienteSQLite(ruta)
@@ -0,0 +1,103 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# analitica_utils.py
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from personas_utils import COMPONENTES_TEMPERAMENTALES, ESFERAS_BASE, NIVELES_RELACION
+
+CARACTERISTICAS = ["formalidad", "amistad", "conflicto"]
+ESFERAS = list(ESFERAS_BASE) + ["otras"]
+
+# ─────────────────── APLANADO DE PERSONAS ────────────────────
+
+def personas_a_dataframes(personas: Iterable[dict]) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Aplana las personas en dos tablas tipadas.
+
+    - Una fila por persona: nombre, sexo, edad, los 7 componentes, niveles de la relación
+      (categorías ordenadas) y una columna booleana por esfera.
+    - Una fila por idioma y persona (ID, idioma, nivel).
+    """
+    filas, idiomas = [], []
+    for p in personas:
+        dp = p.get("datos_personales", {})
+        ct = p.get("componentes_temperamentales", {})
+        rel = p.get("relaciones", {})
+        esferas = rel.get("esferas", {})
+        carac = rel.get("características", {})
+        fila = {
+            "ID": p.get("ID"),
+            "nombre": dp.get("nombre", ""),
+            "sexo": dp.get("sexo", ""),
+            "edad": dp.get("edad") or np.nan,
+        }
+        fila.update({comp: ct.get(comp, np.nan) for comp in COMPONENTES_TEMPERAMENTALES})
+        fila.update({campo: carac.get(campo) for campo in CARACTERISTICAS})
+        fila.update({f"esfera_{esfera}": bool(esferas.get(esfera)) for esfera in ESFERAS})
+        filas.append(fila)
+        for idioma in p.get("capacidades", {}).get("Idiomas", []):
+            idiomas.append({"ID": p.get("ID"), "idioma": idioma.get("Idioma"), "nivel": idioma.get("Nivel")})
+
+    columnas = (["ID", "nombre", "sexo", "edad"] + COMPONENTES_TEMPERAMENTALES + CARACTERISTICAS
+                + [f"esfera_{esfera}" for esfera in ESFERAS])
+    df = pd.DataFrame(filas, columns=columnas)
+    df["sexo"] = df["sexo"].astype("category")
+    df["edad"] = pd.to_numeric(df["edad"], errors="coerce").astype("Float32")
+    df[COMPONENTES_TEMPERAMENTALES] = df[COMPONENTES_TEMPERAMENTALES].apply(pd.to_numeric, errors="coerce").astype("float32")
+    nivel = pd.CategoricalDtype(NIVELES_RELACION, ordered=True)
+    for campo in CARACTERISTICAS:
+        df[campo] = df[campo].astype(nivel)
+
+    df_idiomas = pd.DataFrame(idiomas, columns=["ID", "idioma", "nivel"]).astype(
+        {"idioma": "category", "nivel": "category"})
+    return df, df_idiomas
+
+# ─────────────────── AGREGADOS ────────────────────
+
+def resumen_red(df: pd.DataFrame) -> dict:
+    """Cifras generales de la red de personas."""
+    alto = df["conflicto"].isin(["Alto", "Muy alto"])
+    return {
+        "personas": len(df),
+        "edad_media": float(df["edad"].mean()) if df["edad"].notna().any() else None,
+        "conflicto_alto": int(alto.sum()),
+        "conflicto_alto_pct": float(alto.mean()) if len(df) else 0.0,
+    }
+
+def conteo_por_nivel(df: pd.DataFrame, caracteristica: str) -> pd.Series:
+    """Número de personas por nivel (de Muy bajo a Muy alto) de una característica de la relación."""
+    return df[caracteristica].value_counts(sort=False).reindex(NIVELES_RELACION, fill_value=0)
+
+def distribucion_componente(df: pd.DataFrame, componente: str) -> pd.Series:
+    """Histograma de puntuaciones (tramos de un punto entre 0 y 17) de un componente."""
+    tramos = pd.cut(df[componente], bins=np.arange(0, 19), right=False, labels=[str(i) for i in range(18)])
+    return tramos.value_counts(sort=False)
+
+def media_componentes(df: pd.DataFrame) -> pd.Series:
+    """Puntuación media de cada componente temperamental en la red."""
+    return df[COMPONENTES_TEMPERAMENTALES].mean()
+
+def conteo_esferas(df: pd.DataFrame) -> pd.Series:
+    """Número de personas con algún rol en cada esfera de relación."""
+    conteo = df[[f"esfera_{esfera}" for esfera in ESFERAS]].sum()
+    conteo.index = [esfera.capitalize() for esfera in ESFERAS]
+    return conteo
+
+def tabla_idiomas(df_idiomas: pd.DataFrame) -> pd.DataFrame:
+    """Tabla cruzada idioma x nivel con el número de personas."""
+    if df_idiomas.empty:
+        return pd.DataFrame()
+    return pd.crosstab(df_idiomas["idioma"], df_idiomas["nivel"])
+
+def perfil_grupos(df: pd.DataFrame, grupos: dict[str, int]) -> pd.DataFrame:
+    """Tamaño y puntuación media de cada grupo temperamental (ver MatrizTemperamentos.agrupar)."""
+    if not grupos:
+        return pd.DataFrame()
+    etiquetas = df["ID"].map(grupos)
+    tabla = df[COMPONENTES_TEMPERAMENTALES].groupby(etiquetas).mean().round(1)
+    tabla.insert(0, "personas", etiquetas.value_counts().sort_index())
+    tabla.index = [f"Grupo {int(g) + 1}" for g in tabla.index]
+    return tabla
@@ -0,0 +1,119 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_almacen.py
+"""Compara el almacén SQLite (almacen_utils.ClienteSQLite) con Firestore en memoria en las consultas de la aplicación.
+
+Puebla ambos con los mismos datos de un usuario y ejecuta las consultas de las páginas (lista de
+conversaciones por fecha con cursor, memorias en un rango de fechas, recorrido de memorias por
+nombre de documento y la consulta de la migración de fechas), comprobando que devuelven los mismos
+documentos en el mismo orden. Después mide lotes de escritura y el borrado recursivo en SQLite.
+
+Uso:  python benchmarks/bench_almacen.py --memorias 20000 --conversaciones 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from almacen_utils import ClienteSQLite
+from benchmarks.fakes import FakeFirestore, persona_sintetica
+from borrado_utils import borrar_usuario_recursivo
+
+INICIO = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def poblar(db, user_id: str, args) -> None:
+    user = db.collection("usuarios").document(user_id)
+    user.set({"datos_personales": {"nombre": "Bench"}})
+    documentos = []
+    for i in range(args.personas):
+        documentos.append((user.collection("sujetos").document(f"s{i:05d}"), persona_sintetica(i)))
+    for i in range(args.memorias):
+        # Una de cada diez memorias conserva la fecha antigua en texto (sin migrar)
+        fecha = INICIO + timedelta(hours=7 * i)
+        valor = fecha.strftime("%Y/%m/%d %H:%M") if i % 10 == 0 else fecha
+        documentos.append((user.collection("memorias").document(f"m{i:06d}"),
+                           {"memoria": f"Memoria {i}", "fecha_registro": valor}))
+    for i in range(args.conversaciones):
+        documentos.append((user.collection("conversaciones").document(f"c{i:05d}"),
+                           {"title": f"Conversación {i}", "start_time": INICIO + timedelta(hours=13 * i),
+                            "turns": [{"role": "user", "content": "Hola", "timestamp": INICIO}] * 4}))
+    for inicio in range(0, len(documentos), 500):
+        lote = db.batch()
+        for ref, datos in documentos[inicio:inicio + 500]:
+            lote.set(ref, datos)
+        lote.commit()
+
+def paginas(consulta, tam: int) -> list[str]:
+    """Ids de todas las páginas de una consulta recorrida con cursor."""
+    ids, ultimo = [], None
+    while True:
+        pagina = list((consulta.start_after(ultimo) if ultimo is not None else consulta).limit(tam).stream())
+        ids += [s.id for s in pagina]
+        if len(pagina) < tam:
+            return ids
+        ultimo = pagina[-1]
+
+def consultas(db, user_id: str) -> dict[str, object]:
+    user = db.collection("usuarios").document(user_id)
+    memorias, conversaciones = user.collection("memorias"), user.collection("conversaciones")
+    desde, hasta = INICIO + timedelta(days=100), INICIO + timedelta(days=400)
+    return {
+        "conversaciones recientes (20)": lambda: [s.id for s in conversaciones.order_by("start_time", direction="DESCENDING")
+                                                  .select(["title", "start_time"]).limit(20).stream()],
+        "conversaciones paginadas": lambda: paginas(conversaciones.order_by("start_time", direction="DESCENDING"), 20),
+        "memorias en un rango": lambda: [s.id for s in memorias.where("fecha_registro", ">=", desde)
+                                         .where("fecha_registro", "<", hasta)
+                                         .order_by("fecha_registro", direction="DESCENDING").stream()],
+        "memorias por nombre": lambda: paginas(memorias.order_by("__name__"), 500),
+        "fechas sin migrar": lambda: [s.id for s in memorias.where("fecha_registro", ">=", "")
+                                      .order_by("fecha_registro").order_by("__name__").stream()],
+    }
+
+def medir(funcion, repeticiones: int) -> tuple[object, float]:
+    tiempos, resultado = [], None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return resultado, statistics.median(tiempos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--personas", type=int, default=300)
+    parser.add_argument("--memorias", type=int, default=20_000)
+    parser.add_argument("--conversaciones", type=int, default=2_000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        sqlite, memoria = ClienteSQLite(os.path.join(carpeta, "bench.sqlite3")), FakeFirestore()
+        inicio = time.perf_counter()
+        poblar(sqlite, "bench", args)
+        print(f"[escritura] {args.personas + args.memorias + args.conversaciones:,} documentos en lotes de 500 "
+              f"en SQLite: {time.perf_counter() - inicio:.2f} s")
+        poblar(memoria, "bench", args)
+
+        distintas = 0
+        consultas_memoria = consultas(memoria, "bench")
+        for nombre, consulta in consultas(sqlite, "bench").items():
+            ids, mediana = medir(consulta, args.repeticiones)
+            esperados, mediana_memoria = medir(consultas_memoria[nombre], args.repeticiones)
+            iguales = ids == esperados
+            distintas += not iguales
+            print(f"[{nombre:<30}] {len(ids):>6,} docs  sqlite={mediana * 1e3:7.1f} ms  "
+                  f"en memoria={mediana_memoria * 1e3:7.1f} ms  {'iguales' if iguales else 'DISTINTOS'}")
+
+        resultado = borrar_usuario_recursivo(sqlite, "bench")
+        restantes = len(list(sqlite.collection("usuarios").recursive().stream()))
+        print(f"[borrado recursivo] {resultado.borrados:,} documentos en {resultado.segundos:.2f} s "
+              f"(restantes={restantes})")
+    sys.exit(1 if distintas else 0)
+
+if __name__ == "__main__":
+    main()
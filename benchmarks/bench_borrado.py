@@ -0,0 +1,61 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_borrado.py
+"""Mide el borrado completo de un usuario con muchos documentos contra Firestore en memoria con latencia simulada.
+
+Compara el borrado anterior (documento a documento, solo memorias) con el borrado recursivo
+por lotes concurrentes de borrado_utils.
+
+Uso:  python benchmarks/bench_borrado.py --documentos 30000 --latencia 0.02
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeFirestore, persona_sintetica
+from borrado_utils import borrar_usuario_recursivo
+
+def poblar(db: FakeFirestore, user_id: str, documentos: int) -> None:
+    """Reparte los documentos entre sujetos, memorias y conversaciones (con una subcolección anidada)."""
+    user = ("usuarios", user_id)
+    db.docs[user] = {"datos_personales": {"nombre": "Bench"}}
+    for i in range(documentos):
+        if i % 3 == 0:
+            db.docs[user + ("sujetos", f"s{i}")] = persona_sintetica(i)
+        elif i % 3 == 1:
+            db.docs[user + ("memorias", f"m{i}")] = {"memoria": f"Memoria {i}", "fecha_registro": "2025/01/01 10:00"}
+        else:
+            db.docs[user + ("conversaciones", f"c{i}", "adjuntos", "a")] = {"nombre": "fichero.txt"}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documentos", type=int, default=30_000)
+    parser.add_argument("--latencia", type=float, default=0.02, help="segundos por escritura o commit")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    args = parser.parse_args()
+
+    # Borrado anterior: un delete por memoria, en secuencia (se extrapola a partir de una muestra)
+    db = FakeFirestore(latencia=args.latencia)
+    poblar(db, "bench", min(args.documentos, 300))
+    inicio = time.perf_counter()
+    memorias = list(db.collection("usuarios").document("bench").collection("memorias").stream())
+    for doc in memorias:
+        doc.reference.delete()
+    por_documento = (time.perf_counter() - inicio) / max(1, len(memorias))
+    print(f"[secuencial] {por_documento * 1000:.1f} ms/documento -> ~{por_documento * args.documentos:,.0f} s "
+          f"para {args.documentos:,} documentos (y sin borrar sujetos ni conversaciones)")
+
+    db = FakeFirestore(latencia=args.latencia)
+    poblar(db, "bench", args.documentos)
+    total = len(db.docs)
+    resultado = borrar_usuario_recursivo(db, "bench", concurrencia=args.concurrencia)
+    print(f"[recursivo ] borrados={resultado.borrados:,}/{total:,} restantes={len(db.docs)} "
+          f"lotes={resultado.lotes} en {resultado.segundos:.1f} s "
+          f"({resultado.documentos_por_segundo:,.0f} documentos/s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_cache.py
+"""Mide la caché de lecturas por usuario (cache_utils.CacheLecturas) con sesiones concurrentes.
+
+Cada sesión hace reruns que leen la lista de conversaciones de su usuario (una consulta con la latencia
+de Firestore simulada), y cada cierto número de reruns guarda un turno, lo que invalida la colección.
+Se comparan las consultas que llegan a Firestore y la latencia de los reruns con y sin caché.
+
+Uso:  python benchmarks/bench_cache.py --sesiones 40 --usuarios 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache_utils import CacheLecturas
+
+def simular(cache: CacheLecturas | None, args) -> tuple[int, list[float]]:
+    consultas = 0
+    lock = threading.Lock()
+
+    def consultar():
+        nonlocal consultas
+        with lock:
+            consultas += 1
+        time.sleep(args.latencia_ms / 1000)
+        return ["conversación"] * 20
+
+    def sesion(n: int) -> list[float]:
+        usuario = f"u{n % args.usuarios}"
+        tiempos = []
+        for rerun in range(args.reruns):
+            inicio = time.perf_counter()
+            if cache is None:
+                consultar()
+            else:
+                cache.obtener(usuario, "conversaciones", ("recientes", 20), consultar)
+            tiempos.append(time.perf_counter() - inicio)
+            if rerun % args.escritura_cada == args.escritura_cada - 1 and cache is not None:
+                cache.invalidar(usuario, "conversaciones")
+            time.sleep(args.pausa_ms / 1000)
+        return tiempos
+
+    with ThreadPoolExecutor(max_workers=args.sesiones) as pool:
+        tiempos = [t for lista in pool.map(sesion, range(args.sesiones)) for t in lista]
+    return consultas, tiempos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=40)
+    parser.add_argument("--usuarios", type=int, default=10)
+    parser.add_argument("--reruns", type=int, default=30)
+    parser.add_argument("--escritura-cada", type=int, default=5, help="Reruns entre escrituras de cada sesión")
+    parser.add_argument("--latencia-ms", type=float, default=40.0)
+    parser.add_argument("--pausa-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    for nombre, cache in (("sin caché", None), ("con caché", CacheLecturas())):
+        consultas, tiempos = simular(cache, args)
+        cuantiles = statistics.quantiles(tiempos, n=100)
+        extra = ""
+        if cache is not None:
+            extra = f"  aciertos={cache.aciertos:,} agrupadas={cache.agrupadas:,} ({cache.tasa_aciertos:.0%})"
+        print(f"[{nombre}] consultas a Firestore={consultas:,} de {len(tiempos):,} lecturas  "
+              f"p50={cuantiles[49] * 1e3:.1f} ms  p95={cuantiles[94] * 1e3:.1f} ms{extra}")
+
+if __name__ == "__main__":
+    main()
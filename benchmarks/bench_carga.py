@@ -0,0 +1,239 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_carga.py
+"""Prueba de carga: sesiones concurrentes que recorren las páginas de la aplicación en un solo proceso.
+
+Cada sesión ejecuta las páginas con `streamlit.testing.v1.AppTest` y hace un recorrido realista:
+inicio de sesión, conversación en Mi Asistente (guardada, con un turno que llama a la herramienta
+guardar_memoria), edición de una persona en Mi Gente y consulta de Mi Perfil. Todo es local: el
+almacén SQLite de almacen_utils.py (misma API y listeners que Firestore) en un fichero temporal,
+GCS sobre un sistema de ficheros fsspec en memoria y un Gemini guionizado con latencia simulada.
+
+Informa de p50/p95/p99 por acción y del pico de memoria residente del proceso.
+
+Uso:  python benchmarks/bench_carga.py --sesiones 20 --usuarios 5 --turnos 3
+"""
+import argparse
+import contextlib
+import logging
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# El almacén se elige al importar almacen_utils, antes de cargar ninguna página
+CARPETA = tempfile.mkdtemp(prefix="bench_carga_")
+os.environ["ALMACEN"] = "sqlite"
+os.environ["SQLITE_RUTA"] = os.path.join(CARPETA, "carga.sqlite3")
+
+from almacen_utils import ClienteSQLite
+from benchmarks.fakes import GeminiGuionizado, persona_sintetica, registrar_gcs_en_memoria
+from conexiones_utils import ESTADISTICAS_CONEXIONES
+from gcs_utils import BUCKET
+from prompt_utils import RECURSOS_ESTATICOS, TABLAS_COMPONENTES
+
+CONTRASENA = "OWN-PASSWORD"
+TIMEOUT_PAGINA = 120
+
+def poblar(args) -> None:
+    """Usuarios con perfil, personas y memorias, y los ficheros estáticos de GCS."""
+    db = ClienteSQLite(os.environ["SQLITE_RUTA"])
+    for u in range(args.usuarios):
+        user = db.collection("usuarios").document(f"u{u}")
+        perfil = persona_sintetica(10_000 + u)
+        perfil.pop("relaciones")
+        user.set(perfil)
+        lote = db.batch()
+        for i in range(args.personas):
+            lote.set(user.collection("sujetos").document(f"s{i:05d}"), persona_sintetica(i))
+            if i < args.memorias:
+                nombre = persona_sintetica(i)["datos_personales"]["nombre"]
+                lote.set(user.collection("memorias").document(f"m{i:05d}"),
+                         {"memoria": f"{nombre} prefiere las reuniones por la mañana.", "fecha_registro": "2025/01/01 10:00"})
+        lote.commit()
+
+    ficheros = {f"{BUCKET}/{ruta}": f"Contenido de {ruta}." for ruta, _ in RECURSOS_ESTATICOS}
+    ficheros[f"{BUCKET}/{TABLAS_COMPONENTES}"] = "{}"
+    ficheros[f"{BUCKET}/ESCO/skills_es.csv"] = "preferredLabel\n" + "\n".join(f"habilidad {i}" for i in range(500))
+    registrar_gcs_en_memoria(ficheros)
+
+def preparar_apptest_concurrente() -> None:
+    """Ajustes para ejecutar varias AppTest a la vez en hilos de un mismo proceso.
+
+    - AppTest crea un runtime simulado en `Runtime._instance` al empezar cada run y lo borra al
+      terminar; una sesión lo borraba mientras los ScriptRunner de las demás seguían usándolo
+      ("Runtime hasn't been created!"). Se conserva el último creado.
+    - Cada run vuelve a compilar la página con `ast.parse`, que en Python 3.11 no admite llamadas
+      simultáneas ("AST constructor recursion depth mismatch"); las compilaciones se hacen de una en una.
+    """
+    import ast
+    from streamlit.runtime import Runtime
+
+    parse_original = ast.parse
+    lock_ast = threading.Lock()
+
+    def parse(*args, **kwargs):
+        with lock_ast:
+            return parse_original(*args, **kwargs)
+
+    ast.parse = parse
+    ultimo = {"runtime": None}
+    lock = threading.Lock()
+
+    def instance(cls):
+        with lock:
+            if cls._instance is not None:
+                ultimo["runtime"] = cls._instance
+            if ultimo["runtime"] is None:
+                raise RuntimeError("Runtime hasn't been created!")
+            return ultimo["runtime"]
+
+    Runtime.instance = classmethod(instance)
+    Runtime.exists = classmethod(lambda cls: cls._instance is not None or ultimo["runtime"] is not None)
+    # Los hilos de la prueba no son de Streamlit; su aviso de "bare mode" no aporta nada
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+
+class Sesion:
+    """Recorrido de una sesión; guarda la duración de cada acción (un rerun de la página)."""
+
+    def __init__(self, n: int, args, tiempos: dict, errores: list, lock: threading.Lock):
+        self.n = n
+        self.usuario = f"u{n % args.usuarios}"
+        self.args = args
+        self.tiempos = tiempos
+        self.errores = errores
+        self.lock = lock
+
+    def medir(self, accion: str, app, paso):
+        inicio = time.perf_counter()
+        app = paso(app)
+        duracion = time.perf_counter() - inicio
+        with self.lock:
+            self.tiempos[accion].append(duracion)
+            if app.exception:
+                self.errores.append(f"{self.usuario} {accion}: {app.exception[0].message}")
+        return app
+
+    def pagina(self, fichero: str):
+        from streamlit.testing.v1 import AppTest
+        app = AppTest.from_file(os.path.join(RAIZ, fichero), default_timeout=TIMEOUT_PAGINA)
+        app.session_state["password_entered"] = True
+        app.session_state["user_id"] = self.usuario
+        return app
+
+    def iniciar_sesion(self):
+        from streamlit.testing.v1 import AppTest
+        app = AppTest.from_file(os.path.join(RAIZ, "Inicio.py"), default_timeout=TIMEOUT_PAGINA)
+        app = self.medir("inicio: formulario", app, lambda a: a.run())
+        app.text_input[0].set_value(self.usuario)
+        app.text_input[1].set_value(CONTRASENA)
+        self.medir("inicio: acceder", app, lambda a: a.button[0].click().run())
+
+    def conversar(self):
+        app = self.medir("asistente: carga", self.pagina("1_Mi_Asistente.py"), lambda a: a.run())
+        guardar = next(b for b in app.sidebar.button if b.label == "💾 Guardar conversación")
+        self.medir("asistente: guardar", app, lambda a: guardar.click().run())
+        for turno in range(self.args.turnos):
+            mensaje = (f"Recuerda que la persona {self.n} prefiere los correos cortos (turno {turno})." if turno == 0
+                       else f"¿Cómo planteo la reunión {turno} con mi equipo?")
+            accion = "asistente: turno con herramienta" if turno == 0 else "asistente: turno"
+            self.medir(accion, app, lambda a: a.chat_input[0].set_value(mensaje).run())
+
+    def editar_persona(self):
+        app = self.medir("gente: lista", self.pagina("2_Mi_Gente.py"), lambda a: a.run())
+        persona_id = f"s{self.n % self.args.personas:05d}"
+        fichas = [t.key for t in app.toggle if t.key == f"ver_{persona_id}"]
+        if not fichas:
+            # La persona no está en la primera página de la lista
+            fichas = [t.key for t in app.toggle if t.key and t.key.startswith("ver_")][:1]
+        persona_id = fichas[0].removeprefix("ver_")
+        # Los botones de edición solo se muestran con la ficha desplegada
+        app = self.medir("gente: ver ficha", app, lambda a: a.toggle(key=f"ver_{persona_id}").set_value(True).run())
+        app = self.medir("gente: abrir edición", app, lambda a: a.button(key=f"edit_{persona_id}").click().run())
+        nombre = next(t for t in app.text_input if t.label == "Nombre o apodo *")
+        nombre.set_value(f"{nombre.value} (sesión {self.n})")
+        guardar = next(b for b in app.button if b.label == "💾 Guardar")
+        self.medir("gente: guardar", app, lambda a: guardar.click().run())
+
+    def ver_perfil(self):
+        self.medir("perfil: carga", self.pagina("3_Mi_Perfil.py"), lambda a: a.run())
+
+    def recorrer(self):
+        try:
+            self.iniciar_sesion()
+            self.conversar()
+            self.editar_persona()
+            self.ver_perfil()
+        except Exception as e:
+            with self.lock:
+                self.errores.append(f"{self.usuario}: {type(e).__name__}: {e}")
+
+def rss_maximo_mb() -> float:
+    """Pico de memoria residente del proceso (ru_maxrss está en KB en Linux y en bytes en macOS)."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def cuantiles(valores: list[float]) -> str:
+    if len(valores) < 2:
+        return f"p50={valores[0] * 1e3:7.0f} ms" if valores else ""
+    q = statistics.quantiles(valores, n=100)
+    return f"p50={q[49] * 1e3:7.0f} ms  p95={q[94] * 1e3:7.0f} ms  p99={q[98] * 1e3:7.0f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sesiones", type=int, default=20, help="Sesiones concurrentes")
+    parser.add_argument("--usuarios", type=int, default=5, help="Usuarios distintos entre los que se reparten")
+    parser.add_argument("--personas", type=int, default=100)
+    parser.add_argument("--memorias", type=int, default=30)
+    parser.add_argument("--turnos", type=int, default=3, help="Mensajes por conversación (el primero usa la herramienta)")
+    parser.add_argument("--latencia-gemini", type=float, default=0.4, help="Segundos hasta el primer fragmento")
+    parser.add_argument("--rampa", type=float, default=0.1, help="Segundos entre el arranque de cada sesión")
+    args = parser.parse_args()
+
+    poblar(args)
+    preparar_apptest_concurrente()
+    gemini = GeminiGuionizado(primer_trozo=args.latencia_gemini)
+    from google import genai
+    genai.Client = lambda *a, **k: gemini
+
+    rss_inicial = rss_maximo_mb()
+    tiempos, errores, lock = defaultdict(list), [], threading.Lock()
+
+    def lanzar(n: int):
+        time.sleep(n * args.rampa)
+        Sesion(n, args, tiempos, errores, lock).recorrer()
+
+    inicio = time.perf_counter()
+    # Las páginas imprimen el prompt inicial; se descarta para no mezclarlo con el informe
+    with open(os.devnull, "w") as nulo, contextlib.redirect_stdout(nulo):
+        with ThreadPoolExecutor(max_workers=args.sesiones) as pool:
+            list(pool.map(lanzar, range(args.sesiones)))
+    total = time.perf_counter() - inicio
+
+    print(f"{args.sesiones} sesiones de {args.usuarios} usuarios en {total:.1f} s  "
+          f"(llamadas a Gemini={gemini.llamadas}, herramientas={gemini.herramientas})")
+    for accion, valores in tiempos.items():
+        print(f"[{accion:<32}] n={len(valores):>4}  {cuantiles(valores)}")
+    todas = [t for valores in tiempos.values() for t in valores]
+    print(f"[{'todas las acciones':<32}] n={len(todas):>4}  {cuantiles(todas)}")
+    print(f"RSS máximo={rss_maximo_mb():,.0f} MB (antes de las sesiones: {rss_inicial:,.0f} MB)")
+    print(f"Conexiones: {ESTADISTICAS_CONEXIONES.resumen()}")
+    for error in errores[:20]:
+        print(f"  ERROR {error}")
+    if len(errores) > 20:
+        print(f"  ... y {len(errores) - 20} errores más")
+    shutil.rmtree(CARPETA, ignore_errors=True)
+    sys.exit(1 if errores else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_importacion.py
+"""Mide el rendimiento de la importación/exportación masiva de personas contra Firestore en memoria.
+
+Uso:  python benchmarks/bench_importacion.py --personas 20000
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import FakeFirestore, persona_sintetica
+from importacion_utils import exportar_personas, importar_personas, leer_personas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--personas", type=int, default=10_000)
+    parser.add_argument("--lote", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for formato in ("csv", "jsonl"):
+            ruta = os.path.join(tmp, f"personas.{formato}")
+            with open(ruta, "w", encoding="utf-8", newline="") as f:
+                exportar_personas((persona_sintetica(i) for i in range(args.personas)), f, formato)
+
+            db = FakeFirestore()
+            with open(ruta, encoding="utf-8", newline="") as f:
+                resultado = importar_personas(db, "bench", leer_personas(f, formato), tam_lote=args.lote)
+
+            inicio = time.perf_counter()
+            personas = (d.to_dict() for d in db.collection("usuarios").document("bench").collection("sujetos").stream())
+            exportadas = exportar_personas(personas, io.StringIO(), formato)
+            segundos_exportacion = time.perf_counter() - inicio
+
+            print(f"[{formato}] importadas={resultado.importadas} errores={len(resultado.errores)} "
+                  f"lotes={resultado.lotes} ({db.commits} commits) "
+                  f"importación={resultado.personas_por_segundo:,.0f} personas/s "
+                  f"exportación={exportadas / segundos_exportacion:,.0f} personas/s")
+
+if __name__ == "__main__":
+    main()
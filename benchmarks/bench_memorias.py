@@ -0,0 +1,100 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_memorias.py
+"""Mide la deduplicación de memorias (MinHash/LSH) sobre una colección sintética con paráfrasis.
+
+- Escritura: tiempo de `decidir_guardado` por memoria nueva frente a comparar con todas (Jaccard exacto).
+- Consolidación: grupos encontrados, memorias borradas y tokens que deja de ocupar el bloque de memorias.
+- Resúmenes por persona: tokens del bloque de memorias del prompt con resúmenes (resumidor local)
+  frente a las memorias sueltas.
+
+Uso:  python benchmarks/bench_memorias.py --memorias 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memorias_utils import (IndiceMemorias, ResumidorLocal, compactar_memorias, decidir_guardado, jaccard,
+                            memorias_para_prompt, planificar_consolidacion, shingles)
+from prompt_utils import SerializadorCompacto, estimar_tokens
+
+NOMBRES = ["Ana", "Luis", "Marta", "Jorge", "Lucía", "Pedro", "Sara", "Diego", "Elena", "Raúl"]
+APELLIDOS = ["García", "López", "Martín", "Sánchez", "Romero", "Navarro", "Torres", "Gil", "Vidal", "Molina"]
+SEGUNDOS_APELLIDOS = ["Ruiz", "Díaz", "Moreno", "Muñoz", "Álvarez", "Jiménez", "Castro", "Ortega", "Rubio", "Marín"]
+HECHOS = [
+    ("prefiere las reuniones por la mañana", "prefiere reunirse por las mañanas"),
+    ("es alérgica a los frutos secos", "tiene alergia a los frutos secos"),
+    ("está preparando un maratón en primavera", "prepara el maratón de primavera"),
+    ("no le gusta que le interrumpan cuando habla", "le molesta que le interrumpan mientras habla"),
+    ("quiere cambiar de departamento este año", "quiere cambiarse de departamento este año"),
+    ("toma el café sin azúcar", "el café lo toma siempre sin azúcar"),
+]
+
+def nombre_persona(persona: int) -> str:
+    return f"{NOMBRES[persona % 10]} {APELLIDOS[persona // 10 % 10]} {SEGUNDOS_APELLIDOS[persona // 100 % 10]}"
+
+def memorias_sinteticas(n: int, proporcion_parafrasis: float, semilla: int = 0) -> dict[str, dict]:
+    azar = random.Random(semilla)
+    memorias = {}
+    for i in range(n):
+        # Cada persona (nombre y dos apellidos) tiene un hecho de cada tipo
+        nombre = nombre_persona(i // len(HECHOS))
+        original, parafrasis = HECHOS[i % len(HECHOS)]
+        memorias[f"m{i}"] = {"memoria": f"{nombre} {original}", "fecha_registro": f"2025-01-01 00:{i % 60:02d}:00"}
+        if azar.random() < proporcion_parafrasis:
+            memorias[f"p{i}"] = {"memoria": f"{nombre} {parafrasis}", "fecha_registro": f"2025-02-01 00:{i % 60:02d}:00"}
+    return memorias
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--memorias", type=int, default=5_000)
+    parser.add_argument("--parafrasis", type=float, default=0.3, help="Proporción de memorias con una paráfrasis")
+    parser.add_argument("--consultas", type=int, default=200)
+    args = parser.parse_args()
+
+    memorias = memorias_sinteticas(args.memorias, args.parafrasis)
+    indice = IndiceMemorias()
+    for memoria_id, memoria in memorias.items():
+        indice.actualizar(memoria_id, memoria)
+    conjuntos = {i: shingles(m["memoria"]) for i, m in memorias.items()}
+    # Paráfrasis de memorias que ya están guardadas (deberían omitirse)
+    consultas = [memorias[f"m{i}"]["memoria"].replace(*HECHOS[i % len(HECHOS)]) for i in range(args.consultas)]
+
+    inicio = time.perf_counter()
+    decisiones = [decidir_guardado(indice, c)[0] for c in consultas]
+    ms_lsh = (time.perf_counter() - inicio) / len(consultas) * 1e3
+    inicio = time.perf_counter()
+    for c in consultas:
+        nueva = shingles(c)
+        [i for i, s in conjuntos.items() if jaccard(nueva, s) >= 0.6]
+    ms_exacto = (time.perf_counter() - inicio) / len(consultas) * 1e3
+    print(f"{len(memorias):,} memorias. Escritura: LSH={ms_lsh:.2f} ms/memoria  comparación exacta={ms_exacto:.2f} ms/memoria")
+    print("  decisiones: " + ", ".join(f"{d}={decisiones.count(d)}" for d in ("guardar", "omitir", "sustituir")))
+
+    inicio = time.perf_counter()
+    plan = planificar_consolidacion(memorias)
+    segundos = time.perf_counter() - inicio
+    print(f"Consolidación ({segundos:.2f} s): {len(plan.grupos):,} grupos, {len(plan.borrar):,} memorias borradas, "
+          f"tokens {plan.tokens_antes:,} → {plan.tokens_despues:,} "
+          f"(-{plan.tokens_ahorrados:,}, {plan.tokens_ahorrados / plan.tokens_antes:.0%})")
+
+    personas = [{"ID": f"p{p}", "datos_personales": {"nombre": nombre_persona(p)}}
+                for p in range((args.memorias - 1) // len(HECHOS) + 1)]
+    inicio = time.perf_counter()
+    nuevos, _ = compactar_memorias(memorias, personas, {}, ResumidorLocal())
+    segundos = time.perf_counter() - inicio
+    serializador = SerializadorCompacto()
+    lista = [m | {"id": i} for i, m in memorias.items()]
+    resumenes, sueltas = memorias_para_prompt(lista, {r.persona_id: r.a_firestore() for r in nuevos})
+    tokens_memorias = estimar_tokens(serializador.memorias(lista))
+    tokens_resumenes = estimar_tokens(serializador.resumenes(resumenes) + "\n" + serializador.memorias(sueltas))
+    print(f"Resúmenes ({segundos:.2f} s): {len(nuevos):,} personas resumidas, {len(sueltas):,} memorias sueltas, "
+          f"tokens {tokens_memorias:,} → {tokens_resumenes:,} ({tokens_resumenes / tokens_memorias:.0%})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_modelos.py
+"""Compara memoria y tiempo de las personas como diccionarios anidados frente a registros de modelos.py.
+
+- Memoria: bytes por persona retenidos (tracemalloc) con cada representación.
+- Tiempo de rerun: lo que hace el formulario de una persona en cada rerun de Streamlit
+  (copia de trabajo, validación y documento a guardar).
+
+Uso:  python benchmarks/bench_modelos.py --personas 10000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import persona_sintetica
+from modelos import Persona, validar
+
+def bytes_retenidos(construir) -> tuple[object, int]:
+    """Construye un objeto y devuelve cuántos bytes quedan asignados tras liberar los temporales."""
+    gc.collect()
+    tracemalloc.start()
+    objeto = construir()
+    gc.collect()
+    actual, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objeto, actual
+
+def cronometrar(funcion, repeticiones: int) -> float:
+    """Microsegundos por llamada."""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        funcion()
+    return (time.perf_counter() - inicio) / repeticiones * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--personas", type=int, default=10_000)
+    parser.add_argument("--repeticiones", type=int, default=2_000)
+    args = parser.parse_args()
+
+    # Cada persona se decodifica de JSON para que ninguna cadena se comparta entre representaciones
+    documentos = [json.dumps(persona_sintetica(i), ensure_ascii=False) for i in range(args.personas)]
+
+    dicts, bytes_dicts = bytes_retenidos(lambda: [json.loads(d) for d in documentos])
+    del dicts
+    registros, bytes_registros = bytes_retenidos(lambda: [Persona.desde_firestore(json.loads(d)) for d in documentos])
+    assert registros[0].a_firestore() == json.loads(documentos[0])
+    del registros
+
+    print(f"Memoria por persona: dict={bytes_dicts / args.personas:,.0f} B  "
+          f"registro={bytes_registros / args.personas:,.0f} B  "
+          f"({bytes_registros / bytes_dicts:.0%} del dict)")
+
+    persona = persona_sintetica(7)
+    registro = Persona.desde_firestore(persona)
+    us_deepcopy = cronometrar(lambda: deepcopy(persona), args.repeticiones)
+    us_desde = cronometrar(lambda: Persona.desde_firestore(persona), args.repeticiones)
+    us_validar = cronometrar(lambda: validar(registro), args.repeticiones)
+    us_a = cronometrar(registro.a_firestore, args.repeticiones)
+    print(f"Copia de trabajo del formulario: deepcopy={us_deepcopy:.1f} µs  desde_firestore={us_desde:.1f} µs")
+    print(f"Rerun del formulario con registros (copia + validación + documento): "
+          f"{us_desde + us_validar + us_a:.1f} µs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_prompt.py
+"""Compara el tamaño del prompt de conocimiento inicial con cada serializador registrado.
+
+Sin opciones, los tokens se estiman localmente. Con --gemini se cuentan con la API de Vertex AI
+y se mide además la calidad: se hacen al modelo preguntas con respuesta conocida sobre las
+personas del fixture y se cuenta cuántas acierta con cada formato.
+
+Uso:  python benchmarks/bench_prompt.py --personas 50 [--gemini]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import persona_sintetica
+from prompt_utils import DEFINICION_SUJETOS, SERIALIZADORES, construir_prompt, estimar_tokens
+
+MODELO = "gemini-2.5-flash"
+
+def fixture(n_personas: int, n_memorias: int) -> tuple[dict, list[dict], list[dict]]:
+    """Perfil, personas y memorias deterministas."""
+    perfil = persona_sintetica(10_000)
+    perfil.pop("relaciones")
+    personas = [persona_sintetica(i) for i in range(n_personas)]
+    memorias = [{"memoria": f"{p['datos_personales']['nombre']} prefiere las reuniones por la mañana.",
+                 "fecha_registro": f"2025/01/{1 + i % 28:02d} 10:00", "id": f"m{i}"}
+                for i, p in enumerate(personas[:n_memorias])]
+    return perfil, personas, memorias
+
+def preguntas(personas: list[dict]) -> list[tuple[str, str]]:
+    """Preguntas con una única respuesta corta, repartidas por la lista de personas."""
+    resultado = []
+    for p in personas[:: max(1, len(personas) // 5)][:5]:
+        nombre = p["datos_personales"]["nombre"]
+        ct = p["componentes_temperamentales"]
+        idioma = p["capacidades"]["Idiomas"][1]
+        resultado += [
+            (f"¿Qué puntuación de Paranoide tiene {nombre}?", str(int(ct["Paranoide"]))),
+            (f"¿Qué nivel de conflicto tiene la relación con {nombre}?", p["relaciones"]["características"]["conflicto"]),
+            (f"¿Qué idioma habla {nombre} además del español?", idioma["Idioma"]),
+        ]
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--personas", type=int, default=50)
+    parser.add_argument("--memorias", type=int, default=20)
+    parser.add_argument("--gemini", action="store_true", help="contar tokens y medir calidad con Vertex AI")
+    args = parser.parse_args()
+
+    perfil, personas, memorias = fixture(args.personas, args.memorias)
+    estaticos = {DEFINICION_SUJETOS: "(esquema de datos de personas)"}
+    client = None
+    if args.gemini:
+        from google import genai
+        client = genai.Client(vertexai=True, project="tfm-pablodm", location="global")
+
+    base = None  # tokens del formato json, el original
+    for nombre, serializador in SERIALIZADORES.items():
+        inicio = time.perf_counter()
+        prompt = construir_prompt(estaticos, perfil, personas, memorias, serializador())
+        ms = (time.perf_counter() - inicio) * 1000
+        tokens = estimar_tokens(prompt)
+        linea = f"[{nombre:>8}] caracteres={len(prompt):,} tokens_estimados={tokens:,}"
+        base = base or tokens
+        linea += f" ({tokens / base:.0%} de json) construcción={ms:.1f} ms"
+
+        if client is not None:
+            linea += f" tokens_gemini={client.models.count_tokens(model=MODELO, contents=prompt).total_tokens:,}"
+            aciertos = 0
+            lista = preguntas(personas)
+            for pregunta, esperada in lista:
+                respuesta = client.models.generate_content(
+                    model=MODELO,
+                    contents=f"{prompt}\n\n{pregunta} Responde solo con el dato, sin explicaciones.",
+                ).text or ""
+                aciertos += esperada.lower() in respuesta.lower()
+            linea += f" calidad={aciertos}/{len(lista)}"
+        print(linea)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/bench_prompt_regresion.py
+"""Regresiones de tamaño y tiempo del prompt de conocimiento inicial, por sección.
+
+Genera usuarios sintéticos con 10, 100 y 1000 personas y memorias y construye su prompt con los
+mismos pasos que `get_initial_knowledge_prompt` en 1_Mi_Asistente.py (compactación de memorias con
+el resumidor local, memorias_para_prompt y secciones_prompt), sin Streamlit ni GCS: los recursos
+estáticos son textos fijos. De cada sección se mide caracteres, tokens estimados y milisegundos
+(el mínimo de varias repeticiones) y se comparan con la línea base guardada en
+benchmarks/baseline_prompt.json. Termina con código 1 si algo crece por encima del umbral.
+
+Uso:  python benchmarks/bench_prompt_regresion.py [--umbral 0.05] [--umbral-tiempo 0.5] [--sin-tiempo]
+      python benchmarks/bench_prompt_regresion.py --actualizar   # tras un cambio intencionado del prompt
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import persona_sintetica
+from fechas_utils import clave_fecha
+from memorias_utils import ResumidorLocal, compactar_memorias, memorias_para_prompt
+from personas_utils import COMPONENTES_TEMPERAMENTALES
+from prompt_utils import (RECURSOS_ESTATICOS, TABLAS_COMPONENTES, contexto_bajo_demanda, estimar_tokens,
+                          get_serializador, secciones_prompt)
+from reglas_utils import TablasComponentes
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_prompt.json")
+TAMANOS = (10, 100, 1000)
+# Por debajo de esta diferencia absoluta no se considera regresión de tiempo (ruido del reloj)
+MARGEN_MS = 2.0
+
+# Las primeras 4/5 partes de las memorias se reparten en grupos de 5 sobre las mismas personas, así que
+# se compactan (UMBRAL_COMPACTACION = 5); cada una de las demás es de una persona distinta y va suelta
+FRASES = ("prefiere las reuniones por la mañana", "se molesta si se le interrumpe en público",
+          "responde mejor a los datos que a las opiniones", "quiere liderar el proyecto de migración",
+          "está preocupado por la carga de trabajo del trimestre")
+
+def usuario_sintetico(n: int) -> tuple[dict, list[dict], dict[str, dict]]:
+    """Perfil, `n` personas (con su ID) y `n` memorias, como los guarda la réplica del usuario."""
+    perfil = persona_sintetica(10_000)
+    perfil.pop("relaciones")
+    personas = [persona_sintetica(i) | {"ID": f"s{i:05d}"} for i in range(n)]
+    agrupadas = n * 4 // 5
+    mencionadas = max(1, agrupadas // len(FRASES))
+    memorias = {}
+    for i in range(n):
+        persona = i % mencionadas if i < agrupadas else i
+        nombre = personas[persona]["datos_personales"]["nombre"]
+        memorias[f"m{i:05d}"] = {"id": f"m{i:05d}", "memoria": f"{nombre} {FRASES[i // mencionadas % len(FRASES)]}.",
+                                 "fecha_registro": f"2025/{1 + i % 12:02d}/{1 + i % 28:02d} 10:00"}
+    return perfil, personas, memorias
+
+def estaticos_sinteticos() -> tuple[dict[str, str], TablasComponentes]:
+    """Recursos de GCS de tamaño fijo y unas tablas de componentes con pautas para cada componente."""
+    tablas = {"Objetivos": {objetivo: {componente: f"Pauta para {objetivo.lower()} a una persona {componente}."
+                                       for componente in COMPONENTES_TEMPERAMENTALES}
+                            for objetivo in ("Motivar", "Negociar", "Dar feedback", "Delegar")},
+              "General": "Adapta el trato al componente dominante de cada persona."}
+    estaticos = {ruta: f"Contenido fijo de {ruta}. " * 40 for ruta, _ in RECURSOS_ESTATICOS}
+    estaticos[TABLAS_COMPONENTES] = json.dumps(tablas, ensure_ascii=False)
+    return estaticos, TablasComponentes(tablas)
+
+def medir(n: int, repeticiones: int) -> dict[str, dict]:
+    """Caracteres, tokens y ms de cada sección (y del total) del prompt de un usuario con `n` personas."""
+    perfil, personas, memorias = usuario_sintetico(n)
+    estaticos, tablas = estaticos_sinteticos()
+    sujetos = [{k: v for k, v in p.items() if k != "ID"} for p in personas]
+    serializador = get_serializador()
+    tiempos: dict[str, float] = {}
+    textos: dict[str, str] = {}
+
+    def anotar(seccion: str, inicio: float) -> float:
+        fin = time.perf_counter()
+        tiempos[seccion] = min(tiempos.get(seccion, float("inf")), (fin - inicio) * 1000)
+        return fin
+
+    # Como timeit: sin recolector de basura durante las mediciones, para que no añada ruido
+    gc.disable()
+    try:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            # El usuario aún no tiene resúmenes: se generan todos los que tocan, como en su primera sesión
+            nuevos, _ = compactar_memorias(memorias, personas, {}, ResumidorLocal())
+            resumenes = {r.persona_id: r.a_firestore() for r in nuevos}
+            ordenadas = sorted(memorias.values(), key=lambda m: clave_fecha(m.get("fecha_registro")))
+            resumenes_prompt, memorias_prompt = memorias_para_prompt(ordenadas, resumenes)
+            inicio = anotar("compactacion", inicio)
+            for seccion, texto in secciones_prompt(estaticos, perfil, sujetos, memorias_prompt, serializador,
+                                                   tablas, resumenes_prompt, contexto_bajo_demanda(len(sujetos))):
+                textos[seccion] = texto
+                inicio = anotar(seccion, inicio)
+    finally:
+        gc.enable()
+
+    resultado = {s: {"caracteres": len(textos.get(s, "")), "tokens": estimar_tokens(textos.get(s, "")),
+                     "ms": round(ms, 3)} for s, ms in tiempos.items()}
+    # El prompt completo une las secciones con "\n\n"
+    prompt = "\n\n".join(textos.values())
+    resultado["total"] = {"caracteres": len(prompt), "tokens": estimar_tokens(prompt),
+                          "ms": round(sum(tiempos.values()), 3)}
+    return resultado
+
+def ahorro_tablas(n: int) -> tuple[int, int]:
+    """Caracteres del extracto de las tablas con las pautas de todas las personas y con las del usuario solo.
+
+    Con el contexto bajo demanda las pautas de cada persona van en su ficha (consultar_persona); esto
+    muestra lo que se ahorra el prompt. Por debajo del umbral el prompt lleva las de todas.
+    """
+    perfil, personas, _ = usuario_sintetico(n)
+    _, tablas = estaticos_sinteticos()
+    todas = [("Usuario", perfil["componentes_temperamentales"])]
+    todas += [(p["datos_personales"]["nombre"], p["componentes_temperamentales"]) for p in personas]
+    listadas = 1 if contexto_bajo_demanda(n) else None
+    return (len(tablas.extracto(todas, listadas, con_pautas=len(todas))),
+            len(tablas.extracto(todas, listadas)))
+
+def regresiones(actual: dict, base: dict, umbral: float, umbral_tiempo: float | None) -> list[str]:
+    """Métricas que han crecido por encima de su umbral respecto a la línea base."""
+    problemas = []
+    for seccion, valores in actual.items():
+        previos = base.get(seccion)
+        if previos is None:
+            if valores["caracteres"]:
+                problemas.append(f"{seccion}: sección nueva ({valores['caracteres']:,} caracteres)")
+            continue
+        for metrica in ("caracteres", "tokens"):
+            if valores[metrica] > previos[metrica] * (1 + umbral):
+                problemas.append(f"{seccion}: {metrica} {previos[metrica]:,} -> {valores[metrica]:,}")
+        if (umbral_tiempo is not None and valores["ms"] > previos["ms"] * (1 + umbral_tiempo)
+                and valores["ms"] - previos["ms"] > MARGEN_MS):
+            problemas.append(f"{seccion}: ms {previos['ms']:.1f} -> {valores['ms']:.1f}")
+    return problemas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--umbral", type=float, default=0.05, help="Crecimiento admitido de caracteres y tokens")
+    parser.add_argument("--umbral-tiempo", type=float, default=0.5, help="Crecimiento admitido del tiempo")
+    parser.add_argument("--sin-tiempo", action="store_true", help="No comparar tiempos (p. ej. en otra máquina)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--actualizar", action="store_true", help="Guardar las mediciones como nueva línea base")
+    args = parser.parse_args()
+
+    serializador = get_serializador().nombre
+    mediciones = {str(n): medir(n, args.repeticiones) for n in TAMANOS}
+    for n, secciones in mediciones.items():
+        print(f"{n} personas y memorias (serializador {serializador}):")
+        for seccion, v in secciones.items():
+            print(f"  {seccion:<45} {v['caracteres']:>9,} car.  {v['tokens']:>8,} tokens  {v['ms']:>9.2f} ms")
+        if not contexto_bajo_demanda(int(n)):
+            continue
+        con_todas, solo_usuario = ahorro_tablas(int(n))
+        print(f"  (tablas: {con_todas:,} car. con las pautas de todas las personas, {solo_usuario:,} con las del "
+              f"usuario: {1 - solo_usuario / con_todas:.0%} menos)")
+
+    if args.actualizar:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump({"serializador": serializador, "tamanos": mediciones}, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"Línea base guardada en {BASELINE}")
+        return
+
+    if not os.path.exists(BASELINE):
+        sys.exit("No hay línea base; genérala con --actualizar")
+    with open(BASELINE, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["serializador"] != serializador:
+        sys.exit(f"La línea base es del serializador {baseline['serializador']!r}, no de {serializador!r}")
+
+    umbral_tiempo = None if args.sin_tiempo else args.umbral_tiempo
+    problemas = [f"[{n}] {p}" for n, secciones in mediciones.items()
+                 for p in regresiones(secciones, baseline["tamanos"].get(n, {}), args.umbral, umbral_tiempo)]
+    for problema in problemas:
+        print(f"  REGRESIÓN {problema}")
+    print(f"{len(problemas)} regresiones respecto a la línea base" if problemas else "Sin regresiones")
+    sys.exit(1 if problemas else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# benchmarks/fakes.py
+"""Dobles en memoria de los servicios externos, para medir la aplicación sin red."""
+import itertools
+import threading
+import time
+import uuid
+from copy import deepcopy
+
+# ─────────────────── FIRESTORE EN MEMORIA ────────────────────
+
+class FakeSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self):
+        return deepcopy(self._data)
+
+    def get(self, campo: str):
+        if campo == "__name__":
+            return self.reference._path
+        valor = self._data
+        for parte in campo.split("."):
+            valor = (valor or {}).get(parte)
+        return valor
+
+class FakeDocument:
+    def __init__(self, db, path: tuple):
+        self._db = db
+        self._path = path
+        self.id = path[-1]
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._db, self._path + (name,))
+
+    def collections(self) -> list["FakeCollection"]:
+        """Subcolecciones con al menos un documento (a cualquier profundidad)."""
+        n = len(self._path)
+        with self._db.lock:
+            nombres = {path[n] for path in self._db.docs if len(path) > n + 1 and path[:n] == self._path}
+        return [self.collection(nombre) for nombre in sorted(nombres)]
+
+    def get(self) -> FakeSnapshot:
+        return FakeSnapshot(self, deepcopy(self._db.docs.get(self._path)))
+
+    def set(self, data: dict, merge: bool = False):
+        with self._db.lock:
+            self._db.escrituras += 1
+            actual = self._db.docs.get(self._path) if merge else None
+            self._db.docs[self._path] = {**(actual or {}), **deepcopy(data)}
+
+    def update(self, data: dict):
+        with self._db.lock:
+            if self._path not in self._db.docs:
+                raise KeyError(f"No existe el documento {'/'.join(self._path)}")
+            self._db.escrituras += 1
+            doc = self._db.docs[self._path]
+            for ruta, valor in data.items():
+                partes = [p.strip("`") for p in ruta.split(".")]
+                destino = doc
+                for parte in partes[:-1]:
+                    destino = destino.setdefault(parte, {})
+                if getattr(valor, "values", None) is not None and type(valor).__name__ == "ArrayUnion":
+                    destino[partes[-1]] = destino.get(partes[-1], []) + list(valor.values)
+                else:
+                    destino[partes[-1]] = deepcopy(valor)
+
+    def delete(self):
+        self._db.esperar_rpc()
+        self._borrar()
+
+    def _borrar(self):
+        with self._db.lock:
+            self._db.escrituras += 1
+            self._db.docs.pop(self._path, None)
+
+class FakeQuery:
+    def __init__(self, db, path: tuple, orden=(), limite=None, despues=None, filtros=(), recursiva=False):
+        self._db = db
+        self._path = path
+        self._orden = orden
+        self._limite = limite
+        self._despues = despues
+        self._filtros = filtros
+        self._recursiva = recursiva
+
+    def _copia(self, **cambios) -> "FakeQuery":
+        args = dict(orden=self._orden, limite=self._limite, despues=self._despues, filtros=self._filtros,
+                    recursiva=self._recursiva)
+        args.update(cambios)
+        return FakeQuery(self._db, self._path, **args)
+
+    def order_by(self, campo: str, direction: str = "ASCENDING") -> "FakeQuery":
+        return self._copia(orden=self._orden + ((campo, str(direction).upper().endswith("DESCENDING")),))
+
+    def limit(self, n: int) -> "FakeQuery":
+        return self._copia(limite=n)
+
+    def recursive(self) -> "FakeQuery":
+        """Incluye también los documentos de las subcolecciones, a cualquier profundidad."""
+        return self._copia(recursiva=True)
+
+    def select(self, campos) -> "FakeQuery":
+        return self
+
+    def start_after(self, snapshot) -> "FakeQuery":
+        return self._copia(despues=snapshot)
+
+    def where(self, campo=None, op=None, valor=None, filter=None) -> "FakeQuery":
+        if filter is not None:
+            campo, op, valor = filter.field_path, filter.op_string, filter.value
+        return self._copia(filtros=self._filtros + ((campo, op, valor),))
+
+    def _incluye(self, path: tuple) -> bool:
+        n = len(self._path)
+        if self._recursiva:
+            return len(path) > n and (len(path) - n) % 2 == 1 and path[:n] == self._path
+        return len(path) == n + 1 and path[:-1] == self._path
+
+    def stream(self):
+        with self._db.lock:
+            snaps = [FakeSnapshot(FakeDocument(self._db, path), deepcopy(data))
+                     for path, data in self._db.docs.items() if self._incluye(path)]
+        self._db.lecturas += len(snaps)
+        # Como en Firestore, las desigualdades solo comparan valores del mismo tipo (texto con texto, fechas con fechas)
+        def comparables(a, b) -> bool:
+            return a is not None and (type(a) is type(b) or all(isinstance(v, (int, float)) for v in (a, b)))
+        operadores = {"==": lambda a, b: a == b, "<": lambda a, b: comparables(a, b) and a < b,
+                      "<=": lambda a, b: comparables(a, b) and a <= b, ">": lambda a, b: comparables(a, b) and a > b,
+                      ">=": lambda a, b: comparables(a, b) and a >= b, "array_contains": lambda a, b: b in (a or [])}
+        for campo, op, valor in self._filtros:
+            snaps = [s for s in snaps if operadores[op](s.get(campo), valor)]
+        for campo, descendente in reversed(self._orden):
+            snaps = [s for s in snaps if s.get(campo) is not None]
+            snaps.sort(key=lambda s: s.get(campo), reverse=descendente)
+        if not self._orden:
+            # Sin orden explícito Firestore devuelve los documentos ordenados por nombre
+            snaps.sort(key=lambda s: s.reference._path)
+        if self._despues is not None and self._orden[:1] in ((), (("__name__", False),)):
+            # El cursor sigue siendo válido aunque su documento se haya borrado entretanto
+            snaps = [s for s in snaps if s.reference._path > self._despues.reference._path]
+        elif self._despues is not None:
+            ids = [s.id for s in snaps]
+            snaps = snaps[ids.index(self._despues.id) + 1:] if self._despues.id in ids else []
+        if self._limite is not None:
+            snaps = snaps[:self._limite]
+        return iter(snaps)
+
+    def get(self):
+        return list(self.stream())
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db, path: tuple):
+        super().__init__(db, path)
+
+    def document(self, doc_id: str | None = None) -> FakeDocument:
+        return FakeDocument(self._db, self._path + (doc_id or uuid.uuid4().hex[:20],))
+
+    def add(self, data: dict):
+        ref = self.document()
+        ref.set(data)
+        return None, ref
+
+class FakeBatch:
+    def __init__(self, db):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref, data, merge=False):
+        self._ops.append(lambda: ref.set(data, merge=merge))
+
+    def update(self, ref, data):
+        self._ops.append(lambda: ref.update(data))
+
+    def delete(self, ref):
+        self._ops.append(ref._borrar)
+
+    def commit(self):
+        if len(self._ops) > 500:
+            raise ValueError("Un lote de Firestore admite como máximo 500 operaciones")
+        self._db.esperar_rpc()
+        with self._db.lock:
+            for op in self._ops:
+                op()
+            self._db.commits += 1
+        self._ops = []
+
+class FakeFirestore:
+    """Cliente de Firestore en memoria con el subconjunto de la API que usa la aplicación."""
+
+    def __init__(self, latencia: float = 0.0):
+        self.docs: dict[tuple, dict] = {}
+        self.lock = threading.RLock()
+        self.lecturas = 0
+        self.escrituras = 0
+        self.commits = 0
+        # Segundos que tarda cada escritura o commit, para simular la red
+        self.latencia = latencia
+
+    def esperar_rpc(self):
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, (name,))
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+# ─────────────────── GCS EN MEMORIA ────────────────────
+
+def registrar_gcs_en_memoria(ficheros: dict[str, str | bytes]) -> None:
+    """Sustituye el protocolo gs:// de fsspec (y de pandas) por un sistema de ficheros en memoria.
+
+    `ficheros` asocia rutas `bucket/ruta` con su contenido.
+    """
+    import fsspec
+    from fsspec.implementations.memory import MemoryFileSystem
+
+    class GCSEnMemoria(MemoryFileSystem):
+        protocol = ("gs", "gcs")
+        # Almacén propio, separado del de memory://
+        store = {}
+        pseudo_dirs = [""]
+
+        @classmethod
+        def _strip_protocol(cls, path):
+            for prefijo in ("gs://", "gcs://"):
+                if path.startswith(prefijo):
+                    path = path[len(prefijo):]
+            return super()._strip_protocol(path)
+
+    for protocolo in GCSEnMemoria.protocol:
+        fsspec.register_implementation(protocolo, GCSEnMemoria, clobber=True)
+    fs = GCSEnMemoria()
+    for ruta, contenido in ficheros.items():
+        fs.pipe(ruta, contenido.encode("utf-8") if isinstance(contenido, str) else contenido)
+
+# ─────────────────── GEMINI EN MEMORIA ────────────────────
+
+class GeminiGuionizado:
+    """Cliente de Gemini que responde en streaming con un guion fijo, con la latencia de la API simulada.
+
+    Si el último mensaje del usuario empieza por "Recuerda", pide primero la herramienta guardar_memoria
+    con ese mensaje; al recibir la respuesta de la herramienta (o en cualquier otro caso) contesta con
+    `trozos` fragmentos de texto. Tiene la misma forma que `genai.Client` (`client.models...`).
+    """
+
+    def __init__(self, primer_trozo: float = 0.4, entre_trozos: float = 0.05, trozos: int = 8):
+        self.models = self
+        # Segundos hasta el primer fragmento y entre fragmentos
+        self.primer_trozo = primer_trozo
+        self.entre_trozos = entre_trozos
+        self.trozos = trozos
+        self.lock = threading.Lock()
+        self.llamadas = 0
+        self.herramientas = 0
+
+    @staticmethod
+    def _respuesta(parte, tokens_prompt: int | None = None, tokens_salida: int = 0):
+        """Fragmento de respuesta; el último de cada llamada lleva los tokens (`usage_metadata`), como en la API."""
+        from google.genai import types
+        metadatos = None
+        if tokens_prompt is not None:
+            metadatos = types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=tokens_prompt, candidates_token_count=tokens_salida,
+                total_token_count=tokens_prompt + tokens_salida)
+        return types.GenerateContentResponse(
+            candidates=[types.Candidate(content=types.Content(role="model", parts=[parte]))], usage_metadata=metadatos)
+
+    @staticmethod
+    def _tokens(contents) -> int:
+        """Tokens aproximados del historial enviado (4 caracteres por token)."""
+        if isinstance(contents, str):
+            return len(contents) // 4
+        return sum(len(p.text or "") for c in contents for p in (c.parts or [])) // 4
+
+    def generate_content_stream(self, model: str, contents: list, config=None):
+        from google.genai import types
+        with self.lock:
+            self.llamadas += 1
+        ultimo = contents[-1] if contents else None
+        texto = (ultimo.parts[0].text or "") if ultimo is not None and ultimo.role == "user" else ""
+        time.sleep(self.primer_trozo)
+        if texto.startswith("Recuerda"):
+            with self.lock:
+                self.herramientas += 1
+            llamada = types.FunctionCall(name="guardar_memoria", args={"memoria": texto.removeprefix("Recuerda que ")})
+            yield self._respuesta(types.Part(function_call=llamada), self._tokens(contents), 10)
+            return
+        for i in range(self.trozos):
+            if i:
+                time.sleep(self.entre_trozos)
+            ultimo = i == self.trozos - 1
+            yield self._respuesta(types.Part.from_text(text=f"Fragmento {i} de la respuesta. "),
+                                  self._tokens(contents) if ultimo else None, 8 * self.trozos)
+
+    def generate_content(self, model: str, contents, config=None):
+        """Respuesta completa (la usa el resumidor de memorias con Gemini)."""
+        from google.genai import types
+        time.sleep(self.primer_trozo)
+        return self._respuesta(types.Part.from_text(text="Resumen generado."), self._tokens(contents), 20)
+
+# ─────────────────── DATOS SINTÉTICOS ────────────────────
+
+_NOMBRES = ["Ana", "Luis", "Marta", "Jorge", "Lucía", "Pablo", "Elena", "Carlos", "Sara", "Diego"]
+
+def persona_sintetica(i: int) -> dict:
+    """Persona completa y válida, determinista a partir de `i`."""
+    from personas_utils import COMPONENTES_TEMPERAMENTALES, NIVELES_RELACION
+    ciclo = itertools.cycle(NIVELES_RELACION[i % 5:] + NIVELES_RELACION[:i % 5])
+    return {
+        "datos_personales": {
+            "nombre": f"{_NOMBRES[i % len(_NOMBRES)]} {i}",
+            "sexo": ["Varón", "Mujer"][i % 2],
+            "edad": 20 + i % 50,
+            "estado_civil": "",
+            "puesto_trabajo": ["Ingeniera", "Comercial", "Profesor", ""][i % 4],
+            "otros_datos": "",
+        },
+        "componentes_temperamentales": {
+            comp: float((i * 7 + j * 3) % 18) for j, comp in enumerate(COMPONENTES_TEMPERAMENTALES)
+        },
+        "capacidades": {
+            "Habilidades técnicas": ["Python", "Contabilidad", "Diseño gráfico"][: i % 4],
+            "Soft skills": ["Comunicación", "Liderazgo", "Negociación"][: (i + 1) % 4],
+            "Idiomas": [{"Idioma": "Español", "Nivel": "Hablante nativo"},
+                        {"Idioma": ["Inglés", "Alemán", "Francés"][i % 3], "Nivel": "Intermedio"}],
+        },
+        "relaciones": {
+            "esferas": {"laboral": ["Colega"] if i % 3 == 0 else [],
+                        "familiar": ["Primo"] if i % 3 == 1 else [],
+                        "otras": []},
+            "características": {"formalidad": next(ciclo), "amistad": next(ciclo),
+                                "conflicto": next(ciclo), "otras": ""},
+        },
+    }
@@ -0,0 +1,99 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# borrado_utils.py
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable
+
+from google.cloud.firestore_v1.field_path import FieldPath
+
+# Límite de operaciones por lote de escritura de Firestore
+TAM_LOTE_BORRADO = 500
+# Lotes que se confirman a la vez; el resto espera turno para no saturar el backend
+COMMITS_CONCURRENTES = 8
+REINTENTOS = 3
+
+@dataclass
+class ResultadoBorrado:
+    borrados: int = 0
+    lotes: int = 0
+    segundos: float = 0.0
+
+    @property
+    def documentos_por_segundo(self) -> float:
+        return self.borrados / self.segundos if self.segundos else 0.0
+
+# ─────────────────── ENUMERACIÓN ────────────────────
+
+def _paginas_descendientes(coleccion, tam_pagina: int):
+    """Referencias de todos los documentos de una colección y de sus subcolecciones, a cualquier profundidad.
+
+    Usa una consulta recursiva (`recursive()`) que solo devuelve el nombre de cada documento, paginada con
+    cursores sobre el orden implícito por nombre, en lugar de listar las subcolecciones documento a documento.
+    """
+    consulta = coleccion.recursive().select([FieldPath.document_id()]).limit(tam_pagina)
+    ultimo = None
+    while True:
+        pagina = list((consulta.start_after(ultimo) if ultimo is not None else consulta).stream())
+        if pagina:
+            yield [snap.reference for snap in pagina]
+        if len(pagina) < tam_pagina:
+            return
+        ultimo = pagina[-1]
+
+# ─────────────────── BORRADO POR LOTES ────────────────────
+
+def _commit_con_reintentos(db_client, referencias: list) -> int:
+    for intento in range(REINTENTOS):
+        lote = db_client.batch()
+        for ref in referencias:
+            lote.delete(ref)
+        try:
+            lote.commit()
+            return len(referencias)
+        except Exception:
+            if intento == REINTENTOS - 1:
+                raise
+            time.sleep(0.2 * 2 ** intento)  # espera exponencial antes de reintentar
+    return 0
+
+def borrar_usuario_recursivo(db_client, user_id: str, tam_lote: int = TAM_LOTE_BORRADO,
+                             concurrencia: int = COMMITS_CONCURRENTES,
+                             progreso: Callable[[int], None] | None = None) -> ResultadoBorrado:
+    """Borra `usuarios/{user_id}` junto con todas sus subcolecciones (sujetos, memorias, conversaciones...).
+
+    Los documentos se enumeran por páginas y se borran en lotes de `tam_lote` que se confirman en
+    paralelo, con un máximo de `concurrencia` lotes en vuelo. `progreso(borrados)` se llama desde el
+    hilo que invoca la función (no desde el pool), así que puede actualizar la interfaz de Streamlit.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoBorrado()
+    user_ref = db_client.collection("usuarios").document(user_id)
+
+    def recoger(pendientes: set, hasta: int) -> set:
+        """Espera a que queden como mucho `hasta` lotes en vuelo y contabiliza los terminados."""
+        while len(pendientes) > hasta:
+            terminados, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                resultado.borrados += futuro.result()
+                resultado.lotes += 1
+            if progreso:
+                progreso(resultado.borrados)
+        return pendientes
+
+    with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+        pendientes = set()
+        for coleccion in user_ref.collections():
+            for referencias in _paginas_descendientes(coleccion, tam_lote):
+                pendientes.add(pool.submit(_commit_con_reintentos, db_client, referencias))
+                pendientes = recoger(pendientes, concurrencia)
+        recoger(pendientes, 0)
+
+    user_ref.delete()
+    resultado.borrados += 1
+    resultado.segundos = time.perf_counter() - inicio
+    if progreso:
+        progreso(resultado.borrados)
+    return resultado
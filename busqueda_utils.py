@@ -0,0 +1,269 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# busqueda_utils.py
+"""Búsqueda de texto completo en las conversaciones guardadas.
+
+El índice invertido de cada usuario se guarda en su colección `indice_conversaciones`, con un
+documento por término y conversación (`{conversación}:{término}`) que contiene la frecuencia y la
+longitud de cada turno en que aparece el término. La colección `indice_longitudes` tiene un
+documento por conversación con las longitudes de sus turnos y el documento DOC_TOTALES con el número
+de turnos y de términos indexados. Ningún documento crece con el número de conversaciones, así que
+no se acercan al límite de 1 MiB de Firestore. El índice se actualiza al guardar cada turno y al
+borrar una conversación, y una búsqueda solo lee DOC_TOTALES y los documentos de sus términos.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from typing import Iterable
+
+from google.cloud.firestore_v1.base_query import FieldFilter
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.cloud.firestore_v1.transforms import Increment
+
+from fechas_utils import a_fecha
+from firestore_utils import get_document, invalidate_cache
+from indice_utils import normalizar
+from memorias_utils import LONGITUD_RAIZ, PALABRAS_VACIAS
+
+COLECCION_INDICE = "indice_conversaciones"
+COLECCION_LONGITUDES = "indice_longitudes"
+DOC_TOTALES = "_totales"
+# Límites de Firestore: valores de un filtro "in" y operaciones por lote de escritura
+MAX_TERMINOS_CONSULTA = 30
+TAM_LOTE = 500
+# Parámetros de BM25
+K1 = 1.2
+B = 0.75
+RESULTADOS_BUSQUEDA = 10
+# Caracteres de contexto a cada lado de la primera coincidencia en el fragmento que se muestra
+CONTEXTO_FRAGMENTO = 90
+
+# Palabras frecuentes en las preguntas al asistente que no ayudan a encontrar una conversación
+PALABRAS_VACIAS_BUSQUEDA = PALABRAS_VACIAS | set("""
+como cuando cual cuales dijo dije hablamos hable mas mio mia yo te ti tus esos esas estas estos
+hace hacer puedo puede
+""".split())
+
+@dataclass
+class ResultadoBusqueda:
+    conversacion_id: str
+    turno: int
+    puntuacion: float
+    titulo: str = ""
+    fecha: object = None
+    # Texto del turno alrededor de la coincidencia, con los términos buscados en negrita (Markdown)
+    fragmento: str = ""
+
+# ─────────────────── TÉRMINOS ────────────────────
+
+def raiz(palabra: str) -> str:
+    """Raíz aproximada de una palabra normalizada: sin plural ni vocal final (jefe/jefa/jefes) y
+    cortada a LONGITUD_RAIZ caracteres."""
+    if len(palabra) > 3 and palabra.endswith("s"):
+        palabra = palabra[:-1]
+    if len(palabra) > 3 and palabra[-1] in "aeo":
+        palabra = palabra[:-1]
+    return palabra[:LONGITUD_RAIZ]
+
+def terminos(texto: str) -> list[str]:
+    """Raíces de las palabras con contenido del texto, con repeticiones (para contar frecuencias)."""
+    return [raiz(p) for p in re.findall(r"\w+", normalizar(texto))
+            if len(p) > 1 and p not in PALABRAS_VACIAS_BUSQUEDA]
+
+def _id_entrada(conversacion_id: str, termino: str) -> str:
+    """ID del documento del índice con las apariciones de un término en una conversación."""
+    return f"{conversacion_id}:{termino}"
+
+def _clave(conversacion_id: str, turno) -> str:
+    return f"{conversacion_id}:{turno}"
+
+# ─────────────────── ACTUALIZACIÓN DEL ÍNDICE ────────────────────
+
+def entradas_indice(conversacion_id: str, turnos: list[tuple[int, str]]) -> tuple[dict[str, dict], dict[str, int]]:
+    """Documentos del índice (por término) y longitudes de unos turnos (índice, texto) de una conversación."""
+    entradas: dict[str, dict] = {}
+    longitudes: dict[str, int] = {}
+    for indice, texto in turnos:
+        frecuencias = Counter(terminos(texto or ""))
+        if not frecuencias:
+            continue
+        turno = str(indice)
+        longitudes[turno] = sum(frecuencias.values())
+        for termino, n in frecuencias.items():
+            entrada = entradas.setdefault(termino, {"termino": termino, "conversacion": conversacion_id,
+                                                    "turnos": {}, "longitudes": {}})
+            entrada["turnos"][turno] = n
+            entrada["longitudes"][turno] = longitudes[turno]
+    return entradas, longitudes
+
+def _confirmar_en_lotes(db_client, operaciones: Iterable[tuple]) -> None:
+    """Aplica operaciones (referencia, datos, merge) en lotes de TAM_LOTE; con datos None se borra el documento."""
+    lote, pendientes = db_client.batch(), 0
+    for ref, datos, merge in operaciones:
+        if datos is None:
+            lote.delete(ref)
+        else:
+            lote.set(ref, datos, merge=merge)
+        pendientes += 1
+        if pendientes == TAM_LOTE:
+            lote.commit()
+            lote, pendientes = db_client.batch(), 0
+    if pendientes:
+        lote.commit()
+
+def _totales(turnos: dict[str, int], signo: int = 1) -> dict:
+    return {"turnos": Increment(signo * len(turnos)), "terminos": Increment(signo * sum(turnos.values()))}
+
+def indexar_turnos(db_client, user_id: str, conversacion_id: str, turnos: list[tuple[int, str]]) -> None:
+    """Añade al índice de búsqueda los turnos (índice en `turns`, texto) de una conversación."""
+    entradas, longitudes = entradas_indice(conversacion_id, turnos)
+    if not longitudes:
+        return
+    user_ref = db_client.collection("usuarios").document(user_id)
+    indice, coleccion_longitudes = user_ref.collection(COLECCION_INDICE), user_ref.collection(COLECCION_LONGITUDES)
+    operaciones = [(indice.document(_id_entrada(conversacion_id, t)), datos, True) for t, datos in entradas.items()]
+    operaciones.append((coleccion_longitudes.document(conversacion_id), {"turnos": longitudes}, True))
+    operaciones.append((coleccion_longitudes.document(DOC_TOTALES), _totales(longitudes), True))
+    _confirmar_en_lotes(db_client, operaciones)
+    invalidate_cache(user_id, COLECCION_LONGITUDES)
+
+def desindexar_conversacion(db_client, user_id: str, conversacion_id: str) -> None:
+    """Quita del índice todas las entradas de una conversación y descuenta sus turnos de los totales."""
+    user_ref = db_client.collection("usuarios").document(user_id)
+    coleccion_longitudes = user_ref.collection(COLECCION_LONGITUDES)
+    ref_longitudes = coleccion_longitudes.document(conversacion_id)
+    longitudes = (ref_longitudes.get().to_dict() or {}).get("turnos", {})
+    entradas = (user_ref.collection(COLECCION_INDICE)
+                .where(filter=FieldFilter("conversacion", "==", conversacion_id))
+                .select([FieldPath.document_id()]).stream())
+    operaciones = [(snap.reference, None, False) for snap in entradas]
+    operaciones.append((ref_longitudes, None, False))
+    if longitudes:
+        operaciones.append((coleccion_longitudes.document(DOC_TOTALES), _totales(longitudes, -1), True))
+    _confirmar_en_lotes(db_client, operaciones)
+    invalidate_cache(user_id, COLECCION_LONGITUDES)
+
+def construir_indice(db_client, user_id: str) -> int:
+    """Reconstruye desde cero el índice de todas las conversaciones guardadas; devuelve cuántas ha indexado.
+
+    Borra antes todo el índice anterior, incluidos los documentos de versiones anteriores del índice.
+    """
+    user_ref = db_client.collection("usuarios").document(user_id)
+    indice, coleccion_longitudes = user_ref.collection(COLECCION_INDICE), user_ref.collection(COLECCION_LONGITUDES)
+    operaciones = [(snap.reference, None, False) for coleccion in (indice, coleccion_longitudes)
+                   for snap in coleccion.select([FieldPath.document_id()]).stream()]
+    turnos_totales = terminos_totales = conversaciones = 0
+    for snap in user_ref.collection("conversaciones").select(["turns"]).stream():
+        turnos = [(i, t.get("content", "")) for i, t in enumerate(snap.to_dict().get("turns", []))]
+        entradas, longitudes = entradas_indice(snap.id, turnos)
+        operaciones += [(indice.document(_id_entrada(snap.id, t)), datos, False) for t, datos in entradas.items()]
+        if longitudes:
+            operaciones.append((coleccion_longitudes.document(snap.id), {"turnos": longitudes}, False))
+        turnos_totales += len(longitudes)
+        terminos_totales += sum(longitudes.values())
+        conversaciones += 1
+    operaciones.append((coleccion_longitudes.document(DOC_TOTALES),
+                        {"turnos": turnos_totales, "terminos": terminos_totales, "completo": True}, False))
+    _confirmar_en_lotes(db_client, operaciones)
+    invalidate_cache(user_id, COLECCION_LONGITUDES)
+    return conversaciones
+
+# ─────────────────── BÚSQUEDA ────────────────────
+
+def puntuar(consulta: list[str], entradas: dict[str, dict[str, int]], longitudes: dict[str, dict[str, int]],
+            total: int, terminos_totales: int, limite: int = RESULTADOS_BUSQUEDA) -> list[ResultadoBusqueda]:
+    """Puntuación BM25 de cada turno; se devuelve el mejor turno de las `limite` mejores conversaciones.
+
+    `entradas` asocia cada término con sus turnos (`conversación:turno` -> frecuencia), `longitudes`
+    da los términos de esos turnos (los que no están se ignoran), y `total` y `terminos_totales` son
+    el número de turnos y de términos de todo el índice.
+    """
+    if total <= 0 or terminos_totales <= 0:
+        return []
+    media = terminos_totales / total
+    puntuaciones: dict[str, float] = defaultdict(float)
+    for termino in set(consulta):
+        vigentes = {}
+        for clave, frecuencia in entradas.get(termino, {}).items():
+            conversacion_id, _, turno = clave.rpartition(":")
+            longitud = longitudes.get(conversacion_id, {}).get(turno)
+            if longitud is not None:
+                vigentes[clave] = (frecuencia, longitud)
+        if not vigentes:
+            continue
+        idf = math.log(1 + (total - len(vigentes) + 0.5) / (len(vigentes) + 0.5))
+        for clave, (frecuencia, longitud) in vigentes.items():
+            puntuaciones[clave] += idf * frecuencia * (K1 + 1) / (frecuencia + K1 * (1 - B + B * longitud / media))
+
+    mejores: dict[str, ResultadoBusqueda] = {}
+    for clave, puntuacion in puntuaciones.items():
+        conversacion_id, _, turno = clave.rpartition(":")
+        actual = mejores.get(conversacion_id)
+        if actual is None or puntuacion > actual.puntuacion:
+            mejores[conversacion_id] = ResultadoBusqueda(conversacion_id, int(turno), puntuacion)
+    return sorted(mejores.values(), key=lambda r: -r.puntuacion)[:limite]
+
+def resaltar(texto: str, consulta: list[str], contexto: int = CONTEXTO_FRAGMENTO) -> str:
+    """Trozo del texto alrededor de la primera coincidencia, con las palabras buscadas en negrita."""
+    buscados = set(consulta)
+    coincidencias = [m for m in re.finditer(r"\w+", texto) if raiz(normalizar(m.group())) in buscados]
+    if coincidencias:
+        inicio = max(0, coincidencias[0].start() - contexto)
+        fin = min(len(texto), coincidencias[0].end() + contexto)
+    else:
+        inicio, fin = 0, min(len(texto), 2 * contexto)
+    # Se ajusta a límites de palabra para no cortar ninguna
+    while inicio > 0 and texto[inicio - 1].isalnum():
+        inicio -= 1
+    while fin < len(texto) and texto[fin].isalnum():
+        fin += 1
+
+    partes, posicion = [], inicio
+    for m in coincidencias:
+        if m.start() >= inicio and m.end() <= fin:
+            partes += [texto[posicion:m.start()], f"**{m.group()}**"]
+            posicion = m.end()
+    partes.append(texto[posicion:fin])
+    fragmento = " ".join("".join(partes).split())
+    return f"{'…' if inicio > 0 else ''}{fragmento}{'…' if fin < len(texto) else ''}"
+
+def buscar_conversaciones(db_client, user_id: str, consulta: str,
+                          limite: int = RESULTADOS_BUSQUEDA) -> list[ResultadoBusqueda]:
+    """Conversaciones que mejor responden a la consulta, con el turno y el fragmento que coinciden.
+
+    La primera búsqueda de un usuario construye el índice con las conversaciones que ya tenía.
+    """
+    buscados = terminos(consulta)
+    if not buscados:
+        return []
+    totales = get_document(db_client, user_id, COLECCION_LONGITUDES, DOC_TOTALES).to_dict() or {}
+    if not totales.get("completo"):
+        construir_indice(db_client, user_id)
+        totales = get_document(db_client, user_id, COLECCION_LONGITUDES, DOC_TOTALES).to_dict() or {}
+
+    # Solo se descargan los documentos de los términos buscados, en consultas de hasta 30 términos
+    indice = db_client.collection("usuarios").document(user_id).collection(COLECCION_INDICE)
+    unicos = sorted(set(buscados))
+    entradas: dict[str, dict[str, int]] = defaultdict(dict)
+    longitudes: dict[str, dict[str, int]] = defaultdict(dict)
+    for i in range(0, len(unicos), MAX_TERMINOS_CONSULTA):
+        consulta_indice = indice.where(filter=FieldFilter("termino", "in", unicos[i:i + MAX_TERMINOS_CONSULTA]))
+        for snap in consulta_indice.stream():
+            datos = snap.to_dict()
+            conversacion_id = datos["conversacion"]
+            for turno, frecuencia in datos.get("turnos", {}).items():
+                entradas[datos["termino"]][_clave(conversacion_id, turno)] = frecuencia
+            longitudes[conversacion_id].update(datos.get("longitudes", {}))
+
+    resultados = puntuar(buscados, entradas, longitudes, totales.get("turnos", 0), totales.get("terminos", 0), limite)
+    for resultado in resultados:
+        snap = get_document(db_client, user_id, "conversaciones", resultado.conversacion_id)
+        datos = snap.to_dict() or {}
+        turnos = datos.get("turns", [])
+        resultado.titulo = datos.get("title", f"Conversación {resultado.conversacion_id[:6]}")
+        resultado.fecha = a_fecha(datos.get("start_time"))
+        if resultado.turno < len(turnos):
+            resultado.fragmento = resaltar(turnos[resultado.turno].get("content", ""), buscados)
+    return resultados
@@ -0,0 +1,104 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# cache_utils.py
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Callable, Hashable
+
+# Tiempo máximo que se sirve una lectura sin volver a Firestore (cubre las escrituras de otras instancias)
+TTL_LECTURAS = 300
+# Lecturas distintas que se guardan por usuario; al superarlo se descartan las que caducan antes
+MAX_ENTRADAS_USUARIO = 256
+
+@dataclass(slots=True)
+class _Entrada:
+    valor: object
+    version: tuple[int, int]
+    caduca: float
+
+class CacheLecturas:
+    """Caché de lecturas de Firestore por usuario, con caducidad e invalidación por versión.
+
+    Cada colección de cada usuario tiene una versión que se incrementa con cada escritura hecha a través
+    de firestore_utils (o al llamar a `invalidar`); una lectura guardada con una versión anterior ya no se
+    sirve. Si varias sesiones piden a la vez una lectura que no está en caché, solo la primera consulta
+    Firestore y el resto espera su resultado.
+    """
+
+    def __init__(self, ttl: float = TTL_LECTURAS, max_entradas: int = MAX_ENTRADAS_USUARIO):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._entradas: dict[str, dict[tuple, _Entrada]] = defaultdict(dict)
+        # Versión de cada (usuario, colección) y generación de cada usuario (invalidación completa)
+        self._versiones: dict[tuple[str, str], int] = defaultdict(int)
+        self._generaciones: dict[str, int] = defaultdict(int)
+        self._en_vuelo: dict[tuple, Future] = {}
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.agrupadas = 0
+
+    def _version(self, user_id: str, coleccion: str) -> tuple[int, int]:
+        return self._generaciones[user_id], self._versiones[(user_id, coleccion)]
+
+    def obtener(self, user_id: str, coleccion: str, clave: Hashable, cargar: Callable[[], object]):
+        """Valor en caché de la lectura `clave` sobre `coleccion`, o el resultado de `cargar()` si no lo hay."""
+        with self._lock:
+            version = self._version(user_id, coleccion)
+            entrada = self._entradas[user_id].get((coleccion, clave))
+            if entrada is not None and entrada.version == version and entrada.caduca > time.monotonic():
+                self.aciertos += 1
+                return entrada.valor
+            llave = (user_id, coleccion, clave, version)
+            futuro = self._en_vuelo.get(llave)
+            propia = futuro is None
+            if propia:
+                futuro = self._en_vuelo[llave] = Future()
+                self.fallos += 1
+            else:
+                self.agrupadas += 1
+        if not propia:
+            return futuro.result()
+
+        try:
+            valor = cargar()
+        except BaseException as e:
+            with self._lock:
+                self._en_vuelo.pop(llave, None)
+            futuro.set_exception(e)
+            raise
+        with self._lock:
+            self._en_vuelo.pop(llave, None)
+            # Si ha habido una escritura mientras se leía, el valor puede estar desfasado y no se guarda
+            if self._version(user_id, coleccion) == version:
+                self._guardar(user_id, (coleccion, clave), _Entrada(valor, version, time.monotonic() + self.ttl))
+        futuro.set_result(valor)
+        return valor
+
+    def _guardar(self, user_id: str, llave: tuple, entrada: _Entrada) -> None:
+        entradas = self._entradas[user_id]
+        entradas[llave] = entrada
+        if len(entradas) > self.max_entradas:
+            for sobrante in sorted(entradas, key=lambda k: entradas[k].caduca)[:len(entradas) - self.max_entradas]:
+                del entradas[sobrante]
+
+    def invalidar(self, user_id: str, coleccion: str | None = None) -> None:
+        """Descarta las lecturas de una colección del usuario, o todas las suyas si `coleccion` es None."""
+        with self._lock:
+            if coleccion is None:
+                self._generaciones[user_id] += 1
+                self._entradas.pop(user_id, None)
+            else:
+                self._versiones[(user_id, coleccion)] += 1
+                entradas = self._entradas.get(user_id, {})
+                for llave in [k for k in entradas if k[0] == coleccion]:
+                    del entradas[llave]
+
+    @property
+    def tasa_aciertos(self) -> float:
+        total = self.aciertos + self.fallos + self.agrupadas
+        return (self.aciertos + self.agrupadas) / total if total else 0.0
@@ -0,0 +1,116 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# conexiones_utils.py
+import logging
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from importlib import metadata
+
+log = logging.getLogger(__name__)
+
+# configurar_canal_firestore usa atributos internos del cliente: solo se aplica con la versión de
+# google-cloud-firestore fijada en requirements.txt; con cualquier otra se usa el canal por defecto
+VERSION_FIRESTORE_PROBADA = "2.34.1"
+_ATRIBUTOS_CLIENTE = ("_firestore_api_internal", "_emulator_host", "_target", "_credentials",
+                      "_client_options", "_client_info")
+
+# Opciones del canal gRPC de Firestore (la librería solo fija keepalive_time_ms=30000)
+OPCIONES_GRPC_FIRESTORE = {
+    "grpc.keepalive_time_ms": 30_000,
+    "grpc.keepalive_timeout_ms": 10_000,
+    # Pings también sin llamadas en curso: los listeners on_snapshot pasan mucho tiempo sin tráfico
+    # y sin ellos un proxy o balanceador puede cerrar el canal en silencio
+    "grpc.keepalive_permit_without_calls": 1,
+    "grpc.http2.max_pings_without_data": 0,
+    # Cada documento ocupa como mucho 1 MiB, pero una respuesta puede llevar varios (p. ej. en
+    # BatchGetDocuments o en los cambios agrupados de un listener): más margen que los 4 MiB de gRPC
+    "grpc.max_receive_message_length": 32 * 1024 * 1024,
+}
+
+# ─────────────────── ESTADÍSTICAS DE REUTILIZACIÓN ────────────────────
+
+@dataclass
+class EstadisticasConexiones:
+    """Clientes creados y veces que se han usado, por servicio ("firestore", "gcs"), en el proceso."""
+    creados: Counter = field(default_factory=Counter)
+    usos: Counter = field(default_factory=Counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def registrar_creacion(self, servicio: str) -> None:
+        with self._lock:
+            self.creados[servicio] += 1
+
+    def registrar_uso(self, servicio: str) -> None:
+        with self._lock:
+            self.usos[servicio] += 1
+
+    def reutilizaciones(self, servicio: str) -> int:
+        """Usos servidos por un cliente que ya existía."""
+        return max(0, self.usos[servicio] - self.creados[servicio])
+
+    def resumen(self) -> str:
+        return "  ".join(f"{servicio}: {self.creados[servicio]} clientes, {self.usos[servicio]:,} usos "
+                         f"({self.reutilizaciones(servicio):,} reutilizados)"
+                         for servicio in sorted(self.usos.keys() | self.creados.keys()))
+
+ESTADISTICAS_CONEXIONES = EstadisticasConexiones()
+
+# ─────────────────── CLIENTES COMPARTIDOS ────────────────────
+
+_lock = threading.Lock()
+_sistema_gcs = None
+
+def get_gcs_filesystem():
+    """Sistema de ficheros gs:// único para todo el proceso (una sesión HTTP y unas credenciales).
+
+    Se obtiene con `fsspec.filesystem("gs")`, así que respeta las implementaciones registradas en
+    fsspec (p. ej. el GCS en memoria de benchmarks/fakes.py).
+    """
+    global _sistema_gcs
+    with _lock:
+        if _sistema_gcs is None:
+            import fsspec
+            _sistema_gcs = fsspec.filesystem("gs")
+            ESTADISTICAS_CONEXIONES.registrar_creacion("gcs")
+    ESTADISTICAS_CONEXIONES.registrar_uso("gcs")
+    return _sistema_gcs
+
+def canal_configurable(cliente) -> bool:
+    """True si el cliente es de VERSION_FIRESTORE_PROBADA y tiene los atributos que usa configurar_canal_firestore."""
+    try:
+        version = metadata.version("google-cloud-firestore")
+    except metadata.PackageNotFoundError:
+        return False
+    return version == VERSION_FIRESTORE_PROBADA and all(hasattr(cliente, a) for a in _ATRIBUTOS_CLIENTE)
+
+def configurar_canal_firestore(cliente):
+    """Abre el canal gRPC del cliente de Firestore con OPCIONES_GRPC_FIRESTORE antes de su primera llamada.
+
+    La librería crea el canal de forma perezosa en `_firestore_api` y no permite pasarle opciones,
+    así que se crea aquí igual que lo hace ella en VERSION_FIRESTORE_PROBADA. Con otra versión, o si
+    algo falla, se deja que la librería cree su canal por defecto. Si el cliente ya tiene canal (o
+    usa el emulador) se deja como está.
+    """
+    if not canal_configurable(cliente):
+        log.warning("google-cloud-firestore no es la versión %s: se usa el canal gRPC por defecto",
+                    VERSION_FIRESTORE_PROBADA)
+        return cliente
+    if cliente._firestore_api_internal is not None or cliente._emulator_host:
+        return cliente
+    try:
+        from google.cloud.firestore_v1.services.firestore import client as firestore_client
+        from google.cloud.firestore_v1.services.firestore.transports.grpc import FirestoreGrpcTransport
+
+        canal = FirestoreGrpcTransport.create_channel(cliente._target, credentials=cliente._credentials,
+                                                      options=list(OPCIONES_GRPC_FIRESTORE.items()))
+        transporte = FirestoreGrpcTransport(host=cliente._target, channel=canal)
+        api = firestore_client.FirestoreClient(transport=transporte, client_options=cliente._client_options)
+    except Exception as e:
+        log.warning("No se pudo configurar el canal gRPC de Firestore (%s): se usa el canal por defecto", e)
+        return cliente
+    cliente._transport = transporte
+    cliente._firestore_api_internal = api
+    firestore_client._client_info = cliente._client_info
+    return cliente
@@ -0,0 +1,122 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# consumo_utils.py
+"""Contabilidad de tokens y latencia de las llamadas a Gemini, por usuario, día, conversación y modelo.
+
+Cada respuesta se suma a contadores en la colección `consumo` del usuario, por día y modelo y por
+conversación, día y modelo; todos llevan el campo `dia`, así que los de un periodo se leen con una
+sola consulta. Para no superar el límite de escrituras por documento de Firestore cuando varias
+sesiones escriben a la vez, cada contador se reparte en FRAGMENTOS_CONTADOR documentos
+(`<clave>_<n>`, con n al azar) que se suman al leerlos.
+"""
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Hashable, Iterable
+
+from google.cloud.firestore_v1.transforms import Increment
+
+from fechas_utils import ahora
+
+COLECCION_CONSUMO = "consumo"
+FRAGMENTOS_CONTADOR = 4
+DIAS_CONSUMO = 30
+
+CONTADORES = ("respuestas", "llamadas", "rondas_herramientas", "tokens_prompt", "tokens_cache", "tokens_salida",
+              "tokens_pensamiento", "tokens_conocimiento", "respuestas_con_primer_token", "ms_primer_token", "ms_total")
+
+@dataclass
+class UsoLlamada:
+    """Consumo de una respuesta del modelo; si usa herramientas, abarca todas sus llamadas a la API."""
+    modelo: str
+    llamadas: int = 0
+    rondas_herramientas: int = 0
+    tokens_prompt: int = 0
+    tokens_cache: int = 0
+    tokens_salida: int = 0
+    tokens_pensamiento: int = 0
+    # Estimación local del prompt de conocimiento inicial, que se reenvía en cada llamada
+    tokens_conocimiento: int = 0
+    ms_primer_token: int | None = None
+    ms_total: int = 0
+    _inicio: float = field(default_factory=time.perf_counter, repr=False)
+
+    def anadir_metadatos(self, metadatos) -> None:
+        """Suma el `usage_metadata` de una llamada (en streaming, el del último fragmento)."""
+        self.llamadas += 1
+        if metadatos is None:
+            return
+        self.tokens_prompt += metadatos.prompt_token_count or 0
+        self.tokens_cache += metadatos.cached_content_token_count or 0
+        self.tokens_salida += metadatos.candidates_token_count or 0
+        self.tokens_pensamiento += metadatos.thoughts_token_count or 0
+
+    def marcar_primer_token(self) -> None:
+        if self.ms_primer_token is None:
+            self.ms_primer_token = round((time.perf_counter() - self._inicio) * 1000)
+
+    def terminar(self) -> None:
+        self.ms_total = round((time.perf_counter() - self._inicio) * 1000)
+
+    def contadores(self) -> dict[str, int]:
+        return {
+            "respuestas": 1,
+            "llamadas": self.llamadas,
+            "rondas_herramientas": self.rondas_herramientas,
+            "tokens_prompt": self.tokens_prompt,
+            "tokens_cache": self.tokens_cache,
+            "tokens_salida": self.tokens_salida,
+            "tokens_pensamiento": self.tokens_pensamiento,
+            "tokens_conocimiento": self.tokens_conocimiento,
+            "respuestas_con_primer_token": int(self.ms_primer_token is not None),
+            "ms_primer_token": self.ms_primer_token or 0,
+            "ms_total": self.ms_total,
+        }
+
+# ─────────────────── ESCRITURA DE LOS CONTADORES ────────────────────
+
+def registrar_consumo(db_client, user_id: str, uso: UsoLlamada, conversacion_id: str | None = None) -> None:
+    """Suma una respuesta a los contadores del día y modelo y, si está guardada, de la conversación en ese día.
+
+    Las dos escrituras van en un solo lote. Escribe por su cuenta: quien llame debe invalidar la
+    caché de lecturas de la colección.
+    """
+    momento = ahora()
+    dia = momento.replace(hour=0, minute=0, second=0, microsecond=0)
+    fragmento = random.randrange(FRAGMENTOS_CONTADOR)
+    incrementos = {campo: Increment(valor) for campo, valor in uso.contadores().items() if valor}
+    coleccion = db_client.collection("usuarios").document(user_id).collection(COLECCION_CONSUMO)
+
+    lote = db_client.batch()
+    lote.set(coleccion.document(f"dia_{dia:%Y-%m-%d}_{uso.modelo}_{fragmento}"),
+             {"tipo": "dia", "dia": dia, "modelo": uso.modelo, **incrementos}, merge=True)
+    if conversacion_id:
+        lote.set(coleccion.document(f"conv_{conversacion_id}_{dia:%Y-%m-%d}_{uso.modelo}_{fragmento}"),
+                 {"tipo": "conversacion", "conversacion_id": conversacion_id, "dia": dia, "modelo": uso.modelo,
+                  "ultimo_uso": momento, **incrementos}, merge=True)
+    lote.commit()
+
+# ─────────────────── LECTURA ────────────────────
+
+def agregar(documentos: Iterable[dict], clave: Callable[[dict], Hashable]) -> dict[Hashable, dict[str, int]]:
+    """Suma los contadores de los documentos (fragmentos incluidos) agrupados por `clave(documento)`."""
+    totales: dict[Hashable, dict[str, int]] = defaultdict(lambda: dict.fromkeys(CONTADORES, 0))
+    for datos in documentos:
+        grupo = totales[clave(datos)]
+        for campo in CONTADORES:
+            grupo[campo] += datos.get(campo) or 0
+    return dict(totales)
+
+def medias(totales: dict[str, int]) -> dict[str, float]:
+    """Valores por respuesta de unos contadores agregados."""
+    respuestas = totales["respuestas"] or 1
+    return {
+        "tokens_entrada": totales["tokens_prompt"] / respuestas,
+        "tokens_salida": totales["tokens_salida"] / respuestas,
+        "ms_primer_token": totales["ms_primer_token"] / (totales["respuestas_con_primer_token"] or 1),
+        "ms_total": totales["ms_total"] / respuestas,
+        "fraccion_cache": totales["tokens_cache"] / (totales["tokens_prompt"] or 1),
+        "fraccion_conocimiento": totales["tokens_conocimiento"] / (totales["tokens_prompt"] or 1),
+    }
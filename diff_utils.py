@@ -0,0 +1,63 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# diff_utils.py
+import json
+import threading
+from dataclasses import dataclass, field
+
+# Marca de campo eliminado; firestore_utils la traduce a DELETE_FIELD
+BORRAR = object()
+
+# ─────────────────── DIFERENCIAS POR CAMPO ────────────────────
+
+def diff_campos(anterior: dict, nuevo: dict, prefijo: tuple = ()) -> dict[tuple, object]:
+    """Compara dos documentos y devuelve {ruta: valor} solo para los campos que han cambiado.
+
+    La ruta es una tupla con los nombres de los campos anidados. Los diccionarios se recorren
+    recursivamente; las listas y los valores simples se comparan enteros, ya que Firestore
+    no permite actualizar elementos sueltos de un array. Los campos eliminados llevan `BORRAR`.
+    """
+    cambios = {}
+    for clave, valor in nuevo.items():
+        ruta = prefijo + (clave,)
+        if clave not in anterior:
+            cambios[ruta] = valor
+        elif isinstance(valor, dict) and isinstance(anterior[clave], dict) and valor:
+            cambios.update(diff_campos(anterior[clave], valor, ruta))
+        elif valor != anterior[clave]:
+            cambios[ruta] = valor
+    for clave in anterior.keys() - nuevo.keys():
+        cambios[prefijo + (clave,)] = BORRAR
+    return cambios
+
+def tamano_estimado(datos) -> int:
+    """Tamaño aproximado en bytes de un valor serializado (para las estadísticas)."""
+    if datos is BORRAR:
+        return 0
+    return len(json.dumps(datos, ensure_ascii=False, default=str).encode("utf-8"))
+
+# ─────────────────── CONTADORES DE ESCRITURA ────────────────────
+
+@dataclass
+class EstadisticasEscritura:
+    """Contadores de escrituras diferenciales del proceso."""
+    escrituras: int = 0
+    escrituras_omitidas: int = 0
+    bytes_enviados: int = 0
+    bytes_ahorrados: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def registrar(self, documento_completo: dict, cambios: dict[tuple, object]) -> None:
+        """Anota una escritura (u omisión si no hay cambios) frente a enviar el documento entero."""
+        completo = tamano_estimado(documento_completo)
+        enviado = sum(tamano_estimado(v) + len(".".join(map(str, k))) for k, v in cambios.items())
+        with self._lock:
+            if cambios:
+                self.escrituras += 1
+            else:
+                self.escrituras_omitidas += 1
+            self.bytes_enviados += enviado
+            self.bytes_ahorrados += max(0, completo - enviado)
+
+ESTADISTICAS_ESCRITURA = EstadisticasEscritura()
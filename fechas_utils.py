@@ -0,0 +1,44 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# fechas_utils.py
+from datetime import datetime, timezone
+
+# Formatos de las fechas guardadas como texto antes de usar timestamps nativos de Firestore
+FORMATO_MEMORIA = "%Y/%m/%d %H:%M"
+FORMATO_CONVERSACION = "%Y-%m-%d %H:%M:%S"
+FORMATOS_ANTIGUOS = (FORMATO_MEMORIA, FORMATO_CONVERSACION, "%Y/%m/%d %H:%M:%S", "%Y-%m-%d %H:%M")
+
+# Clave de orden de los documentos sin fecha (quedan los primeros)
+FECHA_MINIMA = datetime.min.replace(tzinfo=timezone.utc)
+
+def ahora() -> datetime:
+    """Instante actual con zona horaria; Firestore lo guarda como timestamp nativo."""
+    return datetime.now(timezone.utc)
+
+def a_fecha(valor) -> datetime | None:
+    """Fecha guardada (timestamp nativo o texto en uno de los formatos antiguos) como datetime con zona horaria.
+
+    El texto antiguo se escribió con la hora local del servidor, así que se interpreta en esa zona.
+    Devuelve None si no hay fecha o no se reconoce el formato.
+    """
+    if isinstance(valor, datetime):
+        return valor if valor.tzinfo else valor.astimezone()
+    if isinstance(valor, str) and valor.strip():
+        for formato in FORMATOS_ANTIGUOS:
+            try:
+                return datetime.strptime(valor.strip(), formato).astimezone()
+            except ValueError:
+                continue
+    return None
+
+def clave_fecha(valor) -> datetime:
+    """Clave para ordenar por una fecha guardada en cualquiera de sus formatos."""
+    return a_fecha(valor) or FECHA_MINIMA
+
+def formatear_fecha(valor, formato: str = FORMATO_MEMORIA) -> str:
+    """Fecha en hora local para mostrarla (en la interfaz o en el prompt)."""
+    fecha = a_fecha(valor)
+    if fecha is None:
+        return str(valor) if valor else ""
+    return fecha.astimezone().strftime(formato)
@@ -6,59 +6,192 @@ import firebase_admin
 from firebase_admin import firestore
 from google.cloud.firestore_v1.base_query import FieldFilter
 from firebase_admin.firestore import ArrayUnion
+from google.cloud.firestore_v1 import DELETE_FIELD
+from google.cloud.firestore_v1.field_path import FieldPath
 import streamlit as st
 
+from almacen_utils import ALMACEN, SQLITE_RUTA, crear_cliente_sqlite
+from cache_utils import CacheLecturas
+from conexiones_utils import ESTADISTICAS_CONEXIONES, configurar_canal_firestore
+from diff_utils import BORRAR, ESTADISTICAS_ESCRITURA, diff_campos
+
 # --- Función para inicializar Firestore (solo una vez) ---
 @st.cache_resource
-def get_firestore_client():
-    """Inicializa la app de Firebase/Firestore y devuelve el cliente de Firestore.
-    """
+def _crear_cliente_firestore():
+    ESTADISTICAS_CONEXIONES.registrar_creacion("firestore")
+    if ALMACEN == "sqlite":
+        return crear_cliente_sqlite(SQLITE_RUTA)
     if not firebase_admin._apps:
         firebase_admin.initialize_app()
-    return firestore.client()
+    return configurar_canal_firestore(firestore.client())
+
+def get_firestore_client():
+    """Devuelve el cliente de Firestore del proceso, creándolo la primera vez (canal gRPC de conexiones_utils.py).
+
+    Con ALMACEN=sqlite devuelve en su lugar el almacén local de almacen_utils.py, que tiene la misma API.
+    """
+    ESTADISTICAS_CONEXIONES.registrar_uso("firestore")
+    return _crear_cliente_firestore()
 
 # --- Obtener el cliente de Firestore ---
 db = get_firestore_client()
 
+# ─────────────────── CACHÉ DE LECTURAS ────────────────────
+# Las lecturas de este módulo pasan por una caché por usuario compartida por todas las sesiones del
+# proceso, y cada escritura hecha aquí invalida la colección que toca. Quien escriba por otra vía
+# (lotes de importación, consolidación o borrado) debe llamar a invalidate_cache.
+CACHE_LECTURAS = CacheLecturas()
+
+def invalidate_cache(user_id: str, collection_name: str | None = None) -> None:
+    """Descarta las lecturas en caché de una colección del usuario (o todas si no se indica)."""
+    CACHE_LECTURAS.invalidar(user_id, collection_name)
+
+def _leer(user_id: str, collection_name: str, clave: tuple, cargar):
+    return CACHE_LECTURAS.obtener(user_id, collection_name, clave, cargar)
+
 # ─────────────────── FUNCIONES DE UTILIDAD PARA FIRESTORE ────────────────────
 
 def add_document(db_client, user_id: str, collection_name: str, data: dict):
     """Añade un nuevo documento a una colección especificada dentro de la subcolección del usuario actual."""
     user_doc_ref = db_client.collection("usuarios").document(user_id)
-    return user_doc_ref.collection(collection_name).add(data)
+    resultado = user_doc_ref.collection(collection_name).add(data)
+    invalidate_cache(user_id, collection_name)
+    return resultado
+
+def new_document_id(db_client, user_id: str, collection_name: str) -> str:
+    """Genera en local un ID para un documento nuevo de la colección, sin escribir en Firestore."""
+    user_doc_ref = db_client.collection("usuarios").document(user_id)
+    return user_doc_ref.collection(collection_name).document().id
+
+def set_document(db_client, user_id: str, collection_name: str, document_id: str, data: dict):
+    """Crea o sobrescribe un documento con un ID concreto dentro de la subcolección del usuario actual."""
+    user_doc_ref = db_client.collection("usuarios").document(user_id)
+    user_doc_ref.collection(collection_name).document(document_id).set(data)
+    invalidate_cache(user_id, collection_name)
 
 def get_all_documents(db_client, user_id: str, collection_name: str):
     """Obtiene todos los documentos de una colección especificada dentro de la subcolección del usuario actual."""
     user_doc_ref = db_client.collection("usuarios").document(user_id)
+    return _leer(user_id, collection_name, ("todos",),
+                 lambda: list(user_doc_ref.collection(collection_name).stream()))
+
+def stream_documents(db_client, user_id: str, collection_name: str):
+    """Recorre los documentos de una colección del usuario a medida que llegan, sin pasar por la caché.
+
+    Para lecturas completas de una sola vez (p. ej. exportaciones), que no deben cargarse enteras en memoria.
+    """
+    user_doc_ref = db_client.collection("usuarios").document(user_id)
     return user_doc_ref.collection(collection_name).stream()
 
 def get_document(db_client, user_id: str, collection_name: str, document_id: str):
     """Obtiene un documento específico por su ID de una colección dentro de la subcolección del usuario actual."""
     user_doc_ref = db_client.collection("usuarios").document(user_id)
     doc_ref = user_doc_ref.collection(collection_name).document(document_id)
-    return doc_ref.get()
+    return _leer(user_id, collection_name, ("documento", document_id), doc_ref.get)
+
+def get_documents(db_client, user_id: str, collection_name: str, document_ids, fields: list[str] | None = None) -> dict:
+    """Obtiene varios documentos por su ID en una sola llamada (`get_all`); devuelve ID -> DocumentSnapshot.
+
+    `fields` limita los campos descargados. Los documentos que no existen tienen `exists` a False.
+    """
+    document_ids = sorted(set(document_ids))
+    if not document_ids:
+        return {}
+    coleccion = db_client.collection("usuarios").document(user_id).collection(collection_name)
+    referencias = [coleccion.document(doc_id) for doc_id in document_ids]
+    clave = ("documentos", tuple(document_ids), tuple(fields) if fields is not None else None)
+    return _leer(user_id, collection_name, clave,
+                 lambda: {snap.id: snap for snap in db_client.get_all(referencias, field_paths=fields)})
 
 def update_document(db_client, user_id: str, collection_name: str, document_id: str, data: dict):
     """Actualiza un documento específico por su ID en una colección dentro de la subcolección del usuario actual."""
     user_doc_ref = db_client.collection("usuarios").document(user_id)
     doc_ref = user_doc_ref.collection(collection_name).document(document_id)
     doc_ref.update(data)
+    invalidate_cache(user_id, collection_name)
+
+def _rutas_firestore(cambios: dict[tuple, object]) -> dict:
+    """Convierte las rutas de diff_campos en rutas de campo de Firestore (con escapado de nombres)."""
+    return {
+        FieldPath(*ruta).to_api_repr(): (DELETE_FIELD if valor is BORRAR else valor)
+        for ruta, valor in cambios.items()
+    }
+
+def update_document_diff(db_client, user_id: str, collection_name: str, document_id: str, anterior: dict, nuevo: dict) -> bool:
+    """Actualiza solo los campos de un documento que difieren de `anterior`.
+
+    Si no hay cambios no se escribe nada. Devuelve True si se ha realizado la escritura.
+    """
+    cambios = diff_campos(anterior, nuevo)
+    ESTADISTICAS_ESCRITURA.registrar(nuevo, cambios)
+    if not cambios:
+        return False
+    update_document(db_client, user_id, collection_name, document_id, _rutas_firestore(cambios))
+    return True
+
+def update_user_document_diff(db_client, user_id: str, anterior: dict, nuevo: dict) -> bool:
+    """Actualiza solo los campos cambiados del documento del usuario (perfil); lo crea si no existía.
+
+    El perfil no está en ninguna subcolección, así que se invalida toda la caché del usuario.
+    """
+    user_doc_ref = db_client.collection("usuarios").document(user_id)
+    if not anterior:
+        ESTADISTICAS_ESCRITURA.registrar(nuevo, {(k,): v for k, v in nuevo.items()})
+        user_doc_ref.set(nuevo, merge=True)
+        invalidate_cache(user_id)
+        return True
+    cambios = diff_campos(anterior, nuevo)
+    ESTADISTICAS_ESCRITURA.registrar(nuevo, cambios)
+    if not cambios:
+        return False
+    user_doc_ref.update(_rutas_firestore(cambios))
+    invalidate_cache(user_id)
+    return True
 
 def delete_document(db_client, user_id: str, collection_name: str, document_id: str):
     """Elimina un documento específico por su ID de una colección dentro de la subcolección del usuario actual."""
     user_doc_ref = db_client.collection("usuarios").document(user_id)
     user_doc_ref.collection(collection_name).document(document_id).delete()
+    invalidate_cache(user_id, collection_name)
+
+def get_documents_by_date(db_client, user_id: str, collection_name: str, date_field: str,
+                          descending: bool = True, since=None, until=None, limit: int | None = None,
+                          fields: list[str] | None = None, start_after=None):
+    """Obtiene documentos ordenados en el servidor por un campo de fecha (timestamp nativo).
 
-def get_documents_by_field(db_client, user_id: str, collection_name: str, field_name: str, field_value):
-    """Obtiene documentos de una colección donde un campo específico coincide con un valor dentro de la subcolección del usuario actual."""
+    `since`/`until` acotan el rango [since, until) y `limit` el número de documentos; `fields` limita
+    los campos descargados y `start_after` es el último DocumentSnapshot de la página anterior.
+    Los documentos que aún tengan la fecha como texto (sin migrar con migracion_utils.py) no entran
+    en un rango y, sin él, Firestore los agrupa aparte: detrás de los timestamps en orden ascendente
+    y delante en descendente.
+    """
     user_doc_ref = db_client.collection("usuarios").document(user_id)
-    docs = user_doc_ref.collection(collection_name).where(filter=FieldFilter(field_name, "==", field_value)).stream()
-    return docs
+    query = user_doc_ref.collection(collection_name)
+    if since is not None:
+        query = query.where(filter=FieldFilter(date_field, ">=", since))
+    if until is not None:
+        query = query.where(filter=FieldFilter(date_field, "<", until))
+    query = query.order_by(date_field, direction=firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING)
+    if fields is not None:
+        query = query.select(fields)
+    if start_after is not None:
+        query = query.start_after(start_after)
+    if limit is not None:
+        query = query.limit(limit)
+    clave = ("fecha", date_field, descending, since, until, limit, tuple(fields) if fields is not None else None,
+             start_after.reference.path if start_after is not None else None)
+    return _leer(user_id, collection_name, clave, lambda: list(query.stream()))
+
+def get_recent_conversations(db_client, user_id: str, limit: int, start_after=None):
+    """Conversaciones más recientes primero, solo con título y fecha de inicio (sin los turnos)."""
+    return get_documents_by_date(db_client, user_id, "conversaciones", "start_time", limit=limit,
+                                 fields=["title", "start_time"], start_after=start_after)
 
 def create_new_conversation(db_client, user_id: str, initial_data: dict):
     """Creates a new conversation document and returns its ID."""
     conversations_ref = db_client.collection("usuarios").document(user_id).collection("conversaciones")
     doc_ref = conversations_ref.add(initial_data)
+    invalidate_cache(user_id, "conversaciones")
     return doc_ref[1].id
 
 def save_conversation_turn(db_client, user_id: str, conversation_id: str, turn_data: dict):
@@ -67,4 +200,5 @@ def save_conversation_turn(db_client, user_id: str, conversation_id: str, turn_d
     
     doc_ref.update({
         'turns': ArrayUnion([turn_data])
-    })
\ No newline at end of file
+    })
+    invalidate_cache(user_id, "conversaciones")
\ No newline at end of file
@@ -1,13 +1,31 @@
 # © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
 # Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
 
-import pandas as pd, fsspec, json, os
+import pandas as pd, json, os
+
+from conexiones_utils import get_gcs_filesystem
 
 BUCKET = os.getenv("STATIC_BUCKET", "OWN-BUCKET-NAME")
 
 def read_text_from_gcs(path: str) -> str:
-    with fsspec.open(f"gs://{BUCKET}/{path}", "r", encoding="utf-8") as f:
-        return f.read()
+    # cat_file descarga el objeto en una sola petición (fsspec.open pedía antes sus metadatos)
+    return get_gcs_filesystem().cat_file(f"{BUCKET}/{path}").decode("utf-8")
+
+def read_texts_from_gcs(paths: list[str]) -> dict[str, str | Exception]:
+    """Lee varios objetos en una sola llamada (gcsfs los descarga en paralelo).
+
+    Devuelve el texto de cada ruta o la excepción con la que ha fallado su lectura.
+    """
+    fs = get_gcs_filesystem()
+    # Las claves del resultado son las rutas normalizadas por el sistema de ficheros
+    completas = {fs._strip_protocol(f"{BUCKET}/{path}"): path for path in paths}
+    resultados = fs.cat(list(completas), on_error="return")
+    textos = {}
+    for completa, path in completas.items():
+        contenido = resultados.get(completa, FileNotFoundError(completa))
+        textos[path] = contenido.decode("utf-8") if isinstance(contenido, bytes) else contenido
+    return textos
 
 def read_csv_from_gcs(path: str) -> pd.DataFrame:
-    return pd.read_csv(f"gs://{BUCKET}/{path}")
+    with get_gcs_filesystem().open(f"{BUCKET}/{path}", "rb") as f:
+        return pd.read_csv(f)
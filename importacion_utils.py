@@ -0,0 +1,212 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# importacion_utils.py
+import csv
+import json
+import math
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, Iterator, TextIO
+
+from modelos import Persona, validar
+from personas_utils import COMPONENTES_TEMPERAMENTALES, ESFERAS_BASE
+
+# Límite de operaciones por lote de escritura de Firestore
+TAM_LOTE_MAXIMO = 500
+
+# Separadores de las columnas con listas en CSV
+SEP_LISTA = ";"
+SEP_IDIOMA = ":"
+
+DATOS_PERSONALES = ["nombre", "sexo", "edad", "estado_civil", "puesto_trabajo", "otros_datos"]
+CARACTERISTICAS = ["formalidad", "amistad", "conflicto"]
+
+COLUMNAS_CSV = (
+    DATOS_PERSONALES
+    + COMPONENTES_TEMPERAMENTALES
+    + ["habilidades_tecnicas", "soft_skills", "idiomas"]
+    + [f"esfera_{esfera}" for esfera in ESFERAS_BASE] + ["esfera_otras"]
+    + CARACTERISTICAS + ["otras_caracteristicas"]
+)
+
+# ─────────────────── CONVERSIÓN FILA CSV <-> PERSONA ────────────────────
+
+def _lista(valor: str | None) -> list[str]:
+    return [v.strip() for v in (valor or "").split(SEP_LISTA) if v.strip()]
+
+def fila_a_persona(fila: dict) -> dict:
+    """Convierte una fila plana de CSV (ver COLUMNAS_CSV) en el documento de persona de Firestore."""
+    dp = {campo: (fila.get(campo) or "").strip() for campo in DATOS_PERSONALES}
+    if dp["edad"]:
+        edad = float(dp["edad"])
+        if not math.isfinite(edad):
+            raise ValueError(f"la edad no es un número finito: {dp['edad']}")
+        dp["edad"] = int(edad)
+    else:
+        dp["edad"] = 0
+
+    ct = {}
+    for comp in COMPONENTES_TEMPERAMENTALES:
+        valor = (fila.get(comp) or "").strip()
+        if valor:
+            try:
+                ct[comp] = float(valor.replace(",", "."))
+            except ValueError:
+                ct[comp] = valor  # validar informará del error
+
+    idiomas = []
+    for item in _lista(fila.get("idiomas")):
+        idioma, _, nivel = item.partition(SEP_IDIOMA)
+        if idioma.strip() and nivel.strip():
+            idiomas.append({"Idioma": idioma.strip(), "Nivel": nivel.strip()})
+
+    esferas = {esfera: _lista(fila.get(f"esfera_{esfera}")) for esfera in ESFERAS_BASE}
+    esferas["otras"] = _lista(fila.get("esfera_otras"))
+    caracteristicas = {campo: (fila.get(campo) or "Medio").strip() for campo in CARACTERISTICAS}
+    caracteristicas["otras"] = (fila.get("otras_caracteristicas") or "").strip()
+
+    return {
+        "datos_personales": dp,
+        "componentes_temperamentales": ct,
+        "capacidades": {
+            "Habilidades técnicas": _lista(fila.get("habilidades_tecnicas")),
+            "Soft skills": _lista(fila.get("soft_skills")),
+            "Idiomas": idiomas,
+        },
+        "relaciones": {"esferas": esferas, "características": caracteristicas},
+    }
+
+def persona_a_fila(persona: dict) -> dict:
+    """Operación inversa de fila_a_persona."""
+    dp = persona.get("datos_personales", {})
+    ct = persona.get("componentes_temperamentales", {})
+    caps = persona.get("capacidades", {})
+    rel = persona.get("relaciones", {})
+    esferas = rel.get("esferas", {})
+    carac = rel.get("características", {})
+
+    fila = {campo: dp.get(campo, "") for campo in DATOS_PERSONALES}
+    fila.update({comp: ct.get(comp, "") for comp in COMPONENTES_TEMPERAMENTALES})
+    fila["habilidades_tecnicas"] = SEP_LISTA.join(caps.get("Habilidades técnicas", []))
+    fila["soft_skills"] = SEP_LISTA.join(caps.get("Soft skills", []))
+    fila["idiomas"] = SEP_LISTA.join(f"{i.get('Idioma', '')}{SEP_IDIOMA}{i.get('Nivel', '')}"
+                                     for i in caps.get("Idiomas", []))
+    for esfera in list(ESFERAS_BASE) + ["otras"]:
+        fila[f"esfera_{esfera}"] = SEP_LISTA.join(esferas.get(esfera, []))
+    fila.update({campo: carac.get(campo, "") for campo in CARACTERISTICAS})
+    fila["otras_caracteristicas"] = carac.get("otras", "")
+    return fila
+
+# ─────────────────── LECTURA EN STREAMING ────────────────────
+
+def _persona_valida(num: int, datos) -> tuple[int, dict | None, str]:
+    """Valida el documento leído de una línea y lo normaliza con `Persona.a_firestore`.
+
+    Las claves que no gestiona la aplicación (y el ID) se descartan, para no guardarlas en Firestore.
+    """
+    if not isinstance(datos, dict):
+        return num, None, f"Fila no válida: se esperaba un objeto, no {type(datos).__name__}"
+    try:
+        persona = Persona.desde_firestore(datos)
+        ok, msg = validar(persona)
+    except (AttributeError, TypeError, ValueError) as e:
+        return num, None, f"Fila no válida: {e}"
+    if not ok:
+        return num, None, msg
+    persona.extra = {}
+    return num, persona.a_firestore(), ""
+
+def leer_personas(fichero: TextIO, formato: str) -> Iterator[tuple[int, dict | None, str]]:
+    """Recorre un fichero CSV o JSONL línea a línea sin cargarlo entero en memoria.
+
+    Devuelve tuplas (número de línea, persona, error); la persona es None si la línea no es válida.
+    """
+    if formato == "csv":
+        for num, fila in enumerate(csv.DictReader(fichero), start=2):
+            try:
+                persona = fila_a_persona(fila)
+            except ValueError as e:
+                yield num, None, f"Valor no válido: {e}"
+                continue
+            yield _persona_valida(num, persona)
+    elif formato == "jsonl":
+        for num, linea in enumerate(fichero, start=1):
+            if not linea.strip():
+                continue
+            try:
+                persona = json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield num, None, f"JSON no válido: {e}"
+                continue
+            yield _persona_valida(num, persona)
+    else:
+        raise ValueError(f"Formato de importación no soportado: {formato}")
+
+# ─────────────────── IMPORTACIÓN POR LOTES ────────────────────
+
+@dataclass
+class ResultadoImportacion:
+    importadas: int = 0
+    lotes: int = 0
+    errores: list[tuple[int, str]] = field(default_factory=list)
+    segundos: float = 0.0
+
+    @property
+    def personas_por_segundo(self) -> float:
+        return self.importadas / self.segundos if self.segundos else 0.0
+
+def importar_personas(db_client, user_id: str, filas: Iterable[tuple[int, dict | None, str]],
+                      tam_lote: int = TAM_LOTE_MAXIMO,
+                      progreso: Callable[[ResultadoImportacion], None] | None = None) -> ResultadoImportacion:
+    """Escribe en `sujetos` las personas válidas mediante escrituras por lotes de hasta 500 documentos.
+
+    Las filas no válidas se omiten y se anotan en el resultado con su número de línea.
+    """
+    tam_lote = min(tam_lote, TAM_LOTE_MAXIMO)
+    coleccion = db_client.collection("usuarios").document(user_id).collection("sujetos")
+    resultado = ResultadoImportacion()
+    inicio = time.perf_counter()
+
+    lote, pendientes = db_client.batch(), 0
+    for num, persona, error in filas:
+        if persona is None:
+            resultado.errores.append((num, error))
+            continue
+        lote.set(coleccion.document(), persona)
+        pendientes += 1
+        if pendientes == tam_lote:
+            lote.commit()
+            resultado.importadas += pendientes
+            resultado.lotes += 1
+            lote, pendientes = db_client.batch(), 0
+            if progreso:
+                progreso(resultado)
+    if pendientes:
+        lote.commit()
+        resultado.importadas += pendientes
+        resultado.lotes += 1
+
+    resultado.segundos = time.perf_counter() - inicio
+    if progreso:
+        progreso(resultado)
+    return resultado
+
+# ─────────────────── EXPORTACIÓN EN STREAMING ────────────────────
+
+def exportar_personas(personas: Iterable[dict], salida: TextIO, formato: str) -> int:
+    """Escribe las personas en `salida` (CSV o JSONL) a medida que se leen. Devuelve cuántas se exportan."""
+    total = 0
+    if formato == "csv":
+        writer = csv.DictWriter(salida, fieldnames=COLUMNAS_CSV)
+        writer.writeheader()
+        for persona in personas:
+            writer.writerow(persona_a_fila(persona))
+            total += 1
+    elif formato == "jsonl":
+        for persona in personas:
+            salida.write(json.dumps(persona, ensure_ascii=False, default=str) + "\n")
+            total += 1
+    else:
+        raise ValueError(f"Formato de exportación no soportado: {formato}")
+    return total
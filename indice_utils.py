@@ -0,0 +1,140 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# indice_utils.py
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Iterable
+
+from personas_utils import NIVELES_IDIOMA
+
+# Facetas con varios valores por persona: se exige que tenga todos los valores pedidos
+FACETAS_CONJUNTIVAS = ["esfera", "rol", "tecnica", "soft"]
+# Facetas de un solo valor por persona (niveles de la relación): basta con uno de los valores pedidos
+FACETAS_ALTERNATIVAS = ["formalidad", "amistad", "conflicto"]
+
+LONGITUD_MINIMA_PREFIJO = 2
+
+def normalizar(texto: str) -> str:
+    """Minúsculas y sin tildes, para que 'Alemán' y 'aleman' coincidan."""
+    descompuesto = unicodedata.normalize("NFKD", str(texto).strip().lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+# ─────────────────── ÍNDICE INVERTIDO DE PERSONAS ────────────────────
+
+class IndicePersonas:
+    """Índice invertido término -> IDs de persona para búsquedas por facetas.
+
+    Cada término es una tupla (faceta, valor normalizado). Se mantiene de forma incremental:
+    al actualizar una persona solo se retiran sus términos anteriores y se añaden los nuevos.
+    """
+
+    def __init__(self):
+        self._postings: dict[tuple, set[str]] = defaultdict(set)
+        self._terminos: dict[str, set[tuple]] = {}
+        # Etiqueta original (con mayúsculas y tildes) de cada valor, para mostrar en la interfaz
+        self._etiquetas: dict[tuple, str] = {}
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._terminos)
+
+    def _terminos_persona(self, persona: dict) -> set[tuple]:
+        terminos = set()
+
+        def anadir(faceta: str, valor, etiqueta: str | None = None):
+            if valor:
+                termino = (faceta, normalizar(valor))
+                terminos.add(termino)
+                self._etiquetas.setdefault(termino, etiqueta or str(valor))
+
+        nombre = persona.get("datos_personales", {}).get("nombre", "")
+        for token in normalizar(nombre).split():
+            for i in range(min(LONGITUD_MINIMA_PREFIJO, len(token)), len(token) + 1):
+                terminos.add(("nombre", token[:i]))
+
+        rel = persona.get("relaciones", {})
+        for esfera, roles in rel.get("esferas", {}).items():
+            if roles:
+                anadir("esfera", esfera, esfera.capitalize())
+            for rol in roles:
+                anadir("rol", rol)
+        for campo in FACETAS_ALTERNATIVAS:
+            anadir(campo, rel.get("características", {}).get(campo))
+
+        caps = persona.get("capacidades", {})
+        for skill in caps.get("Habilidades técnicas", []):
+            anadir("tecnica", skill)
+        for skill in caps.get("Soft skills", []):
+            anadir("soft", skill)
+        for idioma in caps.get("Idiomas", []):
+            nombre_idioma, nivel = idioma.get("Idioma"), idioma.get("Nivel")
+            anadir("idioma", nombre_idioma)
+            # Se indexa el nivel y todos los inferiores, así "al menos Intermedio" es una sola búsqueda
+            if nombre_idioma and nivel in NIVELES_IDIOMA:
+                for inferior in NIVELES_IDIOMA[:NIVELES_IDIOMA.index(nivel) + 1]:
+                    terminos.add(("idioma_nivel", normalizar(nombre_idioma), inferior))
+        return terminos
+
+    # --- Mantenimiento incremental ---
+    def actualizar(self, persona_id: str, persona: dict | None) -> None:
+        """Reindexa una persona (o la retira si `persona` es None). Firma de observador de PersonasStore."""
+        with self._lock:
+            for termino in self._terminos.pop(persona_id, ()):
+                ids = self._postings.get(termino)
+                if ids is not None:
+                    ids.discard(persona_id)
+                    if not ids:
+                        del self._postings[termino]
+            if persona is None:
+                return
+            terminos = self._terminos_persona(persona)
+            self._terminos[persona_id] = terminos
+            for termino in terminos:
+                self._postings[termino].add(persona_id)
+
+    # --- Consultas ---
+    def valores(self, faceta: str) -> list[tuple[str, int]]:
+        """Valores conocidos de una faceta con su número de personas, para construir los filtros."""
+        with self._lock:
+            valores = [(self._etiquetas.get(t, t[1]), len(ids)) for t, ids in self._postings.items()
+                       if t[0] == faceta and len(t) == 2]
+        return sorted(valores)
+
+    def buscar(self, nombre: str = "", facetas: dict[str, Iterable[str]] | None = None,
+               idioma: str | None = None, nivel_minimo: str | None = None) -> set[str] | None:
+        """IDs de las personas que cumplen todas las condiciones, o None si no hay ninguna condición.
+
+        - `nombre`: cada palabra debe ser el comienzo de alguna palabra del nombre.
+        - `facetas`: {faceta: valores}; en FACETAS_CONJUNTIVAS se exigen todos los valores,
+          en FACETAS_ALTERNATIVAS basta con uno.
+        - `idioma` (y opcionalmente `nivel_minimo`): habla ese idioma con al menos ese nivel.
+        """
+        condiciones: list[set[str]] = []
+        with self._lock:
+            for token in normalizar(nombre).split():
+                condiciones.append(set(self._postings.get(("nombre", token), ())))
+            for faceta, valores in (facetas or {}).items():
+                valores = [normalizar(v) for v in valores if v]
+                if not valores:
+                    continue
+                if faceta in FACETAS_ALTERNATIVAS:
+                    condiciones.append(set().union(*(self._postings.get((faceta, v), ()) for v in valores)))
+                else:
+                    condiciones.extend(set(self._postings.get((faceta, v), ())) for v in valores)
+            if idioma:
+                termino = (("idioma_nivel", normalizar(idioma), nivel_minimo) if nivel_minimo
+                           else ("idioma", normalizar(idioma)))
+                condiciones.append(set(self._postings.get(termino, ())))
+
+        if not condiciones:
+            return None
+        # Se intersecta empezando por la condición más selectiva
+        condiciones.sort(key=len)
+        resultado = condiciones[0]
+        for condicion in condiciones[1:]:
+            if not resultado:
+                break
+            resultado = resultado & condicion
+        return resultado
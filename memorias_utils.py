@@ -0,0 +1,431 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# memorias_utils.py
+import hashlib
+import heapq
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Iterable
+
+from fechas_utils import a_fecha, ahora, clave_fecha, formatear_fecha
+from indice_utils import normalizar
+from modelos import Resumen
+from prompt_utils import estimar_tokens
+
+# Palabras vacías que no aportan al contenido de una memoria
+PALABRAS_VACIAS = set("""
+a al algo ante con contra de del desde donde durante e el ella ellas ellos en entre era es esa ese eso esta
+este esto fue ha han hay la las le les lo los me mi mis muy no nos o para pero por que quien se sea ser si
+sin sobre su sus tambien tiene tienen tu un una uno unos unas y ya usuario usuaria
+""".split())
+# Se comparan solo los primeros caracteres de cada palabra (prefiere/preferir/preferencia)
+LONGITUD_RAIZ = 6
+
+NUM_PERMUTACIONES = 64
+BANDAS = 16                       # 16 bandas de 4 filas: candidatas a partir de ~50% de similitud
+FILAS = NUM_PERMUTACIONES // BANDAS
+UMBRAL_DUPLICADO = 0.6            # Jaccard mínimo (exacto) para considerar dos memorias duplicadas
+UMBRAL_CUBIERTA = 0.75            # Fracción de una memoria contenida en otra para considerarla incluida
+
+_PRIMO = (1 << 61) - 1
+_COEFICIENTES = [
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "big") % _PRIMO | 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "big") % _PRIMO)
+    for i in range(NUM_PERMUTACIONES)
+]
+
+# ─────────────────── SHINGLES Y MINHASH ────────────────────
+
+def nombres_propios(texto: str) -> frozenset[str]:
+    """Palabras en mayúscula que no son palabras vacías: casi siempre, las personas de las que habla la memoria."""
+    return frozenset(n for n in (normalizar(p) for p in re.findall(r"\b[A-ZÁÉÍÓÚÑ]\w+", texto))
+                     if n not in PALABRAS_VACIAS)
+
+def shingles(texto: str) -> frozenset[str]:
+    """Raíces de las palabras con contenido, sin los nombres propios (se comparan aparte).
+
+    Las memorias son frases cortas, así que el orden de las palabras apenas distingue una
+    paráfrasis de otra y no se usan n-gramas.
+    """
+    nombres = nombres_propios(texto)
+    return frozenset(p[:LONGITUD_RAIZ] for p in re.findall(r"\w+", normalizar(texto))
+                     if p not in PALABRAS_VACIAS and p not in nombres)
+
+def firma_minhash(conjunto: frozenset[str]) -> tuple[int, ...]:
+    if not conjunto:
+        return (0,) * NUM_PERMUTACIONES
+    valores = [int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big") for s in conjunto]
+    return tuple(min((a * v + b) % _PRIMO for v in valores) for a, b in _COEFICIENTES)
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+def terminos_consulta(texto: str) -> frozenset[str]:
+    """Términos con los que una consulta encuentra memorias: la raíz de cada palabra con contenido
+    (como en `shingles`) y la palabra completa (como en `nombres_propios`), sin distinguir mayúsculas."""
+    palabras = [p for p in re.findall(r"\w+", normalizar(texto)) if p not in PALABRAS_VACIAS]
+    return frozenset(palabras) | frozenset(p[:LONGITUD_RAIZ] for p in palabras)
+
+# ─────────────────── ÍNDICE LSH DE MEMORIAS ────────────────────
+
+@dataclass
+class Duplicado:
+    memoria_id: str
+    similitud: float
+    # Fracción de la memoria nueva que ya está en la existente (si es alta, no aporta nada)
+    cubierta: float
+    # Fracción de la memoria existente que está en la nueva (si es alta, la nueva la amplía)
+    contenida: float
+
+class IndiceMemorias:
+    """Índice LSH (MinHash por bandas) para encontrar memorias casi duplicadas sin compararlas todas,
+    más un índice invertido de sus raíces y nombres propios para buscarlas por palabras.
+
+    Se mantiene de forma incremental con `actualizar`, con la misma firma que los observadores de personas.
+    """
+
+    def __init__(self):
+        self._shingles: dict[str, frozenset] = {}
+        self._nombres: dict[str, frozenset] = {}
+        self._bandas: dict[tuple, set[str]] = defaultdict(set)
+        self._firmas: dict[str, tuple] = {}
+        self._postings: dict[str, set[str]] = defaultdict(set)
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._shingles)
+
+    @staticmethod
+    def _claves_banda(firma: tuple) -> list[tuple]:
+        return [(i, firma[i * FILAS:(i + 1) * FILAS]) for i in range(BANDAS)]
+
+    def actualizar(self, memoria_id: str, memoria: dict | None) -> None:
+        """Indexa una memoria (o la retira si `memoria` es None)."""
+        with self._lock:
+            firma = self._firmas.pop(memoria_id, None)
+            if firma is not None:
+                for clave in self._claves_banda(firma):
+                    self._bandas[clave].discard(memoria_id)
+                    if not self._bandas[clave]:
+                        del self._bandas[clave]
+                for termino in self._shingles.pop(memoria_id) | self._nombres.pop(memoria_id):
+                    self._postings[termino].discard(memoria_id)
+                    if not self._postings[termino]:
+                        del self._postings[termino]
+            if memoria is None:
+                return
+            conjunto = shingles(memoria.get("memoria", ""))
+            firma = firma_minhash(conjunto)
+            self._shingles[memoria_id] = conjunto
+            self._nombres[memoria_id] = nombres_propios(memoria.get("memoria", ""))
+            self._firmas[memoria_id] = firma
+            for clave in self._claves_banda(firma):
+                self._bandas[clave].add(memoria_id)
+            for termino in conjunto | self._nombres[memoria_id]:
+                self._postings[termino].add(memoria_id)
+
+    def _candidatas(self, firma: tuple) -> set[str]:
+        candidatas = set()
+        for clave in self._claves_banda(firma):
+            candidatas |= self._bandas.get(clave, set())
+        return candidatas
+
+    def duplicados(self, texto: str, umbral: float = UMBRAL_DUPLICADO, excluir: str | None = None) -> list[Duplicado]:
+        """Memorias indexadas casi iguales a `texto`, de más a menos parecida.
+
+        Dos memorias que nombran a personas distintas nunca son duplicadas, aunque digan lo mismo
+        ("Ana prefiere las reuniones por la mañana" / "Luis prefiere las reuniones por la mañana").
+        """
+        conjunto = shingles(texto)
+        if not conjunto:
+            return []
+        nombres = nombres_propios(texto)
+        with self._lock:
+            resultado = []
+            for memoria_id in self._candidatas(firma_minhash(conjunto)) - {excluir}:
+                if self._nombres[memoria_id] != nombres:
+                    continue
+                existente = self._shingles[memoria_id]
+                similitud = jaccard(conjunto, existente)
+                if similitud >= umbral:
+                    comunes = len(conjunto & existente)
+                    resultado.append(Duplicado(memoria_id, similitud, comunes / len(conjunto),
+                                               comunes / len(existente) if existente else 1.0))
+        return sorted(resultado, key=lambda d: -d.similitud)
+
+    def buscar(self, consulta: str, limite: int = 10, filtro: Callable[[str], bool] | None = None) -> list[str]:
+        """IDs de las memorias que más términos comparten con la consulta, de más a menos relevante.
+
+        Cada término coincidente suma más cuanto menos memorias lo contienen. `filtro(memoria_id)`
+        descarta memorias (p. ej. las que no mencionan a una persona).
+        """
+        puntuaciones: dict[str, float] = defaultdict(float)
+        with self._lock:
+            total = len(self._shingles)
+            for termino in terminos_consulta(consulta):
+                ids = self._postings.get(termino)
+                if not ids:
+                    continue
+                idf = math.log(1 + total / len(ids))
+                for memoria_id in ids:
+                    puntuaciones[memoria_id] += idf
+        candidatas = ((p, m) for m, p in puntuaciones.items() if filtro is None or filtro(m))
+        return [m for _, m in heapq.nlargest(limite, candidatas)]
+
+def decidir_guardado(indice: IndiceMemorias, texto: str) -> tuple[str, str | None]:
+    """Qué hacer con una memoria nueva según las que ya hay guardadas.
+
+    Devuelve ("guardar", None), ("omitir", id) si una memoria existente ya dice lo mismo, o
+    ("sustituir", id) si la nueva amplía una existente casi igual, que se reemplaza por ella.
+    """
+    for duplicado in indice.duplicados(texto):
+        if duplicado.cubierta >= UMBRAL_CUBIERTA:
+            return "omitir", duplicado.memoria_id
+        if duplicado.contenida >= UMBRAL_CUBIERTA:
+            return "sustituir", duplicado.memoria_id
+    return "guardar", None
+
+# ─────────────────── CONSOLIDACIÓN DE UNA COLECCIÓN ────────────────────
+
+@dataclass
+class PlanConsolidacion:
+    # Cada grupo es una lista de IDs de memorias casi iguales; la primera es la que se conserva
+    grupos: list[list[str]] = field(default_factory=list)
+    borrar: list[str] = field(default_factory=list)
+    # Memorias conservadas cuya fecha se actualiza a la más reciente del grupo
+    actualizar: dict[str, dict] = field(default_factory=dict)
+    tokens_antes: int = 0
+    tokens_despues: int = 0
+
+    @property
+    def tokens_ahorrados(self) -> int:
+        return self.tokens_antes - self.tokens_despues
+
+def _linea_prompt(memoria: dict) -> str:
+    return f"- [{formatear_fecha(memoria.get('fecha_registro'))}] {memoria.get('memoria', '')}"
+
+def planificar_consolidacion(memorias: dict[str, dict], umbral: float = UMBRAL_DUPLICADO) -> PlanConsolidacion:
+    """Agrupa las memorias casi duplicadas y decide cuáles se borran.
+
+    En cada grupo se conserva la memoria con más contenido (más shingles; a igualdad, la más reciente),
+    que pasa a tener la fecha de la memoria más reciente del grupo. No escribe nada.
+    """
+    indice = IndiceMemorias()
+    for memoria_id, memoria in memorias.items():
+        indice.actualizar(memoria_id, memoria)
+
+    # Unión de pares duplicados (union-find)
+    padre = {memoria_id: memoria_id for memoria_id in memorias}
+
+    def raiz(x: str) -> str:
+        while padre[x] != x:
+            padre[x] = padre[padre[x]]
+            x = padre[x]
+        return x
+
+    for memoria_id, memoria in memorias.items():
+        for duplicado in indice.duplicados(memoria.get("memoria", ""), umbral, excluir=memoria_id):
+            padre[raiz(duplicado.memoria_id)] = raiz(memoria_id)
+
+    grupos: dict[str, list[str]] = defaultdict(list)
+    for memoria_id in memorias:
+        grupos[raiz(memoria_id)].append(memoria_id)
+
+    plan = PlanConsolidacion(tokens_antes=sum(estimar_tokens(_linea_prompt(m)) for m in memorias.values()))
+    for ids in grupos.values():
+        if len(ids) < 2:
+            continue
+        ids.sort(key=lambda i: (len(shingles(memorias[i].get("memoria", ""))),
+                                clave_fecha(memorias[i].get("fecha_registro"))), reverse=True)
+        plan.grupos.append(ids)
+        plan.borrar.extend(ids[1:])
+        fecha = max(clave_fecha(memorias[i].get("fecha_registro")) for i in ids)
+        if fecha != clave_fecha(memorias[ids[0]].get("fecha_registro")):
+            plan.actualizar[ids[0]] = {"fecha_registro": fecha}
+
+    borradas = set(plan.borrar)
+    plan.tokens_despues = sum(estimar_tokens(_linea_prompt({**m, **plan.actualizar.get(i, {})}))
+                              for i, m in memorias.items() if i not in borradas)
+    return plan
+
+def aplicar_consolidacion(db_client, user_id: str, plan: PlanConsolidacion, tam_lote: int = 500) -> int:
+    """Aplica el plan en Firestore con escrituras por lotes. Devuelve el número de operaciones."""
+    memorias_ref = db_client.collection("usuarios").document(user_id).collection("memorias")
+    operaciones = [("borrar", i, None) for i in plan.borrar] + [("actualizar", i, d) for i, d in plan.actualizar.items()]
+    for inicio in range(0, len(operaciones), tam_lote):
+        lote = db_client.batch()
+        for tipo, memoria_id, datos in operaciones[inicio:inicio + tam_lote]:
+            if tipo == "borrar":
+                lote.delete(memorias_ref.document(memoria_id))
+            else:
+                lote.update(memorias_ref.document(memoria_id), datos)
+        lote.commit()
+    return len(operaciones)
+
+# ─────────────────── RESÚMENES POR PERSONA ────────────────────
+
+# Memorias sin resumir de una persona a partir de las cuales se (re)genera su resumen automáticamente
+UMBRAL_COMPACTACION = 5
+RESUMIDOR_MEMORIAS = os.environ.get("RESUMIDOR_MEMORIAS", "local")
+
+PROMPT_RESUMEN = (
+    "Resume en un único párrafo breve, en español y en tercera persona, lo que se sabe de {nombre} "
+    "a partir de estas memorias guardadas en conversaciones anteriores. Conserva todos los datos concretos "
+    "(preferencias, fechas, hechos), elimina las repeticiones y, si dos memorias se contradicen, quédate "
+    "con la más reciente. Responde solo con el resumen.\n\n{memorias}"
+)
+
+def nombres_personas(personas: Iterable[dict]) -> dict[tuple[str, ...], str]:
+    """Palabras (normalizadas) con las que se reconoce a cada persona en una memoria -> ID de la persona.
+
+    Siempre el nombre completo; también el nombre de pila si ninguna otra persona lo comparte.
+    """
+    nombres = {p["ID"]: tuple(re.findall(r"\w+", normalizar(p.get("datos_personales", {}).get("nombre", ""))))
+               for p in personas}
+    nombres = {pid: n for pid, n in nombres.items() if n}
+    pilas = defaultdict(list)
+    for pid, nombre in nombres.items():
+        pilas[nombre[:1]].append(pid)
+    claves = {nombre: pid for pid, nombre in nombres.items()}
+    for pila, pids in pilas.items():
+        if len(pids) == 1 and pila not in claves and pila[0] not in PALABRAS_VACIAS:
+            claves[pila] = pids[0]
+    return claves
+
+def personas_mencionadas(texto: str, nombres: dict[tuple[str, ...], str]) -> set[str]:
+    """IDs de las personas nombradas en el texto; en cada posición cuenta la coincidencia más larga."""
+    palabras = re.findall(r"\w+", normalizar(texto))
+    maximo = max(map(len, nombres), default=0)
+    mencionadas, i = set(), 0
+    while i < len(palabras):
+        for n in range(min(maximo, len(palabras) - i), 0, -1):
+            pid = nombres.get(tuple(palabras[i:i + n]))
+            if pid is not None:
+                mencionadas.add(pid)
+                i += n
+                break
+        else:
+            i += 1
+    return mencionadas
+
+def agrupar_por_persona(memorias: dict[str, dict], personas: Iterable[dict]) -> dict[str, list[str]]:
+    """IDs de las memorias que mencionan a cada persona.
+
+    Las memorias que nombran a varias personas (sobre su relación, normalmente) no se asignan a
+    ninguna y siguen yendo sueltas al prompt.
+    """
+    nombres = nombres_personas(personas)
+    grupos = defaultdict(list)
+    for memoria_id, memoria in memorias.items():
+        mencionadas = personas_mencionadas(memoria.get("memoria", ""), nombres)
+        if len(mencionadas) == 1:
+            grupos[mencionadas.pop()].append(memoria_id)
+    return dict(grupos)
+
+class ResumidorLocal:
+    """Resumen extractivo sin llamadas al modelo: las memorias de la persona de la más antigua a la más
+    reciente, sin las que repite otra posterior y sin el nombre de la persona al principio."""
+
+    nombre = "local"
+
+    def resumir(self, nombre: str, memorias: list[dict]) -> str:
+        indice = IndiceMemorias()
+        prefijo = re.compile(rf"^\s*(?:{re.escape(nombre)}|{re.escape(nombre.split()[0])})\b[\s,:]*", re.IGNORECASE)
+        frases = []
+        for memoria in sorted(memorias, key=lambda m: clave_fecha(m.get("fecha_registro")), reverse=True):
+            texto = " ".join(memoria.get("memoria", "").split()).rstrip(".")
+            if decidir_guardado(indice, texto)[0] == "omitir":
+                continue
+            indice.actualizar(memoria.get("id", texto), memoria)
+            frases.append(prefijo.sub("", texto))
+        return "; ".join(reversed(frases)) + "."
+
+class ResumidorGemini:
+    """Resumen abstractivo con el mismo cliente de Gemini que usa el asistente."""
+
+    nombre = "gemini"
+
+    def __init__(self, cliente, modelo: str = "gemini-2.5-flash"):
+        self.cliente = cliente
+        self.modelo = modelo
+        # usage_metadata de cada llamada, para la contabilidad de consumo (consumo_utils.py)
+        self.metadatos: list = []
+
+    def resumir(self, nombre: str, memorias: list[dict]) -> str:
+        lineas = "\n".join(f"- [{formatear_fecha(m.get('fecha_registro'))}] {m.get('memoria', '')}"
+                           for m in sorted(memorias, key=lambda m: clave_fecha(m.get("fecha_registro"))))
+        respuesta = self.cliente.models.generate_content(
+            model=self.modelo, contents=PROMPT_RESUMEN.format(nombre=nombre, memorias=lineas))
+        self.metadatos.append(respuesta.usage_metadata)
+        texto = " ".join((respuesta.text or "").split())
+        return texto or ResumidorLocal().resumir(nombre, memorias)
+
+RESUMIDORES = {r.nombre: r for r in (ResumidorLocal, ResumidorGemini)}
+
+def get_resumidor(nombre: str | None = None, cliente=None):
+    """Resumidor registrado con ese nombre (por defecto, el de RESUMIDOR_MEMORIAS).
+
+    El de Gemini necesita el cliente del modelo; sin él se usa el local.
+    """
+    nombre = nombre or RESUMIDOR_MEMORIAS
+    if nombre == ResumidorGemini.nombre and cliente is not None:
+        return ResumidorGemini(cliente)
+    return ResumidorLocal()
+
+def compactar_memorias(memorias: dict[str, dict], personas: Iterable[dict], resumenes: dict[str, dict],
+                       resumidor, minimo: int = UMBRAL_COMPACTACION) -> tuple[list[Resumen], list[str]]:
+    """Resúmenes que hay que (re)generar y resúmenes que hay que borrar. No escribe nada.
+
+    Se regenera el resumen de una persona cuando tiene al menos `minimo` memorias sin resumir, o cuando
+    alguna de las memorias resumidas se ha borrado (el resumen ya no es fiel). Con `minimo=1` se
+    regeneran todos los que no están al día.
+    """
+    personas = {p["ID"]: p for p in personas}
+    grupos = agrupar_por_persona(memorias, personas.values())
+    nuevos = []
+    obsoletos = [pid for pid in resumenes if pid not in grupos]
+
+    fecha = ahora()
+    for pid, ids in grupos.items():
+        resumidas = set(resumenes.get(pid, {}).get("memorias", []))
+        pendientes = set(ids) - resumidas
+        borradas = resumidas - set(memorias)
+        if len(pendientes) < minimo and not (borradas and pid in resumenes):
+            continue
+        nombre = personas[pid].get("datos_personales", {}).get("nombre", "")
+        grupo = sorted((memorias[i] | {"id": i} for i in ids), key=lambda m: clave_fecha(m.get("fecha_registro")))
+        nuevos.append(Resumen(pid, nombre, resumidor.resumir(nombre, grupo), [m["id"] for m in grupo],
+                              a_fecha(grupo[0].get("fecha_registro")), a_fecha(grupo[-1].get("fecha_registro")),
+                              resumidor.nombre, fecha))
+    return nuevos, obsoletos
+
+def guardar_resumenes(db_client, user_id: str, nuevos: list[Resumen], obsoletos: list[str], tam_lote: int = 500) -> int:
+    """Escribe los resúmenes (con el ID de la persona como ID de documento) y borra los obsoletos, por lotes."""
+    resumenes_ref = db_client.collection("usuarios").document(user_id).collection("resumenes")
+    operaciones = [(r.persona_id, r.a_firestore()) for r in nuevos] + [(pid, None) for pid in obsoletos]
+    for inicio in range(0, len(operaciones), tam_lote):
+        lote = db_client.batch()
+        for persona_id, datos in operaciones[inicio:inicio + tam_lote]:
+            if datos is None:
+                lote.delete(resumenes_ref.document(persona_id))
+            else:
+                lote.set(resumenes_ref.document(persona_id), datos)
+        lote.commit()
+    return len(operaciones)
+
+def memorias_para_prompt(memorias: list[dict], resumenes: dict[str, dict]) -> tuple[list[dict], list[dict]]:
+    """Resúmenes vigentes y memorias que ninguno de ellos cubre, para el prompt.
+
+    Un resumen solo se usa si siguen existiendo todas las memorias de las que procede; si no, sus
+    memorias se envían sueltas hasta que se regenere.
+    """
+    existentes = {m.get("id") for m in memorias}
+    vigentes = [r for r in resumenes.values() if set(r.get("memorias", [])) <= existentes]
+    cubiertas = {i for r in vigentes for i in r.get("memorias", [])}
+    return (sorted(vigentes, key=lambda r: r.get("nombre", "")),
+            [m for m in memorias if m.get("id") not in cubiertas])
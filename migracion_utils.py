@@ -0,0 +1,173 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# migracion_utils.py
+"""Migración de las fechas guardadas como texto a timestamps nativos de Firestore.
+
+Uso:  python migracion_utils.py [--usuario UID] [--lote 400] [--simular]
+
+Es reanudable sin guardar ningún punto de control: cada consulta pide solo los documentos cuyo campo
+de fecha sigue siendo texto (en Firestore todo texto es mayor o igual que "" y cualquier timestamp es
+menor), así que lo ya migrado no vuelve a aparecer y basta con volver a ejecutarla si se interrumpe.
+Sin --usuario se migran todos los usuarios con consultas de grupo de colecciones, que necesitan los
+índices de firestore.indexes.json (`firebase deploy --only firestore:indexes`).
+"""
+import argparse
+import time
+from dataclasses import dataclass, field
+from typing import Callable
+
+from google.api_core.exceptions import FailedPrecondition
+from google.cloud.firestore_v1.base_query import FieldFilter
+
+from fechas_utils import a_fecha
+
+TAM_LOTE_MIGRACION = 400
+NOMBRE_DOCUMENTO = "__name__"
+
+@dataclass
+class ResultadoMigracion:
+    migrados: int = 0
+    lotes: int = 0
+    # Rutas de documentos con una fecha que no se ha podido interpretar
+    no_reconocidos: list[str] = field(default_factory=list)
+    # Rutas de documentos modificados mientras se migraban; se migran en la siguiente ejecución
+    concurrentes: list[str] = field(default_factory=list)
+    segundos: float = 0.0
+
+# ─────────────────── CONVERSIÓN DE CADA TIPO DE DOCUMENTO ────────────────────
+
+def _fechas(datos: dict, campos: tuple[str, ...]) -> dict | None:
+    """Campos de fecha convertidos a datetime; None si alguno de texto no se reconoce."""
+    cambios = {}
+    for campo in campos:
+        valor = datos.get(campo)
+        if isinstance(valor, str):
+            fecha = a_fecha(valor)
+            if fecha is None:
+                return None
+            cambios[campo] = fecha
+    return cambios
+
+def _migrar_memoria(datos: dict) -> dict | None:
+    return _fechas(datos, ("fecha_registro",))
+
+def _migrar_resumen(datos: dict) -> dict | None:
+    return _fechas(datos, ("desde", "hasta", "fecha_generacion"))
+
+def _migrar_conversacion(datos: dict) -> dict | None:
+    """Fecha de inicio y fecha de cada turno (los turnos están en un array y se reescriben enteros)."""
+    cambios = _fechas(datos, ("start_time",))
+    if cambios is None:
+        return None
+    turnos = []
+    for turno in datos.get("turns", []):
+        fecha = _fechas(turno, ("timestamp",))
+        if fecha is None:
+            return None
+        turnos.append({**turno, **fecha})
+    if turnos:
+        cambios["turns"] = turnos
+    return cambios
+
+# (colección, campo de fecha que selecciona los documentos sin migrar, conversión)
+MIGRACIONES: list[tuple[str, str, Callable[[dict], dict | None]]] = [
+    ("memorias", "fecha_registro", _migrar_memoria),
+    ("conversaciones", "start_time", _migrar_conversacion),
+    ("resumenes", "fecha_generacion", _migrar_resumen),
+]
+
+# ─────────────────── MIGRACIÓN POR LOTES ────────────────────
+
+def _pendientes(coleccion, campo: str, tam_lote: int):
+    """Páginas de documentos cuyo `campo` sigue siendo texto, avanzando con un cursor.
+
+    El cursor evita volver a leer los documentos que no se han podido migrar en esta ejecución.
+    """
+    consulta = (coleccion.where(filter=FieldFilter(campo, ">=", ""))
+                .order_by(campo).order_by(NOMBRE_DOCUMENTO).limit(tam_lote))
+    ultimo = None
+    while True:
+        pagina = list((consulta.start_after(ultimo) if ultimo is not None else consulta).stream())
+        if pagina:
+            yield pagina
+        if len(pagina) < tam_lote:
+            return
+        ultimo = pagina[-1]
+
+def _escribir(db_client, escrituras: list, resultado: ResultadoMigracion) -> None:
+    """Confirma un lote de actualizaciones condicionadas a que el documento no haya cambiado desde que se leyó.
+
+    Si algún documento ha cambiado (p. ej. se ha añadido un turno a la conversación), el lote entero
+    falla y se repite documento a documento para migrar el resto.
+    """
+    def actualizar(lote, snap, cambios):
+        lote.update(snap.reference, cambios, option=db_client.write_option(last_update_time=snap.update_time))
+
+    lote = db_client.batch()
+    for snap, cambios in escrituras:
+        actualizar(lote, snap, cambios)
+    try:
+        lote.commit()
+        resultado.migrados += len(escrituras)
+    except FailedPrecondition:
+        for snap, cambios in escrituras:
+            individual = db_client.batch()
+            actualizar(individual, snap, cambios)
+            try:
+                individual.commit()
+                resultado.migrados += 1
+            except FailedPrecondition:
+                resultado.concurrentes.append(snap.reference.path)
+    resultado.lotes += 1
+
+def migrar_fechas(db_client, user_id: str | None = None, tam_lote: int = TAM_LOTE_MIGRACION,
+                  simular: bool = False, progreso: Callable[[str, int], None] | None = None) -> ResultadoMigracion:
+    """Convierte a timestamps nativos las fechas de texto de un usuario (o de todos si `user_id` es None).
+
+    Con `simular=True` solo cuenta los documentos que se migrarían. `progreso(coleccion, migrados)` se
+    llama tras cada lote.
+    """
+    inicio = time.perf_counter()
+    resultado = ResultadoMigracion()
+    for nombre, campo, convertir in MIGRACIONES:
+        if user_id is None:
+            coleccion = db_client.collection_group(nombre)
+        else:
+            coleccion = db_client.collection("usuarios").document(user_id).collection(nombre)
+        for pagina in _pendientes(coleccion, campo, tam_lote):
+            escrituras = []
+            for snap in pagina:
+                cambios = convertir(snap.to_dict())
+                if cambios is None:
+                    resultado.no_reconocidos.append(snap.reference.path)
+                elif cambios:
+                    escrituras.append((snap, cambios))
+            if simular:
+                resultado.migrados += len(escrituras)
+            elif escrituras:
+                _escribir(db_client, escrituras, resultado)
+            if progreso:
+                progreso(nombre, resultado.migrados)
+    resultado.segundos = time.perf_counter() - inicio
+    return resultado
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--usuario", help="Migrar solo este usuario (por defecto, todos)")
+    parser.add_argument("--lote", type=int, default=TAM_LOTE_MIGRACION)
+    parser.add_argument("--simular", action="store_true", help="Contar los documentos sin escribir nada")
+    args = parser.parse_args()
+
+    from firestore_utils import get_firestore_client
+    resultado = migrar_fechas(get_firestore_client(), args.usuario, args.lote, args.simular,
+                              progreso=lambda coleccion, n: print(f"\r{coleccion}: {n:,} documentos", end=""))
+    print(f"\n{'Se migrarían' if args.simular else 'Migrados'} {resultado.migrados:,} documentos "
+          f"en {resultado.lotes:,} lotes ({resultado.segundos:.1f} s).")
+    for ruta in resultado.no_reconocidos:
+        print(f"  Fecha no reconocida: {ruta}")
+    if resultado.concurrentes:
+        print(f"  {len(resultado.concurrentes):,} documentos cambiaron durante la migración; vuelve a ejecutarla.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# modelos.py
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from fechas_utils import a_fecha
+
+from personas_utils import COMPONENTES_TEMPERAMENTALES, EDAD_MAXIMA, NIVELES_IDIOMA, NIVELES_RELACION, SEXOS
+
+PUNTUACION_MAXIMA = 17
+
+# ─────────────────── REGISTROS DEL DOMINIO ────────────────────
+# Cada registro se construye desde el diccionario tal y como está en Firestore (`desde_firestore`)
+# y se vuelve a convertir con `a_firestore`, que produce exactamente la estructura que escriben
+# los formularios, de modo que las escrituras por diferencias solo envían lo que cambia.
+
+def _lista(valor):
+    """Copia de una lista; cualquier otro valor se conserva tal cual para que `validar` lo rechace
+    (con `list()` un texto acabaría convertido en una lista de caracteres)."""
+    return list(valor) if isinstance(valor, list) else valor
+
+def _es_lista_de_textos(valor) -> bool:
+    return isinstance(valor, list) and all(isinstance(v, str) for v in valor)
+
+@dataclass(slots=True)
+class Idioma:
+    idioma: str
+    nivel: str
+
+    @classmethod
+    def desde_firestore(cls, datos: dict) -> "Idioma":
+        return cls(datos.get("Idioma", ""), datos.get("Nivel", ""))
+
+    def a_firestore(self) -> dict:
+        return {"Idioma": self.idioma, "Nivel": self.nivel}
+
+@dataclass(slots=True)
+class DatosPersonales:
+    nombre: str = ""
+    sexo: str = ""
+    edad: int = 0
+    estado_civil: str = ""
+    puesto_trabajo: str = ""
+    otros_datos: str = ""
+
+    @classmethod
+    def desde_firestore(cls, datos: dict) -> "DatosPersonales":
+        return cls(datos.get("nombre", ""), datos.get("sexo", ""), datos.get("edad", 0),
+                   datos.get("estado_civil", ""), datos.get("puesto_trabajo", ""), datos.get("otros_datos", ""))
+
+    def a_firestore(self) -> dict:
+        return {"nombre": self.nombre, "sexo": self.sexo, "edad": self.edad, "estado_civil": self.estado_civil,
+                "puesto_trabajo": self.puesto_trabajo, "otros_datos": self.otros_datos}
+
+@dataclass(slots=True)
+class Capacidades:
+    tecnicas: list[str] = field(default_factory=list)
+    soft: list[str] = field(default_factory=list)
+    idiomas: list[Idioma] = field(default_factory=list)
+
+    @classmethod
+    def desde_firestore(cls, datos: dict) -> "Capacidades":
+        idiomas = datos.get("Idiomas", [])
+        if isinstance(idiomas, list):
+            idiomas = [Idioma.desde_firestore(i) if isinstance(i, dict) else i for i in idiomas]
+        return cls(_lista(datos.get("Habilidades técnicas", [])), _lista(datos.get("Soft skills", [])), idiomas)
+
+    def a_firestore(self) -> dict:
+        return {"Habilidades técnicas": list(self.tecnicas), "Soft skills": list(self.soft),
+                "Idiomas": [i.a_firestore() for i in self.idiomas]}
+
+@dataclass(slots=True)
+class Relaciones:
+    esferas: dict[str, list[str]] = field(default_factory=dict)
+    formalidad: str = "Medio"
+    amistad: str = "Medio"
+    conflicto: str = "Medio"
+    otras: str = ""
+
+    @classmethod
+    def desde_firestore(cls, datos: dict) -> "Relaciones":
+        carac = datos.get("características", {})
+        return cls({k: _lista(v) for k, v in datos.get("esferas", {}).items()},
+                   carac.get("formalidad", "Medio"), carac.get("amistad", "Medio"),
+                   carac.get("conflicto", "Medio"), carac.get("otras", ""))
+
+    def a_firestore(self) -> dict:
+        return {"esferas": {k: list(v) for k, v in self.esferas.items()},
+                "características": {"formalidad": self.formalidad, "amistad": self.amistad,
+                                    "conflicto": self.conflicto, "otras": self.otras}}
+
+def _componentes_desde_firestore(datos: dict) -> list:
+    """Puntuaciones en el orden de COMPONENTES_TEMPERAMENTALES; None si falta alguna."""
+    ct = datos.get("componentes_temperamentales") or {}
+    return [ct.get(c) for c in COMPONENTES_TEMPERAMENTALES]
+
+def _componentes_a_firestore(componentes: list) -> dict:
+    return {c: v for c, v in zip(COMPONENTES_TEMPERAMENTALES, componentes) if v is not None}
+
+_CLAVES_PERFIL = ("datos_personales", "componentes_temperamentales", "capacidades")
+
+@dataclass(slots=True)
+class Perfil:
+    """Perfil del propio usuario (documento `usuarios/{uid}`)."""
+    datos_personales: DatosPersonales = field(default_factory=DatosPersonales)
+    # Una puntuación por componente, en el orden de COMPONENTES_TEMPERAMENTALES
+    componentes: list = field(default_factory=lambda: [None] * len(COMPONENTES_TEMPERAMENTALES))
+    capacidades: Capacidades = field(default_factory=Capacidades)
+    # Otros campos del documento que no gestiona la aplicación; se conservan tal cual
+    extra: dict = field(default_factory=dict)
+
+    @classmethod
+    def desde_firestore(cls, datos: dict) -> "Perfil":
+        return cls(DatosPersonales.desde_firestore(datos.get("datos_personales", {})),
+                   _componentes_desde_firestore(datos),
+                   Capacidades.desde_firestore(datos.get("capacidades", {})),
+                   {k: v for k, v in datos.items() if k not in _CLAVES_PERFIL})
+
+    def a_firestore(self) -> dict:
+        return {**self.extra,
+                "datos_personales": self.datos_personales.a_firestore(),
+                "componentes_temperamentales": _componentes_a_firestore(self.componentes),
+                "capacidades": self.capacidades.a_firestore()}
+
+    @property
+    def nombre(self) -> str:
+        return self.datos_personales.nombre
+
+@dataclass(slots=True)
+class Persona(Perfil):
+    """Persona de la red del usuario (documento de `usuarios/{uid}/sujetos`)."""
+    relaciones: Relaciones = field(default_factory=Relaciones)
+    id: str | None = None
+
+    @classmethod
+    def desde_firestore(cls, datos: dict, persona_id: str | None = None) -> "Persona":
+        return cls(DatosPersonales.desde_firestore(datos.get("datos_personales", {})),
+                   _componentes_desde_firestore(datos),
+                   Capacidades.desde_firestore(datos.get("capacidades", {})),
+                   {k: v for k, v in datos.items() if k not in _CLAVES_PERFIL + ("relaciones", "ID")},
+                   Relaciones.desde_firestore(datos.get("relaciones", {})),
+                   persona_id or datos.get("ID"))
+
+    def a_firestore(self) -> dict:
+        """Documento de Firestore, sin el ID."""
+        return {**Perfil.a_firestore(self), "relaciones": self.relaciones.a_firestore()}
+
+@dataclass(slots=True)
+class Memoria:
+    memoria: str
+    fecha_registro: datetime | None = None
+    id: str | None = None
+
+    @classmethod
+    def desde_firestore(cls, datos: dict, memoria_id: str | None = None) -> "Memoria":
+        return cls(datos.get("memoria", ""), a_fecha(datos.get("fecha_registro")), memoria_id or datos.get("id"))
+
+    def a_firestore(self) -> dict:
+        return {"memoria": self.memoria, "fecha_registro": self.fecha_registro}
+
+@dataclass(slots=True)
+class Resumen:
+    """Resumen de las memorias sobre una persona (documento de `usuarios/{uid}/resumenes`, con el ID de la persona)."""
+    persona_id: str
+    nombre: str
+    resumen: str
+    # Procedencia: IDs de las memorias resumidas, periodo que cubren y quién generó el resumen
+    memorias: list[str] = field(default_factory=list)
+    desde: datetime | None = None
+    hasta: datetime | None = None
+    resumidor: str = ""
+    fecha_generacion: datetime | None = None
+
+    @classmethod
+    def desde_firestore(cls, datos: dict, persona_id: str | None = None) -> "Resumen":
+        return cls(persona_id or datos.get("persona_id", ""), datos.get("nombre", ""), datos.get("resumen", ""),
+                   list(datos.get("memorias", [])), a_fecha(datos.get("desde")), a_fecha(datos.get("hasta")),
+                   datos.get("resumidor", ""), a_fecha(datos.get("fecha_generacion")))
+
+    def a_firestore(self) -> dict:
+        return {"persona_id": self.persona_id, "nombre": self.nombre, "resumen": self.resumen,
+                "memorias": list(self.memorias), "desde": self.desde, "hasta": self.hasta,
+                "resumidor": self.resumidor, "fecha_generacion": self.fecha_generacion}
+
+@dataclass(slots=True)
+class Turno:
+    """Mensaje de una conversación con el asistente."""
+    role: str
+    content: str
+    timestamp: datetime | None = None
+    # El prompt de conocimiento inicial va como primer mensaje, pero no se muestra ni se guarda
+    is_knowledge_prompt: bool = False
+
+    @classmethod
+    def desde_firestore(cls, datos: dict) -> "Turno":
+        return cls(datos.get("role", "user"), datos.get("content", ""), a_fecha(datos.get("timestamp")))
+
+    def a_firestore(self) -> dict:
+        datos = {"role": self.role, "content": self.content}
+        if self.timestamp:
+            datos["timestamp"] = self.timestamp
+        return datos
+
+# ─────────────────── VALIDACIÓN ────────────────────
+
+def validar(registro: Perfil) -> tuple[bool, str]:
+    """
+    Comprueba campos obligatorios, el rango de los componentes temperamentales y que
+    sexo, edad, niveles de idioma y características de la relación tengan valores admitidos,
+    de una persona o del perfil del usuario.
+    """
+    dp = registro.datos_personales
+    if not isinstance(dp.nombre, str) or not dp.nombre.strip():
+        return False, "El nombre es obligatorio y debe ser un texto."
+    for campo in ("estado_civil", "puesto_trabajo", "otros_datos"):
+        if not isinstance(getattr(dp, campo), str):
+            return False, f"El campo '{campo}' debe ser un texto."
+    if dp.sexo not in SEXOS:
+        return False, f"El sexo debe ser uno de: {', '.join(s for s in SEXOS if s)} (o vacío)."
+    if isinstance(dp.edad, bool) or not isinstance(dp.edad, int) or not (0 <= dp.edad <= EDAD_MAXIMA):
+        return False, f"La edad debe ser un número entero entre 0 y {EDAD_MAXIMA}."
+
+    if any(v is None for v in registro.componentes):
+        return False, "Faltan puntajes temperamentales. Deben ser 7."
+    for comp, v in zip(COMPONENTES_TEMPERAMENTALES, registro.componentes):
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or not (0 <= v <= PUNTUACION_MAXIMA):
+            return False, f"El valor de '{comp}' debe ser un número entre 0 y {PUNTUACION_MAXIMA}."
+
+    caps = registro.capacidades
+    for campo, valores in (("Habilidades técnicas", caps.tecnicas), ("Soft skills", caps.soft)):
+        if not _es_lista_de_textos(valores):
+            return False, f"'{campo}' debe ser una lista de textos."
+    if not isinstance(caps.idiomas, list) or not all(isinstance(i, Idioma) for i in caps.idiomas):
+        return False, "'Idiomas' debe ser una lista de objetos con 'Idioma' y 'Nivel'."
+    for idioma in caps.idiomas:
+        if not isinstance(idioma.idioma, str) or not idioma.idioma.strip():
+            return False, "Cada idioma debe tener un nombre."
+        if idioma.nivel not in NIVELES_IDIOMA:
+            return False, f"El nivel de '{idioma.idioma}' debe ser uno de: {', '.join(NIVELES_IDIOMA)}."
+
+    if isinstance(registro, Persona):
+        rel = registro.relaciones
+        for esfera, roles in rel.esferas.items():
+            if not _es_lista_de_textos(roles):
+                return False, f"La esfera '{esfera}' debe ser una lista de textos."
+        if not isinstance(rel.otras, str):
+            return False, "Las otras características de la relación deben ser un texto."
+        for campo in ("formalidad", "amistad", "conflicto"):
+            if getattr(rel, campo) not in NIVELES_RELACION:
+                return False, f"El valor de '{campo}' debe ser uno de: {', '.join(NIVELES_RELACION)}."
+    return True, ""
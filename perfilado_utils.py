@@ -0,0 +1,214 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# perfilado_utils.py
+"""Perfilado bajo demanda del siguiente rerun de una página, sin redesplegar.
+
+Un hilo muestrea cada INTERVALO_MUESTREO la pila del hilo que ejecuta el script de la página y
+se detiene solo cuando el script termina (también con st.stop o st.rerun). El resultado se
+descarga en formato speedscope (https://www.speedscope.app, con vista de flame graph) o como pilas
+plegadas para flamegraph.pl. Los marcos de código de Firestore, GCS y Gemini se anotan con el
+nombre del servicio.
+
+Solo pueden perfilar los usuarios de PERFILADO_USUARIOS, y el control de la barra lateral solo
+aparece tras abrir cualquier página con `?perfilar` en la URL.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+
+import streamlit as st
+
+INTERVALO_MUESTREO = 0.005  # segundos
+# Un rerun que dure más se corta aquí (p. ej. si la página queda esperando)
+DURACION_MAXIMA = 300
+# IDs de usuario separados por comas; sin definir, nadie puede perfilar
+USUARIOS_PERFILADO = {u.strip() for u in os.getenv("PERFILADO_USUARIOS", "").split(",") if u.strip()}
+PARAMETRO_PERFILADO = "perfilar"
+
+# Servicio externo al que pertenece un marco, según fragmentos de la ruta de su fichero
+SERVICIOS = {
+    "Firestore": ("google/cloud/firestore", "firebase_admin/", "/almacen_utils.py"),
+    "GCS": ("/gcsfs/", "google/cloud/storage", "/gcs_utils.py"),
+    "Gemini": ("google/genai/",),
+}
+
+def servicio_de(fichero: str) -> str | None:
+    """Servicio (Firestore, GCS, Gemini) al que pertenece el código de un fichero, o None."""
+    fichero = fichero.replace("\\", "/")
+    for servicio, fragmentos in SERVICIOS.items():
+        if any(f in fichero for f in fragmentos):
+            return servicio
+    return None
+
+# ─────────────────── PERFILADOR DE MUESTREO ────────────────────
+
+class PerfiladorMuestreo:
+    """Perfilador de muestreo del hilo que llama a `iniciar`.
+
+    Cada muestra es la pila (de la raíz a la hoja) de ese hilo, con el tiempo transcurrido desde la
+    muestra anterior como peso. Si se indica el código raíz (el del script de la página), las pilas
+    empiezan en él y el perfilado termina en cuanto deja de estar en la pila.
+    """
+
+    def __init__(self, nombre: str, intervalo: float = INTERVALO_MUESTREO, duracion_maxima: float = DURACION_MAXIMA):
+        self.nombre = nombre
+        self.intervalo = intervalo
+        self.duracion_maxima = duracion_maxima
+        self.inicio: datetime | None = None
+        self.marcos: list[dict] = []
+        self._indices: dict[tuple, int] = {}
+        self.muestras: list[list[int]] = []
+        self.pesos: list[float] = []  # ms
+        self.terminado = threading.Event()
+        self._parar = threading.Event()
+        self._hilo: threading.Thread | None = None
+
+    def iniciar(self, codigo_raiz=None) -> None:
+        self.inicio = datetime.now()
+        self._hilo = threading.Thread(target=self._muestrear, args=(threading.get_ident(), codigo_raiz),
+                                      name=f"perfilado-{self.nombre}", daemon=True)
+        self._hilo.start()
+
+    def detener(self) -> None:
+        self._parar.set()
+        if self._hilo is not None and self._hilo is not threading.current_thread():
+            self._hilo.join()
+
+    def _indice(self, codigo) -> int:
+        clave = (getattr(codigo, "co_qualname", codigo.co_name), codigo.co_filename, codigo.co_firstlineno)
+        indice = self._indices.get(clave)
+        if indice is None:
+            nombre, fichero, linea = clave
+            servicio = servicio_de(fichero)
+            indice = self._indices[clave] = len(self.marcos)
+            self.marcos.append({"name": f"[{servicio}] {nombre}" if servicio else nombre,
+                                "file": fichero, "line": linea})
+        return indice
+
+    def _muestrear(self, hilo_id: int, codigo_raiz) -> None:
+        comienzo = anterior = time.perf_counter()
+        try:
+            while not self._parar.wait(self.intervalo):
+                marco = sys._current_frames().get(hilo_id)
+                instante = time.perf_counter()
+                pila = []
+                while marco is not None:
+                    pila.append(marco.f_code)
+                    marco = marco.f_back
+                pila.reverse()
+                if codigo_raiz is not None:
+                    if codigo_raiz not in pila:
+                        break  # el script ha terminado (o el hilo ya no existe)
+                    pila = pila[pila.index(codigo_raiz):]
+                if not pila:
+                    break
+                self.muestras.append([self._indice(c) for c in pila])
+                self.pesos.append((instante - anterior) * 1000)
+                anterior = instante
+                if instante - comienzo > self.duracion_maxima:
+                    break
+        finally:
+            self.terminado.set()
+
+    # ─────────────────── RESULTADOS ────────────────────
+
+    @property
+    def duracion_ms(self) -> float:
+        return sum(self.pesos)
+
+    def tiempo_por_servicio(self) -> dict[str, float]:
+        """Milisegundos de muestras dentro de cada servicio (el más externo de la pila, si hay varios)."""
+        tiempos = dict.fromkeys(SERVICIOS, 0.0)
+        for muestra, peso in zip(self.muestras, self.pesos):
+            for indice in muestra:
+                servicio = servicio_de(self.marcos[indice]["file"])
+                if servicio:
+                    tiempos[servicio] += peso
+                    break
+        return tiempos
+
+    def a_speedscope(self) -> dict:
+        """Perfil en el formato de fichero de speedscope (perfil "sampled" en milisegundos)."""
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": self.nombre,
+            "exporter": "perfilado_utils",
+            "shared": {"frames": self.marcos},
+            "profiles": [{
+                "type": "sampled",
+                "name": f"{self.nombre} ({self.inicio:%Y-%m-%d %H:%M:%S})" if self.inicio else self.nombre,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": self.duracion_ms,
+                "samples": self.muestras,
+                "weights": self.pesos,
+            }],
+        }
+
+    def a_pilas_plegadas(self) -> str:
+        """Pilas plegadas (`raíz;...;hoja microsegundos`) para flamegraph.pl o inferno."""
+        totales: dict[str, float] = {}
+        for muestra, peso in zip(self.muestras, self.pesos):
+            pila = ";".join(self.marcos[i]["name"].replace(";", ",") for i in muestra)
+            totales[pila] = totales.get(pila, 0.0) + peso
+        return "".join(f"{pila} {round(ms * 1000)}\n" for pila, ms in totales.items())
+
+# ─────────────────── CONTROL EN LAS PÁGINAS ────────────────────
+
+@dataclass
+class EstadoPerfilado:
+    """Perfilado de una sesión: si el siguiente rerun se perfila y el último perfil obtenido."""
+    armado: bool = False
+    # El rerun que provoca el propio control no es el que se quiere medir
+    omitir_rerun: bool = False
+    perfilador: PerfiladorMuestreo | None = None
+
+def puede_perfilar(user_id: str | None) -> bool:
+    return user_id in USUARIOS_PERFILADO
+
+def _armar(estado: EstadoPerfilado) -> None:
+    estado.armado = st.session_state["_perfilar_siguiente"]
+    estado.omitir_rerun = True
+
+def perfilar_pagina(user_id: str | None, pagina: str) -> None:
+    """Perfila este rerun si estaba pedido y muestra el control en la barra lateral.
+
+    Se llama desde el script de cada página, justo después del control de acceso: las muestras
+    empiezan en el script que llama a esta función.
+    """
+    if not puede_perfilar(user_id):
+        return
+    if PARAMETRO_PERFILADO in st.query_params:
+        st.session_state._perfilado_visible = True
+    if not st.session_state.get("_perfilado_visible"):
+        return
+    estado = st.session_state.get("_perfilado")
+    if estado is None:
+        estado = st.session_state._perfilado = EstadoPerfilado()
+
+    if estado.armado and not estado.omitir_rerun:
+        estado.armado = False
+        st.session_state._perfilar_siguiente = False
+        estado.perfilador = PerfiladorMuestreo(pagina)
+        estado.perfilador.iniciar(sys._getframe(1).f_code)
+    estado.omitir_rerun = False
+
+    with st.sidebar:
+        st.toggle("⏱️ Perfilar el siguiente rerun", key="_perfilar_siguiente", on_change=_armar, args=(estado,),
+                  help="Se muestrea la siguiente interacción con cualquier página; el resultado aparece aquí después.")
+        perfilador = estado.perfilador
+        if perfilador is None or not perfilador.terminado.is_set():
+            return
+        servicios = ", ".join(f"{s} {ms:,.0f} ms" for s, ms in perfilador.tiempo_por_servicio().items())
+        st.caption(f"Último perfil: {perfilador.nombre}, {perfilador.duracion_ms:,.0f} ms en "
+                   f"{len(perfilador.muestras)} muestras ({servicios}).")
+        fichero = f"perfil_{perfilador.nombre.replace(' ', '_')}_{perfilador.inicio:%Y%m%d_%H%M%S}"
+        st.download_button("Descargar (speedscope)", json.dumps(perfilador.a_speedscope()),
+                           file_name=f"{fichero}.speedscope.json", mime="application/json", use_container_width=True)
+        st.download_button("Descargar (pilas plegadas)", perfilador.a_pilas_plegadas(),
+                           file_name=f"{fichero}.folded", mime="text/plain", use_container_width=True)
@@ -0,0 +1,166 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# personas_utils.py
+import threading
+from copy import deepcopy
+from typing import Callable, Iterator
+
+# ─────────────────── CONSTANTES COMUNES ────────────────────
+
+COMPONENTES_TEMPERAMENTALES = ["Normaloide", "Histeroide", "Mánico", "Depresivo",
+                               "Autístico", "Paranoide", "Epileptoide"]
+
+ESFERAS_BASE = {
+    "laboral":     ["Jefe", "Subordinado", "Colega", "Mentor", "Cliente", "Proveedor", "Socio"],
+    "familiar":    ["Padre", "Madre", "Hijo", "Hija", "Hermano", "Hermana",
+                     "Sobrino", "Sobrina", "Abuelo", "Abuela", "Nieto", "Nieta", "Tío", "Tía", "Primo", "Prima"],
+    "sentimental": ["Pareja", "Novio", "Novia", "Esposo", "Esposa", "Ex-pareja"],
+    "académica":   ["Profesor", "Alumno", "Tutor", "Compañero", "Mentor", "Mentee"],
+    "asistencial": ["Cuidador", "Paciente", "Médico", "Terapeuta", "Enfermero", "Asistente social"],
+    "contractual": ["Cliente", "Proveedor", "Socio", "Consultor", "Prestamista",
+                     "Inspector", "Becario", "Empleado", "Contratista", "Arrendador", "Arrendatario"],
+}
+
+NIVELES_RELACION = ["Muy bajo", "Bajo", "Medio", "Alto", "Muy alto"]
+
+SOFT_SKILLS_BASE = [
+    "Trabajo en equipo", "Comunicación", "Liderazgo",
+    "Gestión del tiempo", "Resolución de conflictos",
+    "Pensamiento crítico", "Adaptabilidad", "Creatividad",
+    "Organización", "Negociación", "Inteligencia Emocional",
+    "Proactividad", "Orientación al cliente"
+]
+IDIOMAS_BASE     = [
+    "Español", "Inglés", "Francés", "Alemán", "Italiano",
+    "Portugués", "Chino", "Japonés", "Árabe", "Ruso",
+    "Catalán", "Gallego", "Euskera", "Polaco"
+]
+
+NIVELES_IDIOMA   = [
+    "Conocimiento bajo", "Básico", "Intermedio",
+    "Avanzado", "Hablante nativo"
+]
+
+SEXOS = ["", "Varón", "Mujer"]
+EDAD_MAXIMA = 120
+
+# ─────────────────── ALMACÉN LOCAL DE PERSONAS ────────────────────
+
+class PersonasStore:
+    """Almacén local de personas indexado por el ID de documento de Firestore.
+
+    Las escrituras se aplican primero en local (actualización optimista) y después se
+    ejecuta la escritura remota; si esta falla, se deshace el cambio local y se relanza el error.
+    El almacén puede recibir también cambios desde los listeners de Firestore (otro hilo).
+    Otras estructuras derivadas (matrices, índices) pueden suscribirse a cada cambio.
+    """
+
+    def __init__(self, personas: list[dict] | None = None):
+        self._personas: dict[str, dict] = {}
+        self._lock = threading.RLock()
+        self._observadores: list[Callable[[str, dict | None], None]] = []
+        # Se incrementa con cada cambio; permite cachear cálculos derivados por versión
+        self.version = 0
+        if personas:
+            self.cargar(personas)
+
+    def __contains__(self, persona_id: str) -> bool:
+        return persona_id in self._personas
+
+    def __len__(self) -> int:
+        return len(self._personas)
+
+    def __iter__(self) -> Iterator[dict]:
+        with self._lock:
+            return iter(list(self._personas.values()))
+
+    # --- Notificación de cambios ---
+    def suscribir(self, observador: Callable[[str, dict | None], None]) -> None:
+        """Registra `observador(persona_id, persona)` y le entrega las personas ya cargadas.
+
+        Se le llama tras cada cambio; `persona` es None cuando la persona se retira.
+        """
+        with self._lock:
+            self._observadores.append(observador)
+            for persona_id, persona in self._personas.items():
+                observador(persona_id, persona)
+
+    def _poner(self, persona_id: str, persona: dict) -> None:
+        with self._lock:
+            self._personas[persona_id] = persona
+            self.version += 1
+            for observador in self._observadores:
+                observador(persona_id, persona)
+
+    def _quitar(self, persona_id: str) -> dict | None:
+        with self._lock:
+            anterior = self._personas.pop(persona_id, None)
+            if anterior is not None:
+                self.version += 1
+                for observador in self._observadores:
+                    observador(persona_id, None)
+            return anterior
+
+    # --- Lectura ---
+    def get(self, persona_id: str) -> dict | None:
+        """Devuelve la persona con ese ID o None si no está cargada."""
+        return self._personas.get(persona_id)
+
+    def cargar(self, personas: list[dict]) -> None:
+        """Inserta o reemplaza personas leídas de Firestore (deben incluir la clave "ID")."""
+        with self._lock:
+            for persona in personas:
+                self._poner(persona["ID"], persona)
+
+    def retirar(self, persona_id: str) -> None:
+        """Retira una persona borrada en Firestore, sin escribir nada."""
+        self._quitar(persona_id)
+
+    def nombre(self, persona_id: str) -> str:
+        """Nombre de la persona, usado para ordenar igual que Firestore."""
+        persona = self._personas.get(persona_id, {})
+        return persona.get("datos_personales", {}).get("nombre", "")
+
+    def ids_ordenados(self) -> list[str]:
+        """IDs de todas las personas ordenados por nombre."""
+        with self._lock:
+            return sorted(self._personas, key=self.nombre)
+
+    # --- Escrituras optimistas ---
+    def crear(self, persona_id: str, persona: dict, escribir: Callable[[], object]) -> dict:
+        """Añade la persona en local y ejecuta `escribir`; si falla, la retira."""
+        nueva = {**deepcopy(persona), "ID": persona_id}
+        self._poner(persona_id, nueva)
+        try:
+            escribir()
+        except Exception:
+            self._quitar(persona_id)
+            raise
+        return nueva
+
+    def actualizar(self, persona_id: str, persona: dict, escribir: Callable[[], object]) -> dict:
+        """Reemplaza la persona en local y ejecuta `escribir`; si falla, restaura la versión anterior."""
+        actualizada = {**deepcopy(persona), "ID": persona_id}
+        with self._lock:
+            anterior = self._personas.get(persona_id)
+            self._poner(persona_id, actualizada)
+        try:
+            escribir()
+        except Exception:
+            if anterior is None:
+                self._quitar(persona_id)
+            else:
+                self._poner(persona_id, anterior)
+            raise
+        return actualizada
+
+    def eliminar(self, persona_id: str, escribir: Callable[[], object]) -> None:
+        """Retira la persona en local y ejecuta `escribir`; si falla, la vuelve a insertar."""
+        anterior = self._quitar(persona_id)
+        try:
+            escribir()
+        except Exception:
+            if anterior is not None:
+                self._poner(persona_id, anterior)
+            raise
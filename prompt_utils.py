@@ -0,0 +1,296 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# prompt_utils.py
+import json
+import math
+import os
+import re
+from typing import Iterator
+
+from fechas_utils import formatear_fecha
+from personas_utils import COMPONENTES_TEMPERAMENTALES
+from reglas_utils import TablasComponentes, componentes_dominantes
+
+# Formato de los datos de Firestore en el prompt: "compacto" (por defecto) o "json" (el original)
+FORMATO_PROMPT = os.getenv("PROMPT_FORMATO", "compacto")
+
+TABLAS_COMPONENTES = "conocimiento/tablas_componentes.json"
+DEFINICION_SUJETOS = "conocimiento/definicion_info_sujetos.txt"
+
+# A partir de este número de personas el prompt solo lleva una lista de nombres (sin resúmenes) y las memorias más
+# recientes; el modelo consulta el resto con las funciones consultar_persona y buscar_memorias
+UMBRAL_BAJO_DEMANDA = int(os.getenv("PROMPT_BAJO_DEMANDA", "50"))
+MEMORIAS_BAJO_DEMANDA = 30
+
+# Recursos estáticos de GCS, en el orden en que aparecen en el prompt
+RECURSOS_ESTATICOS = [
+    ("conocimiento/instrucciones_LLM.txt", "n instrucciones de comportamiento para el LLM"),
+    ("conocimiento/info_factorCT.txt", " información sobre el trato de personas según el modelo comportamental (Factor CT)"),
+    (TABLAS_COMPONENTES, "n las pautas de las tablas de Componentes Temperamentales, que indican cómo tratar a las personas para diferentes objetivos según sus componentes, que aplican a los componentes dominantes del usuario, y los componentes dominantes de las personas con las que se relaciona"),
+    (DEFINICION_SUJETOS, " el esquema de los datos de personas. Cada persona que ha caracterizado este usuario tiene los siguientes campos"),
+]
+
+# ─────────────────── SERIALIZADORES ────────────────────
+
+class SerializadorJSON:
+    """Formato original: JSON indentado, con todas las claves y campos vacíos."""
+
+    nombre = "json"
+
+    def perfil(self, perfil: dict) -> str:
+        return json.dumps(perfil, ensure_ascii=False, indent=2)
+
+    def personas(self, personas: list[dict]) -> str:
+        return json.dumps(personas, ensure_ascii=False, indent=2)
+
+    def memorias(self, memorias: list[dict]) -> str:
+        return json.dumps(memorias, ensure_ascii=False, indent=2, default=formatear_fecha)
+
+    def resumenes(self, resumenes: list[dict]) -> str:
+        return json.dumps([{"persona": r.get("nombre", ""), "desde": r.get("desde"), "hasta": r.get("hasta"),
+                            "resumen": r.get("resumen", "")} for r in resumenes],
+                          ensure_ascii=False, indent=2, default=formatear_fecha)
+
+    def leyenda(self) -> str:
+        """Explicación del formato, que se añade una sola vez tras el esquema de datos de personas."""
+        return ""
+
+    def lista_personas(self, personas: list[dict]) -> str:
+        """Una línea por persona con su nombre, su puesto y sus roles; igual en todos los formatos."""
+        lineas = []
+        for p in personas:
+            datos = p.get("datos_personales", {})
+            roles = [rol for roles in p.get("relaciones", {}).get("esferas", {}).values() for rol in roles]
+            puesto = f" ({_escalar(datos['puesto_trabajo'])})" if datos.get("puesto_trabajo") else ""
+            lineas.append(f"- {_escalar(datos.get('nombre', 'Sin nombre'))}{puesto}"
+                          + (f": {', '.join(roles)}" if roles else ""))
+        return "\n".join(lineas)
+
+# Abreviaturas de las claves que se repiten en cada persona
+ABREVIATURAS = {
+    "datos_personales": "dp",
+    "estado_civil": "ec",
+    "puesto_trabajo": "puesto",
+    "otros_datos": "otros",
+    "capacidades": "cap",
+    "Habilidades técnicas": "tec",
+    "Soft skills": "soft",
+    "Idiomas": "idi",
+    "relaciones": "rel",
+    "esferas": "esf",
+    "características": "car",
+    "formalidad": "form",
+    "amistad": "amis",
+    "conflicto": "conf",
+}
+SIGLAS_COMPONENTES = {
+    "Normaloide": "Nor", "Histeroide": "His", "Mánico": "Man", "Depresivo": "Dep",
+    "Autístico": "Aut", "Paranoide": "Par", "Epileptoide": "Epi",
+}
+
+def _vacio(valor) -> bool:
+    return valor is None or valor == "" or valor == [] or valor == {}
+
+def _escalar(valor) -> str:
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return " ".join(str(valor).split())  # sin saltos de línea
+
+def _compactar(valor) -> str:
+    """Representación en una línea de un valor, sin campos vacíos y con claves abreviadas."""
+    if isinstance(valor, dict):
+        if set(valor) == {"Idioma", "Nivel"}:
+            return f"{valor['Idioma']} ({valor['Nivel']})"
+        partes = []
+        for clave, v in valor.items():
+            compacto = "" if _vacio(v) else _compactar(v)
+            if not compacto:
+                continue
+            clave = ABREVIATURAS.get(clave, clave)
+            anidado = isinstance(v, dict) and set(v) != {"Idioma", "Nivel"}
+            partes.append(f"{clave}{{{compacto}}}" if anidado else f"{clave}={compacto}")
+        return "; ".join(partes)
+    if isinstance(valor, list):
+        return ", ".join(_compactar(v) for v in valor if not _vacio(v))
+    return _escalar(valor)
+
+class SerializadorCompacto(SerializadorJSON):
+    """Formato compacto: una tabla de puntuaciones y una línea por persona sin campos vacíos."""
+
+    nombre = "compacto"
+
+    @staticmethod
+    def _fila_componentes(nombre: str, ct: dict) -> str:
+        return "|".join([nombre] + [_escalar(ct.get(c, "")) for c in COMPONENTES_TEMPERAMENTALES])
+
+    @staticmethod
+    def _resto(datos: dict) -> str:
+        """Todos los campos salvo el nombre, los componentes y el ID de documento."""
+        resto = {k: v for k, v in datos.items() if k not in ("componentes_temperamentales", "ID")}
+        if "datos_personales" in resto:
+            resto["datos_personales"] = {k: v for k, v in resto["datos_personales"].items() if k != "nombre"}
+        return _compactar(resto)
+
+    def _cabecera(self) -> str:
+        return "|".join(["nombre"] + [SIGLAS_COMPONENTES[c] for c in COMPONENTES_TEMPERAMENTALES])
+
+    def perfil(self, perfil: dict) -> str:
+        nombre = perfil.get("datos_personales", {}).get("nombre", "")
+        if perfil.get("componentes_temperamentales"):
+            lineas = [self._cabecera(), self._fila_componentes(nombre, perfil["componentes_temperamentales"])]
+        else:
+            lineas = [f"nombre={nombre}"]
+        resto = self._resto(perfil)
+        if resto:
+            lineas.append(resto)
+        return "\n".join(lineas)
+
+    def personas(self, personas: list[dict]) -> str:
+        nombres = [p.get("datos_personales", {}).get("nombre", "Sin nombre") for p in personas]
+        lineas = ["Puntuaciones de componentes temperamentales (una fila por persona):", self._cabecera()]
+        lineas += [self._fila_componentes(n, p.get("componentes_temperamentales", {}))
+                   for n, p in zip(nombres, personas)]
+        lineas.append("Resto de datos de cada persona:")
+        lineas += [f"- {n}: {self._resto(p)}" for n, p in zip(nombres, personas)]
+        return "\n".join(lineas)
+
+    def memorias(self, memorias: list[dict]) -> str:
+        return "\n".join(f"- [{formatear_fecha(m.get('fecha_registro'))}] {_escalar(m.get('memoria', ''))}"
+                         for m in memorias)
+
+    def resumenes(self, resumenes: list[dict]) -> str:
+        return "\n".join(f"- {r.get('nombre', '')} [{formatear_fecha(r.get('desde'))}–{formatear_fecha(r.get('hasta'))}]: "
+                         f"{_escalar(r.get('resumen', ''))}"
+                         for r in resumenes)
+
+    def leyenda(self) -> str:
+        abreviaturas = ", ".join(f"{a} = {c}" for c, a in ABREVIATURAS.items())
+        siglas = ", ".join(f"{s} = {c}" for c, s in SIGLAS_COMPONENTES.items())
+        return (
+            "Los datos del usuario y de sus personas se presentan en formato compacto: las puntuaciones de "
+            "componentes temperamentales en una tabla separada por '|', y el resto de campos en una línea por "
+            "persona como clave=valor separados por ';', con los grupos de campos entre llaves y los campos "
+            "vacíos omitidos.\n"
+            f"Abreviaturas de campos: {abreviaturas}.\n"
+            f"Siglas de componentes: {siglas}."
+        )
+
+SERIALIZADORES = {s.nombre: s for s in (SerializadorJSON, SerializadorCompacto)}
+
+def get_serializador(nombre: str | None = None) -> SerializadorJSON:
+    """Serializador registrado con ese nombre (por defecto, el de PROMPT_FORMATO)."""
+    return SERIALIZADORES.get(nombre or FORMATO_PROMPT, SerializadorCompacto)()
+
+# ─────────────────── CONSTRUCCIÓN DEL PROMPT ────────────────────
+
+def estimar_tokens(texto: str) -> int:
+    """Estimación local del número de tokens, sin llamar al modelo.
+
+    Cuenta cada palabra como un token por cada 4 caracteres, cada signo como un token y cada
+    bloque de espacios de más de un carácter (indentación) como un token.
+    """
+    tokens = 0
+    for pieza in re.findall(r"\w+|[^\w\s]|\s{2,}", texto):
+        tokens += math.ceil(len(pieza) / 4) if pieza[0].isalnum() or pieza[0] == "_" else 1
+    return tokens
+
+def extracto_tablas(contenido: str, tablas: TablasComponentes | None, perfil: dict, sujetos: list[dict],
+                    bajo_demanda: bool = False) -> str:
+    """Pautas de las tablas que aplican al usuario y componentes dominantes de sus personas; si no se
+    reconoce la estructura de las tablas, se devuelve el JSON completo.
+
+    Con `bajo_demanda` solo se indican los componentes dominantes y las pautas del usuario: las de cada
+    persona van en su ficha (consultar_persona). Sin él, el prompt lleva las pautas de todas.
+    """
+    if tablas is None or not tablas.reconocidas:
+        return contenido
+    personas = [("Usuario", (perfil or {}).get("componentes_temperamentales"))]
+    personas += [(s.get("datos_personales", {}).get("nombre", "Sin nombre"), s.get("componentes_temperamentales"))
+                 for s in sujetos]
+    if bajo_demanda:
+        return tablas.extracto(personas, listadas=1)
+    return tablas.extracto(personas, con_pautas=len(personas))
+
+def contexto_bajo_demanda(num_personas: int) -> bool:
+    """True si el prompt debe llevar solo la lista de personas y las memorias recientes."""
+    return num_personas >= UMBRAL_BAJO_DEMANDA
+
+def secciones_prompt(estaticos: dict[str, str], perfil: dict, sujetos: list[dict], memorias: list[dict],
+                     serializador: SerializadorJSON | None = None,
+                     tablas: TablasComponentes | None = None,
+                     resumenes: list[dict] | None = None,
+                     bajo_demanda: bool = False) -> Iterator[tuple[str, str]]:
+    """Secciones (nombre, texto) del prompt de conocimiento inicial, en orden; ver construir_prompt.
+
+    Cada sección se construye al pedirla, así que se puede medir por separado lo que cuesta
+    (benchmarks/bench_prompt_regresion.py). Los recursos estáticos se nombran por su ruta.
+    """
+    serializador = serializador or get_serializador()
+    leyenda = serializador.leyenda()
+
+    for rel_path, desc in RECURSOS_ESTATICOS:
+        content = estaticos.get(rel_path)
+        if not content:
+            continue
+        if rel_path == TABLAS_COMPONENTES:
+            content = extracto_tablas(content, tablas, perfil, sujetos, bajo_demanda)
+        elif rel_path == DEFINICION_SUJETOS and leyenda:
+            content += "\n\n" + leyenda
+            leyenda = ""
+        yield rel_path, f"\nA continuación se presenta{desc}:\n{content}"
+    if leyenda:
+        yield "leyenda", f"\n{leyenda}"
+
+    if perfil:
+        yield "perfil", ("\nA continuación se presenta información sobre el usuario que te escribe e interactúa contigo:\n"
+                         + serializador.perfil(perfil))
+    if sujetos and bajo_demanda:
+        yield "personas", ("\nEstas son las personas con las que se relaciona el usuario. Antes de hablar de cualquiera de ellas, "
+                           "consulta su ficha completa (datos, componentes temperamentales y resumen de memorias) con la función consultar_persona:\n"
+                           + serializador.lista_personas(sujetos))
+    elif sujetos:
+        yield "personas", ("\nA continuación se presenta información sobre las personas con las que se relaciona el usuario, rellenada por el propio usuario:\n"
+                           + serializador.personas(sujetos))
+    # Con la lista de personas, el resumen de cada una va en su ficha
+    if resumenes and not bajo_demanda:
+        yield "resumenes", ("\nEstos son los resúmenes, por persona, de las memorias que has guardado como LLM en interacciones anteriores con el usuario (con el periodo que cubren). Debes tenerlos en cuenta a la hora de responder:\n"
+                            + serializador.resumenes(resumenes))
+    if memorias and bajo_demanda and len(memorias) > MEMORIAS_BAJO_DEMANDA:
+        yield "memorias", (f"\nPor último, estas son las {MEMORIAS_BAJO_DEMANDA} memorias más recientes de las {len(memorias)} que has guardado como LLM en interacciones anteriores con el usuario y que no cubre ningún resumen. Busca las demás con la función buscar_memorias cuando puedan ser relevantes:\n"
+                           + serializador.memorias(memorias[-MEMORIAS_BAJO_DEMANDA:]))
+    elif memorias:
+        yield "memorias", ("\nPor último, estas son las memorias que has guardado como LLM en interacciones anteriores con el usuario. Debes tenerlas en cuenta a la hora de responder:\n"
+                           + serializador.memorias(memorias))
+
+def ficha_persona(persona: dict, resumen: dict | None = None, serializador: SerializadorJSON | None = None,
+                  tablas: TablasComponentes | None = None) -> str:
+    """Datos completos de una persona, sus componentes dominantes con sus pautas de las tablas y el
+    resumen de sus memorias (consultar_persona)."""
+    serializador = serializador or get_serializador()
+    partes = [serializador.personas([{k: v for k, v in persona.items() if k != "ID"}])]
+    ct = persona.get("componentes_temperamentales") or {}
+    dominantes = componentes_dominantes(ct)
+    if dominantes:
+        partes.append(f"Componentes dominantes: {', '.join(dominantes)}")
+        pautas = tablas.pautas_persona(ct) if tablas is not None and tablas.reconocidas else ""
+        if pautas:
+            partes.append(pautas)
+    if resumen:
+        partes.append("Resumen de las memorias sobre esta persona:\n" + serializador.resumenes([resumen]))
+    return "\n\n".join(partes)
+
+def construir_prompt(estaticos: dict[str, str], perfil: dict, sujetos: list[dict], memorias: list[dict],
+                     serializador: SerializadorJSON | None = None,
+                     tablas: TablasComponentes | None = None,
+                     resumenes: list[dict] | None = None,
+                     bajo_demanda: bool = False) -> str:
+    """Prompt de conocimiento inicial a partir de los recursos estáticos (ruta -> contenido) y los datos del usuario.
+
+    `resumenes` son los resúmenes por persona de las memorias compactadas; `memorias`, las que no
+    cubre ningún resumen, de la más antigua a la más reciente. Con `bajo_demanda`, de las personas solo
+    va una lista, sin sus resúmenes, y de las memorias las MEMORIAS_BAJO_DEMANDA más recientes. Los
+    recursos vacíos o ausentes y las secciones de Firestore sin datos se omiten.
+    """
+    return "\n\n".join(texto for _, texto in secciones_prompt(estaticos, perfil, sujetos, memorias,
+                                                                serializador, tablas, resumenes, bajo_demanda))
@@ -0,0 +1,148 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# reglas_utils.py
+import json
+from dataclasses import dataclass
+
+from indice_utils import normalizar
+from personas_utils import COMPONENTES_TEMPERAMENTALES
+
+# Número de componentes con mayor puntuación que se consideran dominantes siempre
+COMPONENTES_DOMINANTES = 2
+# Además, cualquier componente con al menos esta puntuación también es dominante
+UMBRAL_DOMINANTE = 12.0
+
+# Comienzos de palabra (normalizados) de cada componente; admite variantes ("Maníaco", "autista"...)
+_RAICES = {
+    "Normaloide": ("normaloid",),
+    "Histeroide": ("histeroid", "histeric"),
+    "Mánico": ("manic", "maniac"),
+    "Depresivo": ("depresiv",),
+    "Autístico": ("autistic", "autista"),
+    "Paranoide": ("paranoid", "paranoic"),
+    "Epileptoide": ("epileptoid",),
+}
+
+def componente_de(texto) -> str | None:
+    """Nombre canónico del componente al que se refiere `texto`, o None."""
+    if not isinstance(texto, str):
+        return None
+    for palabra in normalizar(texto).replace("_", " ").split():
+        for componente, raices in _RAICES.items():
+            if palabra.startswith(raices):
+                return componente
+    return None
+
+def componentes_dominantes(ct: dict) -> list[str]:
+    """Componentes dominantes de una persona: los de mayor puntuación y los que superan el umbral."""
+    puntuaciones = [(float(ct.get(c, 0) or 0), c) for c in COMPONENTES_TEMPERAMENTALES]
+    puntuaciones.sort(key=lambda x: -x[0])
+    dominantes = [c for i, (p, c) in enumerate(puntuaciones)
+                  if p > 0 and (i < COMPONENTES_DOMINANTES or p >= UMBRAL_DOMINANTE)]
+    return dominantes
+
+# ─────────────────── TABLAS DE COMPONENTES INDEXADAS ────────────────────
+
+@dataclass(frozen=True, slots=True)
+class Pauta:
+    componente: str | None
+    ruta: tuple[str, ...]  # claves de la tabla hasta la pauta (objetivo, apartado...), sin el componente
+    texto: str
+
+class TablasComponentes:
+    """Tablas de Componentes Temperamentales (`tablas_componentes.json`) indexadas por componente.
+
+    El JSON se recorre una sola vez; cada texto de la tabla se convierte en una Pauta asociada
+    al componente que aparece en su ruta (como clave o como valor de un registro). Los textos
+    que no dependen de ningún componente se guardan como pautas generales.
+    """
+
+    def __init__(self, datos):
+        self.por_componente: dict[str, list[Pauta]] = {c: [] for c in COMPONENTES_TEMPERAMENTALES}
+        self.generales: list[Pauta] = []
+        self._indexar(datos, (), None)
+
+    @classmethod
+    def desde_json(cls, texto: str) -> "TablasComponentes":
+        return cls(json.loads(texto))
+
+    @property
+    def reconocidas(self) -> bool:
+        """True si se ha podido asociar alguna pauta a un componente."""
+        return any(self.por_componente.values())
+
+    def _indexar(self, nodo, ruta: tuple[str, ...], componente: str | None) -> None:
+        if isinstance(nodo, dict):
+            if componente is None:
+                # Registros del tipo {"componente": "Paranoide", "objetivo": ..., "pauta": ...}
+                componente = next(filter(None, (componente_de(v) for v in nodo.values()
+                                                if isinstance(v, str) and len(v) < 40)), None)
+            for clave, valor in nodo.items():
+                comp_clave = componente_de(clave) if componente is None else None
+                if comp_clave:
+                    self._indexar(valor, ruta, comp_clave)
+                elif isinstance(valor, str) and componente_de(valor) == componente and len(valor) < 40:
+                    continue  # el propio campo que identifica el componente
+                else:
+                    self._indexar(valor, ruta + (str(clave),), componente)
+        elif isinstance(nodo, list):
+            for elemento in nodo:
+                self._indexar(elemento, ruta, componente)
+        elif nodo not in (None, ""):
+            pauta = Pauta(componente, ruta, str(nodo))
+            (self.por_componente[componente] if componente else self.generales).append(pauta)
+
+    def pautas(self, componentes: list[str], objetivo: str | None = None) -> list[Pauta]:
+        """Pautas de los componentes indicados, opcionalmente filtradas por un objetivo (texto en la ruta)."""
+        objetivo = normalizar(objetivo) if objetivo else None
+        resultado = []
+        for componente in componentes:
+            for pauta in self.por_componente.get(componente, []):
+                if objetivo is None or any(objetivo in normalizar(r) for r in pauta.ruta):
+                    resultado.append(pauta)
+        return resultado
+
+    def extracto(self, personas: list[tuple[str, dict]], listadas: int | None = None, con_pautas: int = 1) -> str:
+        """Texto con los componentes dominantes de un conjunto de personas y las pautas de las primeras.
+
+        `personas` es una lista de (nombre, componentes_temperamentales). Se indica qué componentes
+        son dominantes en cada persona (solo en las `listadas` primeras, si se indica), y solo se
+        incluyen las pautas generales y las de los componentes de las `con_pautas` primeras (el
+        usuario, por defecto): las de cada una de las demás van entonces en su ficha (ver `pautas_persona`),
+        para que el extracto no acabe siendo la tabla completa en cuanto hay muchas personas.
+        """
+        lineas = ["Componentes dominantes de cada persona:"]
+        usados: list[str] = []
+        for i, (nombre, ct) in enumerate(personas):
+            dominantes = componentes_dominantes(ct or {})
+            if dominantes:
+                if listadas is None or i < listadas:
+                    lineas.append(f"- {nombre}: {', '.join(dominantes)}")
+                if i < con_pautas:
+                    usados.extend(c for c in dominantes if c not in usados)
+
+        if self.generales:
+            lineas.append("\nPautas generales:")
+            lineas.extend(_linea(p) for p in self.generales)
+        lineas.extend(self._lineas_componentes(usados))
+        if len(personas) > con_pautas:
+            lineas.append("\nLas pautas para los componentes de cada persona van en su ficha: pídela con la "
+                          "función consultar_persona antes de aconsejar cómo tratarla.")
+        return "\n".join(lineas)
+
+    def pautas_persona(self, ct: dict, objetivo: str | None = None) -> str:
+        """Pautas de los componentes dominantes de una persona (para su ficha), o "" si no tiene."""
+        return "\n".join(self._lineas_componentes(componentes_dominantes(ct or {}), objetivo)).strip()
+
+    def _lineas_componentes(self, componentes: list[str], objetivo: str | None = None) -> list[str]:
+        lineas = []
+        for componente in COMPONENTES_TEMPERAMENTALES:
+            pautas = self.pautas([componente], objetivo) if componente in componentes else []
+            if pautas:
+                lineas.append(f"\nPautas para el componente {componente}:")
+                lineas.extend(_linea(p) for p in pautas)
+        return lineas
+
+def _linea(pauta: Pauta) -> str:
+    return f"- {' > '.join(pauta.ruta)}: {pauta.texto}" if pauta.ruta else f"- {pauta.texto}"
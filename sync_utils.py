@@ -0,0 +1,223 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# sync_utils.py
+import bisect
+import threading
+import weakref
+from datetime import datetime
+
+import streamlit as st
+
+from fechas_utils import clave_fecha
+from firestore_utils import get_firestore_client
+from indice_utils import IndicePersonas
+from memorias_utils import IndiceMemorias
+from personas_utils import PersonasStore
+from temperamento_utils import MatrizTemperamentos
+
+# Tiempo máximo de espera a la primera instantánea de cada listener (segundos)
+ESPERA_INICIAL = 10
+
+# ─────────────────── RÉPLICA EN MEMORIA DE UN USUARIO ────────────────────
+
+class UserReplica:
+    """Réplica en memoria de los datos de un usuario, mantenida por listeners `on_snapshot`.
+
+    Escucha las colecciones `sujetos`, `memorias` y `resumenes` y el documento del usuario (perfil),
+    y aplica cada cambio incremental que envía Firestore. La comparten todas las sesiones
+    abiertas del mismo usuario.
+    """
+
+    def __init__(self, db_client, user_id: str):
+        self.user_id = user_id
+        self.personas = PersonasStore()
+        self.memorias: dict[str, dict] = {}
+        # Claves (ver clave_memoria) de todas las memorias en orden ascendente, para paginar sin reordenar
+        self._orden_memorias: list[tuple[datetime, str]] = []
+        # Resúmenes de memorias por persona (ID de la persona -> documento)
+        self.resumenes: dict[str, dict] = {}
+        self.perfil: dict = {}
+        # Matriz de componentes temperamentales, mantenida con cada cambio en las personas
+        self.temperamentos = MatrizTemperamentos()
+        self.personas.suscribir(self.temperamentos.actualizar)
+        # Índice invertido para la búsqueda por facetas
+        self.indice = IndicePersonas()
+        self.personas.suscribir(self.indice.actualizar)
+        # Índice LSH para detectar memorias casi duplicadas antes de guardarlas
+        self.indice_memorias = IndiceMemorias()
+        # Se incrementa con cada cambio; sirve para invalidar cálculos derivados
+        self.version = 0
+        self._lock = threading.RLock()
+        self._listas = {nombre: threading.Event() for nombre in ("sujetos", "memorias", "resumenes", "perfil")}
+
+        user_ref = db_client.collection("usuarios").document(user_id)
+        self._watches = [
+            user_ref.collection("sujetos").on_snapshot(self._on_sujetos),
+            user_ref.collection("memorias").on_snapshot(self._on_memorias),
+            user_ref.collection("resumenes").on_snapshot(self._on_resumenes),
+            user_ref.on_snapshot(self._on_perfil),
+        ]
+
+    # --- Callbacks de los listeners (se ejecutan en un hilo de Firestore) ---
+    def _on_sujetos(self, col_snapshot, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    self.personas.retirar(doc.id)
+                else:
+                    self.personas.cargar([{**doc.to_dict(), "ID": doc.id}])
+            self.version += 1
+        self._listas["sujetos"].set()
+
+    def _on_memorias(self, col_snapshot, changes, read_time):
+        with self._lock:
+            # La primera instantánea trae toda la colección: se ordena una vez al final
+            inicial = not self._listas["memorias"].is_set()
+            for change in changes:
+                doc = change.document
+                memoria = None if change.type.name == "REMOVED" else {**doc.to_dict(), "id": doc.id}
+                self._poner_memoria(doc.id, memoria, ordenar=not inicial)
+                self.indice_memorias.actualizar(doc.id, memoria)
+            if inicial:
+                self._orden_memorias = sorted(self.clave_memoria(m) for m in self.memorias.values())
+            self.version += 1
+        self._listas["memorias"].set()
+
+    def _on_resumenes(self, col_snapshot, changes, read_time):
+        with self._lock:
+            for change in changes:
+                doc = change.document
+                if change.type.name == "REMOVED":
+                    self.resumenes.pop(doc.id, None)
+                else:
+                    self.resumenes[doc.id] = doc.to_dict()
+            self.version += 1
+        self._listas["resumenes"].set()
+
+    def _on_perfil(self, doc_snapshots, changes, read_time):
+        with self._lock:
+            for doc in doc_snapshots:
+                self.perfil = doc.to_dict() if doc.exists else {}
+            self.temperamentos.fijar_usuario(self.perfil)
+            self.version += 1
+        self._listas["perfil"].set()
+
+    # --- Lectura ---
+    def esperar(self, timeout: float = ESPERA_INICIAL) -> bool:
+        """Espera a que los listeners hayan entregado su primera instantánea."""
+        return all(evento.wait(timeout) for evento in self._listas.values())
+
+    def memorias_ordenadas(self, descendente: bool = False) -> list[dict]:
+        """Memorias ordenadas por fecha_registro (y por ID, a igual fecha)."""
+        with self._lock:
+            claves = reversed(self._orden_memorias) if descendente else self._orden_memorias
+            return [self.memorias[memoria_id] for _, memoria_id in claves]
+
+    @staticmethod
+    def clave_memoria(memoria: dict) -> tuple[datetime, str]:
+        """Clave de orden de una memoria; sirve como cursor de paginación."""
+        return clave_fecha(memoria.get("fecha_registro")), memoria.get("id", "")
+
+    def memorias_pagina(self, limite: int, despues: tuple[datetime, str] | None = None) -> list[dict]:
+        """Página de memorias de la más reciente a la más antigua.
+
+        `despues` es la clave (ver clave_memoria) de la última memoria de la página anterior, o None
+        para la primera. El cursor se busca por bisección en las claves ordenadas y solo se copian
+        las `limite` memorias de la página.
+        """
+        with self._lock:
+            fin = len(self._orden_memorias) if despues is None else bisect.bisect_left(self._orden_memorias, despues)
+            claves = self._orden_memorias[max(0, fin - limite):fin]
+            return [self.memorias[memoria_id] for _, memoria_id in reversed(claves)]
+
+    def _poner_memoria(self, memoria_id: str, memoria: dict | None, ordenar: bool = True) -> None:
+        """Inserta, sustituye o (con None) elimina una memoria, manteniendo sus claves ordenadas."""
+        anterior = self.memorias.pop(memoria_id, None)
+        if memoria is not None:
+            self.memorias[memoria_id] = memoria
+        if not ordenar:
+            return
+        if anterior is not None:
+            clave = self.clave_memoria(anterior)
+            i = bisect.bisect_left(self._orden_memorias, clave)
+            if i < len(self._orden_memorias) and self._orden_memorias[i] == clave:
+                del self._orden_memorias[i]
+        if memoria is not None:
+            bisect.insort(self._orden_memorias, self.clave_memoria(memoria))
+
+    # --- Cambios locales (se aplican antes de que llegue el evento del listener) ---
+    def aplicar_memoria(self, memoria_id: str, memoria: dict | None) -> None:
+        """Inserta (o elimina si `memoria` es None) una memoria en la réplica."""
+        with self._lock:
+            self._poner_memoria(memoria_id, None if memoria is None else {**memoria, "id": memoria_id})
+            self.indice_memorias.actualizar(memoria_id, memoria)
+            self.version += 1
+
+    def aplicar_resumen(self, persona_id: str, resumen: dict | None) -> None:
+        """Inserta (o elimina si `resumen` es None) el resumen de memorias de una persona."""
+        with self._lock:
+            if resumen is None:
+                self.resumenes.pop(persona_id, None)
+            else:
+                self.resumenes[persona_id] = resumen
+            self.version += 1
+
+    def aplicar_perfil(self, perfil: dict) -> None:
+        """Reemplaza el perfil de la réplica."""
+        with self._lock:
+            self.perfil = perfil
+            self.temperamentos.fijar_usuario(perfil)
+            self.version += 1
+
+    def cerrar(self) -> None:
+        """Cancela los listeners."""
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+
+# ─────────────────── REGISTRO COMPARTIDO ENTRE SESIONES ────────────────────
+
+_replicas: dict[str, UserReplica] = {}
+_referencias: dict[str, int] = {}
+_registro_lock = threading.Lock()
+
+def _adquirir_replica(user_id: str) -> UserReplica:
+    with _registro_lock:
+        replica = _replicas.get(user_id)
+        if replica is None:
+            replica = UserReplica(get_firestore_client(), user_id)
+            _replicas[user_id] = replica
+        _referencias[user_id] = _referencias.get(user_id, 0) + 1
+        return replica
+
+def _liberar_replica(user_id: str) -> None:
+    with _registro_lock:
+        _referencias[user_id] = _referencias.get(user_id, 1) - 1
+        if _referencias[user_id] <= 0:
+            _referencias.pop(user_id, None)
+            replica = _replicas.pop(user_id, None)
+            if replica is not None:
+                replica.cerrar()
+
+class _SesionReplica:
+    """Referencia de una sesión de Streamlit a la réplica de su usuario.
+
+    Vive en `st.session_state`; cuando Streamlit descarta la sesión el objeto se recolecta
+    y se libera la referencia, cerrando los listeners si era la última sesión del usuario.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.replica = _adquirir_replica(user_id)
+        weakref.finalize(self, _liberar_replica, user_id)
+
+def get_user_replica(user_id: str) -> UserReplica:
+    """Devuelve la réplica del usuario para la sesión actual, creando los listeners si hace falta."""
+    sesion = st.session_state.get("_sesion_replica")
+    if sesion is None or sesion.user_id != user_id:
+        sesion = _SesionReplica(user_id)
+        st.session_state._sesion_replica = sesion
+    sesion.replica.esperar()
+    return sesion.replica
@@ -0,0 +1,158 @@
+# © 2025 Pablo Díaz-Masa. Licenciado bajo CC BY-NC-ND 4.0.
+# Ver LICENSE o https://creativecommons.org/licenses/by-nc-nd/4.0/
+
+# temperamento_utils.py
+import threading
+
+import numpy as np
+
+from personas_utils import COMPONENTES_TEMPERAMENTALES
+
+PUNTUACION_MAXIMA = 17.0
+# Distancia máxima posible entre dos vectores de componentes (todas las puntuaciones opuestas)
+DISTANCIA_MAXIMA = PUNTUACION_MAXIMA * np.sqrt(len(COMPONENTES_TEMPERAMENTALES))
+
+def vector_temperamental(datos: dict) -> np.ndarray:
+    """Vector de los 7 componentes temperamentales de una persona o del perfil del usuario."""
+    ct = datos.get("componentes_temperamentales", {}) or {}
+    return np.array([float(ct.get(comp, 0.0)) for comp in COMPONENTES_TEMPERAMENTALES])
+
+def tiene_temperamento(datos: dict) -> bool:
+    """True si la persona (o el perfil) tiene alguna puntuación de componentes temperamentales."""
+    ct = datos.get("componentes_temperamentales") or {}
+    return any(ct.get(comp) not in (None, "") for comp in COMPONENTES_TEMPERAMENTALES)
+
+def similitud(distancias: np.ndarray) -> np.ndarray:
+    """Convierte distancias euclídeas en una similitud entre 0 (opuestos) y 1 (idénticos)."""
+    return 1.0 - distancias / DISTANCIA_MAXIMA
+
+# ─────────────────── MATRIZ DE TEMPERAMENTOS ────────────────────
+
+class MatrizTemperamentos:
+    """Matriz (personas x 7) de componentes temperamentales de la red de un usuario.
+
+    Cada fila es una persona; se mantiene de forma incremental suscrita a un PersonasStore,
+    de modo que guardar una persona solo reescribe su fila. Las consultas recorren la matriz
+    completa en una sola operación vectorizada. Las personas sin componentes temperamentales no
+    tienen fila (serían un vector de ceros parecido a cualquier temperamento bajo): se anotan en
+    `sin_datos` y quedan fuera de similitudes y grupos.
+    """
+
+    def __init__(self, capacidad: int = 64):
+        self._datos = np.zeros((capacidad, len(COMPONENTES_TEMPERAMENTALES)))
+        self._n = 0
+        self.ids: list[str] = []
+        self._fila: dict[str, int] = {}
+        self.sin_datos: set[str] = set()
+        self.usuario: np.ndarray | None = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def matriz(self) -> np.ndarray:
+        """Vista de las filas ocupadas."""
+        return self._datos[:self._n]
+
+    # --- Mantenimiento incremental ---
+    def actualizar(self, persona_id: str, persona: dict | None) -> None:
+        """Inserta, reemplaza o (si `persona` es None) elimina la fila de una persona.
+
+        Tiene la firma de los observadores de PersonasStore.
+        """
+        with self._lock:
+            if persona is None or not tiene_temperamento(persona):
+                self._eliminar(persona_id)
+                if persona is None:
+                    self.sin_datos.discard(persona_id)
+                else:
+                    self.sin_datos.add(persona_id)
+                return
+            self.sin_datos.discard(persona_id)
+            fila = self._fila.get(persona_id)
+            if fila is None:
+                if self._n == len(self._datos):
+                    self._datos = np.concatenate([self._datos, np.zeros_like(self._datos)])
+                fila = self._n
+                self._n += 1
+                self.ids.append(persona_id)
+                self._fila[persona_id] = fila
+            self._datos[fila] = vector_temperamental(persona)
+
+    def _eliminar(self, persona_id: str) -> None:
+        fila = self._fila.pop(persona_id, None)
+        if fila is None:
+            return
+        # La última fila ocupa el hueco para mantener la matriz compacta
+        ultima = self._n - 1
+        if fila != ultima:
+            self._datos[fila] = self._datos[ultima]
+            self.ids[fila] = self.ids[ultima]
+            self._fila[self.ids[fila]] = fila
+        self.ids.pop()
+        self._n -= 1
+
+    def fijar_usuario(self, perfil: dict) -> None:
+        """Guarda el vector del propio usuario (perfil de Mi Perfil)."""
+        with self._lock:
+            self.usuario = vector_temperamental(perfil) if perfil and tiene_temperamento(perfil) else None
+
+    # --- Consultas vectorizadas ---
+    def _similitudes_con(self, vector: np.ndarray) -> np.ndarray:
+        return similitud(np.linalg.norm(self.matriz - vector, axis=1))
+
+    def mas_similares(self, persona_id: str, k: int = 5) -> list[tuple[str, float]]:
+        """Las `k` personas con temperamento más parecido a `persona_id` (excluida ella misma)."""
+        with self._lock:
+            fila = self._fila.get(persona_id)
+            if fila is None or self._n < 2:
+                return []
+            sims = self._similitudes_con(self._datos[fila])
+            sims[fila] = -np.inf
+            k = min(k, self._n - 1)
+            mejores = np.argpartition(-sims, k - 1)[:k]
+            mejores = mejores[np.argsort(-sims[mejores])]
+            return [(self.ids[i], float(sims[i])) for i in mejores]
+
+    def compatibilidad_usuario(self) -> dict[str, float]:
+        """Similitud temperamental entre el usuario y cada persona de su red (0 a 1)."""
+        with self._lock:
+            if self.usuario is None or not self._n:
+                return {}
+            sims = self._similitudes_con(self.usuario)
+            return dict(zip(self.ids, sims.tolist()))
+
+    def agrupar(self, k: int = 3, iteraciones: int = 50, semilla: int = 133) -> dict[str, int]:
+        """Agrupa a las personas en `k` grupos de temperamento parecido (k-means).
+
+        Devuelve {persona_id: grupo}. El resultado es determinista para una misma semilla.
+        """
+        with self._lock:
+            X = self.matriz.copy()
+            ids = list(self.ids)
+        if not len(X):
+            return {}
+        k = min(k, len(X))
+        rng = np.random.default_rng(semilla)
+
+        # Inicialización k-means++
+        centros = [X[rng.integers(len(X))]]
+        for _ in range(1, k):
+            d2 = np.min(((X[:, None, :] - np.array(centros)[None]) ** 2).sum(-1), axis=1)
+            total = d2.sum()
+            centros.append(X[rng.choice(len(X), p=d2 / total)] if total else X[rng.integers(len(X))])
+        centros = np.array(centros)
+
+        etiquetas = np.zeros(len(X), dtype=int)
+        for iteracion in range(iteraciones):
+            distancias = ((X[:, None, :] - centros[None]) ** 2).sum(-1)
+            nuevas = distancias.argmin(axis=1)
+            if iteracion and np.array_equal(nuevas, etiquetas):
+                break
+            etiquetas = nuevas
+            conteo = np.bincount(etiquetas, minlength=k)[:, None]
+            sumas = np.zeros_like(centros)
+            np.add.at(sumas, etiquetas, X)
+            centros = np.where(conteo > 0, sumas / np.maximum(conteo, 1), centros)
+        return dict(zip(ids, etiquetas.tolist()))